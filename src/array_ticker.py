@@ -0,0 +1,155 @@
+__author__ = "Ethan Posner"
+__copyright__ = ""
+__credits__ = []
+__license__ = ""
+__version__ = "0,1dev"
+__maintainer__ = "Ethan Posner"
+__status__ = "Production"
+
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+import data_provider
+import indicators
+import storage_formats
+
+# format: dataframe column: ArrayTicker attribute
+COLUMN_FIELDS = {
+    'Open': 'open',
+    'High': 'high',
+    'Low': 'low',
+    'Close': 'close',
+    'Adj Close': 'adj_close',
+    'Volume': 'volume',
+}
+
+
+class ArrayTicker:
+    """
+    Compact ticker which holds its data as numpy arrays instead of subclassing pd.DataFrame, so that thousands of them can be kept in
+    memory at once.
+
+    Times are stored as int64 nanoseconds since the epoch (UTC), as returned by StorageFormatADT.read_arrays(). Slicing by date or
+    position returns a new ArrayTicker holding views of the same arrays, so nothing is copied. Columns which weren't loaded are None.
+    """
+
+    __slots__ = ('symbol', 'interval', 'timezone', 'timestamps', 'open', 'high', 'low', 'close', 'adj_close', 'volume')
+
+    def __init__(self, symbol: str, timestamps: np.ndarray, open: np.ndarray = None, high: np.ndarray = None, low: np.ndarray = None,
+                 close: np.ndarray = None, adj_close: np.ndarray = None, volume: np.ndarray = None, interval: str = '1d',
+                 timezone: str = None):
+        """
+        :param symbol: Ticker symbol e.g. 'MSFT'
+        :param timestamps: Sorted int64 nanoseconds since the epoch (UTC) of every bar
+        :param interval: Interval between bars e.g. '1d'
+        :param timezone: Timezone of the bars, which timezone naive start and end times are treated as being in. Default: UTC
+        """
+        self.symbol = symbol.upper()
+        self.interval = interval
+        self.timezone = timezone
+        self.timestamps = timestamps
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.adj_close = adj_close
+        self.volume = volume
+
+    @classmethod
+    def from_arrays(cls, symbol: str, arrays: Dict[str, np.ndarray], interval: str = '1d', timezone: str = None) -> 'ArrayTicker':
+        """
+        Create a ticker from arrays in the format returned by StockDataProvider.get_ticker_arrays(). The arrays aren't copied.
+        """
+        fields = {field: arrays[column] for column, field in COLUMN_FIELDS.items() if column in arrays}
+        return cls(symbol, arrays['timestamps'], interval=interval, timezone=timezone, **fields)
+
+    @classmethod
+    def from_dataframe(cls, symbol: str, dataframe: pd.DataFrame, interval: str = '1d') -> 'ArrayTicker':
+        """
+        Create a ticker from a dataframe with a DatetimeIndex and any of the Open, High, Low, Close, Adj Close and Volume columns
+        """
+        index = pd.DatetimeIndex(dataframe.index)
+        timezone = str(index.tz) if index.tz is not None else None
+
+        # contiguous copies, so that the dataframe can be freed
+        arrays = {column: np.ascontiguousarray(array) for column, array in storage_formats.dataframe_to_arrays(dataframe).items()}
+        return cls.from_arrays(symbol, arrays, interval=interval, timezone=timezone)
+
+    @classmethod
+    def from_provider(cls, provider: data_provider.StockDataProvider, symbol: str, start=None, end=None, interval: str = '1d',
+                      columns=None) -> 'ArrayTicker':
+        """
+        Load a ticker through StockDataProvider.get_ticker_arrays(). With memory mapped storage, only the requested range is read.
+        """
+        arrays = provider.get_ticker_arrays(symbol, start=start, end=end, interval=interval, columns=columns)
+
+        timezone = None
+        storage_name = provider.storage_name(symbol.upper(), interval)
+        if provider.storage_format.exists(provider.ticker_directory, storage_name):
+            timezone = provider.storage_format.read_timezone(provider.ticker_directory, storage_name)
+
+        return cls.from_arrays(symbol, arrays, interval=interval, timezone=timezone)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __repr__(self) -> str:
+        if not len(self):
+            return f'ArrayTicker({self.symbol}, {self.interval}, empty)'
+        return f'ArrayTicker({self.symbol}, {self.interval}, {len(self)} bars from {self.index[0]} to {self.index[-1]})'
+
+    def _slice_rows(self, first_row: int, last_row: int) -> 'ArrayTicker':
+        fields = {field: getattr(self, field) for field in COLUMN_FIELDS.values()}
+        sliced_fields = {field: array[first_row:last_row] if array is not None else None for field, array in fields.items()}
+        return ArrayTicker(self.symbol, self.timestamps[first_row:last_row], interval=self.interval, timezone=self.timezone, **sliced_fields)
+
+    def slice(self, start=None, end=None) -> 'ArrayTicker':
+        """
+        Get the bars between start and end (inclusive) using a binary search. The result shares this ticker's arrays.
+        """
+        return self._slice_rows(*storage_formats.find_rows(self.timestamps, start, end, self.timezone))
+
+    def __getitem__(self, key) -> 'ArrayTicker':
+        """
+        Slice by position (ticker[-100:]) or by time (ticker['2021-01-01':'2021-06-30']). Both return views.
+        """
+        if not isinstance(key, slice) or key.step is not None:
+            raise TypeError('ArrayTicker can only be indexed by slices without a step')
+
+        if all(bound is None or isinstance(bound, (int, np.integer)) for bound in (key.start, key.stop)):
+            return self._slice_rows(*key.indices(len(self))[:2])
+
+        return self.slice(key.start, key.stop)
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        """
+        Times of every bar as a DatetimeIndex, in this ticker's timezone
+        """
+        index = pd.DatetimeIndex(np.asarray(self.timestamps).view('datetime64[ns]'))
+        if self.timezone is not None:
+            index = index.tz_localize('UTC').tz_convert(self.timezone)
+        return index
+
+    @property
+    def nbytes(self) -> int:
+        """
+        How much memory this ticker's arrays use. Views count the size of the part they cover.
+        """
+        return sum(array.nbytes for array in (getattr(self, field) for field in ('timestamps',) + tuple(COLUMN_FIELDS.values()))
+                   if array is not None)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Convert to a dataframe with the same columns as the stored data
+        """
+        data = {column: getattr(self, field) for column, field in COLUMN_FIELDS.items() if getattr(self, field) is not None}
+        return pd.DataFrame(data, index=self.index.rename('Date' if self.timezone is None else 'Datetime'))
+
+    def indicators(self, *indicator_names) -> Dict[str, np.ndarray]:
+        """
+        Compute rolling indicators over this ticker's bars. See indicators.IndicatorEngine.compute()
+        """
+        return indicators.IndicatorEngine(self.close, high=self.high, low=self.low).compute(*indicator_names)
@@ -0,0 +1,227 @@
+__author__ = "Ethan Posner"
+__copyright__ = ""
+__credits__ = []
+__license__ = ""
+__version__ = "0,1dev"
+__maintainer__ = "Ethan Posner"
+__status__ = "Production"
+
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+import array_ticker
+import data_provider
+import simulation
+import trade_stocks
+
+
+class BacktestContext:
+    """
+    What a strategy can see during a backtest: every ticker's bars, and which of them have happened yet.
+
+    tickers holds all of the data so that indicators can be computed once in StrategyADT.start(), but only rows up to rows[symbol] have
+    happened. history() gives the rows which have happened as views.
+    """
+
+    def __init__(self, tickers: Dict[str, array_ticker.ArrayTicker], clock: simulation.SimulatedClock):
+        self.tickers = tickers
+        self.clock = clock
+
+        # format: "ticker_str": row of the latest bar, or -1 before the first one
+        self.rows: Dict[str, int] = {symbol: -1 for symbol in tickers}
+        # symbols which have a bar at the current time
+        self.updated: List[str] = []
+        # symbols whose first bar is at the current time, after the backtest started
+        self.listed: List[str] = []
+        # symbols whose last bar is at the current time, before the backtest ends. Orders for them which aren't filled yet never will be.
+        self.delisted: List[str] = []
+
+    @property
+    def time(self) -> int:
+        """
+        The current simulated time in nanoseconds since the epoch (UTC)
+        """
+        return self.clock.now
+
+    def close(self, symbol: str) -> float:
+        """
+        Get the close of a symbol's latest bar, or nan if it hasn't had a bar yet
+        """
+        row = self.rows[symbol]
+        # row -1 would index the last bar, which hasn't happened yet
+        return float(self.tickers[symbol].close[row]) if row >= 0 else np.nan
+
+    def history(self, symbol: str) -> array_ticker.ArrayTicker:
+        """
+        Get every bar of a symbol up to the current one
+        """
+        return self.tickers[symbol][:self.rows[symbol] + 1]
+
+
+class StrategyADT(ABC):
+    """
+    A trading algorithm. It trades through the StockTraderADT it is given, so the same strategy can be run in a backtest with a
+    trade_stocks.SimulatedTrader or live with a trade_stocks.StockTrader.
+    """
+
+    def start(self, trader: trade_stocks.StockTraderADT, context: BacktestContext):
+        """
+        Called once before the first bar, e.g. to compute indicators over context.tickers
+        """
+        pass
+
+    @abstractmethod
+    def on_bar(self, trader: trade_stocks.StockTraderADT, context: BacktestContext):
+        """
+        Called at the close of every bar. context.updated holds the symbols which have a bar at this time.
+        """
+        pass
+
+    def finish(self, trader: trade_stocks.StockTraderADT, context: BacktestContext):
+        """
+        Called once after the last bar
+        """
+        pass
+
+
+class BacktestResult:
+    """
+    Result of BacktestEngine.run()
+    """
+
+    def __init__(self, timestamps: np.ndarray, equity: np.ndarray, trader: trade_stocks.SimulatedTrader, timezone: str = None):
+        """
+        :param timestamps: Time of every step of the backtest
+        :param equity: Cash plus the value of every position at the close of every step
+        """
+        self.timestamps = timestamps
+        self.equity = equity
+        self.trader = trader
+        self.timezone = timezone
+
+    @property
+    def orders(self) -> List[trade_stocks.StockOrder]:
+        return self.trader.get_orders()
+
+    @property
+    def filled_orders(self) -> List[trade_stocks.StockOrder]:
+        return [order for order in self.trader.get_orders() if order._status == 'filled']
+
+    @property
+    def total_return(self) -> float:
+        return float(self.equity[-1] / self.equity[0] - 1) if len(self.equity) else 0.0
+
+    @property
+    def drawdown(self) -> np.ndarray:
+        """
+        Fraction which equity is below its highest point so far at every step
+        """
+        return 1 - self.equity / np.maximum.accumulate(self.equity)
+
+    @property
+    def max_drawdown(self) -> float:
+        return float(self.drawdown.max()) if len(self.equity) else 0.0
+
+    def to_series(self) -> pd.Series:
+        """
+        Get the equity curve as a series indexed by time
+        """
+        index = pd.DatetimeIndex(self.timestamps.view('datetime64[ns]'))
+        if self.timezone is not None:
+            index = index.tz_localize('UTC').tz_convert(self.timezone)
+        return pd.Series(self.equity, index=index, name='equity')
+
+
+class BacktestEngine:
+    """
+    Runs a strategy over historical bars with a trade_stocks.SimulatedTrader, in simulated time.
+
+    Bars from every ticker are merged into time order. At each time, the clock is advanced and due events are run, which sends orders
+    whose latency has passed to the market. The open of every bar at that time is then given to the trader, filling waiting orders at
+    the open, followed by the close, and then the strategy is called. An order sent at the close of a bar is therefore filled at the open
+    of the symbol's next bar, so the strategy never trades at a price it has already seen.
+
+    Bars are merged with a simulation.MultiSymbolReplay, so symbols may have missing bars, and may list or delist part way through.
+    """
+
+    def __init__(self, tickers: Iterable[array_ticker.ArrayTicker], strategy: StrategyADT, cash: float = 100000.0,
+                 latency: simulation.LatencyModelADT = None, slippage: simulation.SlippageModelADT = None,
+                 commission: simulation.CommissionModelADT = None):
+        """
+        :param tickers: Bars to run the strategy on. They should all have the same interval.
+        :param strategy: Strategy to run
+        :param cash: Dollars available at the start
+        :param latency: See trade_stocks.SimulatedTrader
+        :param slippage: See trade_stocks.SimulatedTrader
+        :param commission: See trade_stocks.SimulatedTrader
+        """
+        self.tickers: Dict[str, array_ticker.ArrayTicker] = {ticker.symbol: ticker for ticker in tickers}
+        self.strategy = strategy
+        self.cash = cash
+        self.latency = latency
+        self.slippage = slippage
+        self.commission = commission
+
+    @classmethod
+    def from_provider(cls, provider: data_provider.StockDataProvider, ticker_symbols: Iterable[str], strategy: StrategyADT, start=None,
+                      end=None, interval: str = '1d', **kwargs) -> 'BacktestEngine':
+        """
+        Load the bars to run on through StockDataProvider.get_ticker_arrays()
+
+        :param kwargs: Passed to BacktestEngine()
+        """
+        tickers = [array_ticker.ArrayTicker.from_provider(provider, symbol, start=start, end=end, interval=interval,
+                                                          columns=['Open', 'Close']) for symbol in ticker_symbols]
+        return cls(tickers, strategy, **kwargs)
+
+    def run(self) -> BacktestResult:
+        """
+        Run the strategy over every bar
+        """
+        timezone = next((ticker.timezone for ticker in self.tickers.values()), None)
+        clock = simulation.SimulatedClock(timezone=timezone)
+        scheduler = simulation.EventScheduler(clock)
+        trader = trade_stocks.SimulatedTrader(cash=self.cash, scheduler=scheduler, latency=self.latency, slippage=self.slippage,
+                                              commission=self.commission)
+        context = BacktestContext(self.tickers, clock)
+
+        # item() reads a single element as a python float much faster than indexing does
+        open_items = {symbol: (ticker.open if ticker.open is not None else ticker.close).item for symbol, ticker in self.tickers.items()}
+        close_items = {symbol: ticker.close.item for symbol, ticker in self.tickers.items()}
+
+        replay = simulation.MultiSymbolReplay.from_tickers(self.tickers.values())
+        if replay.first_time is not None:
+            clock.now = replay.first_time
+
+        step_times = []
+        equity = []
+
+        self.strategy.start(trader, context)
+
+        update_price = trader.update_price
+        run_until = scheduler.run_until
+        on_bar = self.strategy.on_bar
+        context_rows = context.rows
+
+        for tick in replay:
+            run_until(tick.time)
+
+            for symbol, row in zip(tick.symbols, tick.rows):
+                update_price(symbol, open_items[symbol](row))
+                update_price(symbol, close_items[symbol](row), False)
+                context_rows[symbol] = row
+
+            context.updated = tick.symbols
+            context.listed = tick.listed
+            context.delisted = tick.delisted
+            on_bar(trader, context)
+
+            step_times.append(tick.time)
+            equity.append(trader.equity)
+
+        self.strategy.finish(trader, context)
+
+        return BacktestResult(np.asarray(step_times, dtype=np.int64), np.asarray(equity, dtype=np.float64), trader, timezone=timezone)
@@ -0,0 +1,337 @@
+__author__ = "Ethan Posner"
+__copyright__ = ""
+__credits__ = []
+__license__ = ""
+__version__ = "0,1dev"
+__maintainer__ = "Ethan Posner"
+__status__ = "Production"
+
+import contextlib
+import datetime as dt
+import glob
+import os
+import pickle
+import sqlite3
+import threading
+from typing import Dict, List, Tuple
+
+
+class DataRetrievalInfo:
+    """
+    Keeps track of data which was previously retrieved.
+
+    This will allow for data which was previously stored to be retrieved in the specified state
+
+    For example, if stock data already exists which covers the year 2020, and data for may of 2020 is retrieved, this data should be reused
+    instead of querying an API for it again.
+    """
+
+    def __init__(self, time, start, end, interval):
+        """
+        :param time: date string (YYYY-MM-DD) or datetime indicating when the data was retrieved
+        :param start: date string (YYYY-MM-DD) or datetime indicating the start of the retrieved data
+        :param end: date string (YYYY-MM-DD) or datetime indicating the end of the retrieved data
+        :param interval: Indicates the resolution of the data instances retrieved.
+            Valid intervals are: 1m, 2m, 5m, 15m, 30m, 60m, 90m, 1h, 1d, 5d, 1wk, 1mo, 3mo
+        """
+        self.time = dt.datetime.strptime(time, "%Y-%m-%d") if isinstance(time, str) else time
+        self.start = dt.datetime.strptime(start, "%Y-%m-%d") if isinstance(start, str) else start
+        self.end = dt.datetime.strptime(end, "%Y-%m-%d") if isinstance(end, str) else end
+        self.interval = interval
+
+
+def _to_db_time(time) -> str:
+    """
+    Convert a date string (YYYY-MM-DD) or datetime into text which sorts in time order. Timezone aware times are converted to UTC.
+    """
+    if isinstance(time, str):
+        time = dt.datetime.strptime(time, "%Y-%m-%d")
+    if time.tzinfo is not None:
+        time = time.astimezone(dt.timezone.utc).replace(tzinfo=None)
+
+    return time.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def _from_db_time(time: str) -> dt.datetime:
+    return dt.datetime.strptime(time, "%Y-%m-%d %H:%M:%S.%f")
+
+
+class CoverageCatalog:
+    """
+    Keeps track of which ranges of data have been stored for every (symbol, interval) pair, and when they were retrieved.
+
+    All information is kept in a single sqlite database, so checking the coverage of thousands of symbols only requires a single query.
+    Overlapping or touching ranges are merged when they are added. Updates are done in immediate transactions, so multiple threads or
+    processes can safely add coverage at the same time.
+    """
+
+    def __init__(self, path: str = os.path.join('stored_data', 'tickers', 'coverage.sqlite3')):
+        """
+        :param path: Location of the sqlite database. It is created if it doesn't exist.
+        """
+        self.path = path
+
+        # sqlite connections can't be shared between threads, so each thread gets its own
+        self._local = threading.local()
+
+        with self._transaction() as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS coverage (
+                    symbol TEXT NOT NULL,
+                    interval TEXT NOT NULL,
+                    start TEXT NOT NULL,
+                    end TEXT NOT NULL,
+                    retrieved_at TEXT NOT NULL
+                )
+            """)
+            connection.execute("CREATE INDEX IF NOT EXISTS coverage_symbol_interval ON coverage (symbol, interval, start)")
+            connection.execute("CREATE INDEX IF NOT EXISTS coverage_interval_end ON coverage (interval, end)")
+
+            # generation counts how many times the stored data was rewritten, and revision how many times data was appended since then
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS data_versions (
+                    symbol TEXT NOT NULL,
+                    interval TEXT NOT NULL,
+                    generation INTEGER NOT NULL,
+                    revision INTEGER NOT NULL,
+                    PRIMARY KEY (symbol, interval)
+                )
+            """)
+            # the earliest time (int64 nanoseconds since the epoch, UTC) changed by every append in the current generation
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS data_changes (
+                    symbol TEXT NOT NULL,
+                    interval TEXT NOT NULL,
+                    revision INTEGER NOT NULL,
+                    modified_from INTEGER NOT NULL
+                )
+            """)
+            connection.execute("CREATE INDEX IF NOT EXISTS data_changes_symbol_interval ON data_changes (symbol, interval, revision)")
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """
+        The sqlite connection for the current thread
+        """
+        if getattr(self._local, 'connection', None) is None:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory, exist_ok=True)
+
+            # transactions are managed manually through self._transaction()
+            self._local.connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            self._local.connection.execute("PRAGMA journal_mode=WAL")
+
+        return self._local.connection
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """
+        Run statements in a transaction which holds the database write lock from the start, so that reading the current coverage and
+        replacing it can't be interleaved with another writer.
+        """
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def close(self):
+        """
+        Close the connection for the current thread
+        """
+        if getattr(self._local, 'connection', None) is not None:
+            self._local.connection.close()
+            self._local.connection = None
+
+    def get_coverage(self, symbol: str, interval: str) -> List[DataRetrievalInfo]:
+        """
+        Get every stored range for a symbol at the given interval
+
+        :return: Non-overlapping ranges sorted by start time. Empty if nothing has been stored.
+        """
+        rows = self.connection.execute("SELECT retrieved_at, start, end FROM coverage WHERE symbol = ? AND interval = ? ORDER BY start",
+                                       (symbol.upper(), interval)).fetchall()
+
+        return [DataRetrievalInfo(_from_db_time(time), _from_db_time(start), _from_db_time(end), interval) for time, start, end in rows]
+
+    def get_intervals(self, symbol: str) -> List[str]:
+        """
+        Get every interval which has data stored for a symbol
+        """
+        rows = self.connection.execute("SELECT DISTINCT interval FROM coverage WHERE symbol = ?", (symbol.upper(),)).fetchall()
+        return [interval for interval, in rows]
+
+    def add_coverage(self, symbol: str, interval: str, start, end, time=None):
+        """
+        Record that data for a symbol has been stored between start and end. Existing ranges which overlap or touch the new range are
+        merged into it.
+
+        :param time: When the data was retrieved. Default: now
+        """
+        symbol = symbol.upper()
+        start, end = _to_db_time(start), _to_db_time(end)
+        time = _to_db_time(time if time is not None else dt.datetime.now())
+
+        with self._transaction() as connection:
+            overlapping = connection.execute(
+                "SELECT rowid, start, end, retrieved_at FROM coverage WHERE symbol = ? AND interval = ? AND start <= ? AND end >= ?",
+                (symbol, interval, end, start)).fetchall()
+
+            for rowid, other_start, other_end, other_time in overlapping:
+                start, end, time = min(start, other_start), max(end, other_end), max(time, other_time)
+                connection.execute("DELETE FROM coverage WHERE rowid = ?", (rowid,))
+
+            connection.execute("INSERT INTO coverage (symbol, interval, start, end, retrieved_at) VALUES (?, ?, ?, ?, ?)",
+                               (symbol, interval, start, end, time))
+
+    def set_coverage(self, symbol: str, interval: str, start, end, time=None):
+        """
+        Record that the stored data for a symbol has been replaced by data between start and end, discarding any previous ranges
+        """
+        symbol = symbol.upper()
+        time = time if time is not None else dt.datetime.now()
+
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM coverage WHERE symbol = ? AND interval = ?", (symbol, interval))
+            connection.execute("INSERT INTO coverage (symbol, interval, start, end, retrieved_at) VALUES (?, ?, ?, ?, ?)",
+                               (symbol, interval, _to_db_time(start), _to_db_time(end), _to_db_time(time)))
+
+    def remove_coverage(self, symbol: str, interval: str = None):
+        """
+        Forget about stored data for a symbol, either at a single interval or at all of them
+        """
+        with self._transaction() as connection:
+            if interval is None:
+                connection.execute("DELETE FROM coverage WHERE symbol = ?", (symbol.upper(),))
+            else:
+                connection.execute("DELETE FROM coverage WHERE symbol = ? AND interval = ?", (symbol.upper(), interval))
+
+    def get_data_version(self, symbol: str, interval: str) -> Tuple[int, int]:
+        """
+        Get the version of the stored data for a symbol, which changes whenever the data is written
+
+        :return: (generation, revision). The generation changes when the data is rewritten, and the revision when data is appended. (0, 0)
+        if no writes have been recorded.
+        """
+        row = self.connection.execute("SELECT generation, revision FROM data_versions WHERE symbol = ? AND interval = ?",
+                                      (symbol.upper(), interval)).fetchone()
+        return tuple(row) if row is not None else (0, 0)
+
+    def record_rewrite(self, symbol: str, interval: str):
+        """
+        Record that the stored data for a symbol was replaced, which starts a new generation
+        """
+        symbol = symbol.upper()
+        with self._transaction() as connection:
+            connection.execute("""
+                INSERT INTO data_versions (symbol, interval, generation, revision) VALUES (?, ?, 1, 0)
+                ON CONFLICT (symbol, interval) DO UPDATE SET generation = generation + 1, revision = 0
+            """, (symbol, interval))
+            connection.execute("DELETE FROM data_changes WHERE symbol = ? AND interval = ?", (symbol, interval))
+
+    def record_append(self, symbol: str, interval: str, modified_from: int):
+        """
+        Record that data was appended to the stored data for a symbol
+
+        :param modified_from: Time of the earliest row which was added or replaced, as int64 nanoseconds since the epoch (UTC)
+        """
+        symbol = symbol.upper()
+        with self._transaction() as connection:
+            connection.execute("""
+                INSERT INTO data_versions (symbol, interval, generation, revision) VALUES (?, ?, 1, 1)
+                ON CONFLICT (symbol, interval) DO UPDATE SET revision = revision + 1
+            """, (symbol, interval))
+            revision, = connection.execute("SELECT revision FROM data_versions WHERE symbol = ? AND interval = ?",
+                                           (symbol, interval)).fetchone()
+            connection.execute("INSERT INTO data_changes (symbol, interval, revision, modified_from) VALUES (?, ?, ?, ?)",
+                               (symbol, interval, revision, int(modified_from)))
+
+    def modified_since(self, symbol: str, interval: str, revision: int) -> int:
+        """
+        Find the earliest time which was changed by appends after a revision of the current generation
+
+        :return: int64 nanoseconds since the epoch (UTC), or None if nothing was appended since the revision
+        """
+        row = self.connection.execute("SELECT MIN(modified_from) FROM data_changes WHERE symbol = ? AND interval = ? AND revision > ?",
+                                      (symbol.upper(), interval, revision)).fetchone()
+        return row[0]
+
+    def missing_ranges(self, symbol: str, interval: str, start: dt.datetime, end: dt.datetime,
+                       tolerance: dt.timedelta = dt.timedelta(0)) -> List[Tuple[dt.datetime, dt.datetime]]:
+        """
+        Find which parts of the range start-end aren't covered by stored data
+
+        :param tolerance: Gaps which are no longer than this are ignored
+        :return: (start, end) ranges which need to be retrieved. This is empty if the stored data covers the whole range.
+        """
+        ranges = []
+
+        cursor = start
+        for retrieval_info in self.get_coverage(symbol, interval):
+            if retrieval_info.end <= cursor:
+                continue
+            if retrieval_info.start >= end:
+                break
+            if retrieval_info.start > cursor + tolerance:
+                ranges.append((cursor, retrieval_info.start))
+            cursor = max(cursor, retrieval_info.end)
+
+        if cursor < end - tolerance:
+            ranges.append((cursor, end))
+
+        return ranges
+
+    def last_retrieved(self, interval: str) -> Dict[str, DataRetrievalInfo]:
+        """
+        Get the most recent stored range of every symbol at the given interval
+
+        :return: symbol: DataRetrievalInfo for the range with the latest end time
+        """
+        rows = self.connection.execute("""
+            SELECT symbol, MAX(end), start, retrieved_at FROM coverage WHERE interval = ? GROUP BY symbol
+        """, (interval,)).fetchall()
+
+        return {symbol: DataRetrievalInfo(_from_db_time(time), _from_db_time(start), _from_db_time(end), interval)
+                for symbol, end, start, time in rows}
+
+    def stale_symbols(self, interval: str, max_age: dt.timedelta, now: dt.datetime = None) -> List[str]:
+        """
+        Find every symbol whose stored data at the given interval ends more than max_age before now
+
+        :param max_age: How old the end of the stored data may be, e.g. one day for daily data
+        :param now: Time to compare against. Default: now
+        :return: Sorted list of stale symbols
+        """
+        now = now if now is not None else dt.datetime.now()
+
+        rows = self.connection.execute("SELECT symbol FROM coverage WHERE interval = ? GROUP BY symbol HAVING MAX(end) < ? ORDER BY symbol",
+                                       (interval, _to_db_time(now - max_age))).fetchall()
+
+        return [symbol for symbol, in rows]
+
+    def import_retrieval_pickles(self, ticker_directory: str, remove: bool = False) -> Dict[str, DataRetrievalInfo]:
+        """
+        Add the coverage recorded in old per-symbol .dri.pkl files to this catalog
+
+        :param ticker_directory: Directory containing the .dri.pkl files
+        :param remove: Whether or not to delete the pickle files once they have been imported
+        :return: symbol: DataRetrievalInfo for every imported pickle
+        """
+        imported = {}
+
+        for pickle_path in glob.glob(os.path.join(ticker_directory, '*.dri.pkl')):
+            symbol = os.path.basename(pickle_path)[:-len('.dri.pkl')].upper()
+            with open(pickle_path, 'rb') as f:
+                retrieval_info = pickle.load(f)
+
+            self.add_coverage(symbol, retrieval_info.interval, retrieval_info.start, retrieval_info.end, retrieval_info.time)
+            imported[symbol] = retrieval_info
+
+            if remove:
+                os.remove(pickle_path)
+
+        return imported
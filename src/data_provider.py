@@ -6,54 +6,77 @@ __version__ = "0,1dev"
 __maintainer__ = "Ethan Posner"
 __status__ = "Production"
 
+import concurrent.futures
 import datetime as dt
 import os
-from typing import Dict
-import pickle
+import threading
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Tuple
 
+import numpy as np
 import pandas as pd
-import yfinance as yf
 
+import data_sources
+import frame_cache
+import rate_limiting
+import resampling
+import simulation
+import storage_formats
+# DataRetrievalInfo is imported here so that objects pickled before the coverage catalog existed can still be loaded
+from coverage_catalog import CoverageCatalog, DataRetrievalInfo  # noqa: F401
 
-class DataRetrievalInfo:
-    """
-    Keeps track of data which was previously retrieved.
+if TYPE_CHECKING:
+    # array_ticker imports this module, so it's only imported here for annotations and inside the functions which use it
+    import array_ticker
 
-    This will allow for data which was previously stored to be retrieved in the specified state
 
-    For example, if stock data already exists which covers the year 2020, and data for may of 2020 is retrieved, this data should be reused
-    instead of querying an API for it again.
+class BulkFetchResult:
+    """
+    Data retrieved for many tickers at once through StockDataProvider.get_tickers()
     """
 
-    def __init__(self, time, start, end, interval):
-        """
-        :param time: date string (YYYY-MM-DD) or datetime indicating when the data was retrieved
-        :param start: date string (YYYY-MM-DD) or datetime indicating the start of the retrieved data
-        :param end: date string (YYYY-MM-DD) or datetime indicating the end of the retrieved data
-        :param interval: Indicates the resolution of the data instances retrieved.
-            Valid intervals are: 1m, 2m, 5m, 15m, 30m, 60m, 90m, 1h, 1d, 5d, 1wk, 1mo, 3mo
-        """
-        self.time = dt.datetime.strptime(time, "%Y-%d-%m") if isinstance(time, str) else time
-        self.start = dt.datetime.strptime(start, "%Y-%d-%m") if isinstance(start, str) else start
-        self.end = dt.datetime.strptime(end, "%Y-%d-%m") if isinstance(end, str) else end
-        self.interval = interval
+    def __init__(self):
+        # format: "ticker_str": dataframe for every symbol which was retrieved successfully
+        self.data: Dict[str, pd.DataFrame] = {}
+
+        # format: "ticker_str": exception for every symbol which couldn't be retrieved
+        self.failures: Dict[str, Exception] = {}
+
+    def __getitem__(self, ticker_symbol: str) -> pd.DataFrame:
+        return self.data[ticker_symbol.upper()]
+
+    def __contains__(self, ticker_symbol: str) -> bool:
+        return ticker_symbol.upper() in self.data
 
 
 class StockDataProvider:
 
-    def __init__(self, ticker_directory=os.path.join('stored_data', 'tickers')):
+    def __init__(self, ticker_directory=os.path.join('stored_data', 'tickers'), storage_format='npy', catalog: CoverageCatalog = None,
+                 cache: frame_cache.FrameCache = None, data_source: data_sources.DataSourceADT = None):
         """
 
-        :param tolerance: Expiration value for ticker data in seconds. e.g. if stock is more than 300 seconds old, get
-        new data.
         :param ticker_directory: Location to store pickled stock data in
+        :param storage_format: Name of the format to store ticker data in (see storage_formats.STORAGE_FORMATS) or a StorageFormatADT object.
+        Existing csv data can be converted using storage_formats.migrate_ticker_directory().
+        :param catalog: Keeps track of which ranges of data have been stored. Default: a catalog stored in ticker_directory
+        :param cache: Keeps loaded ticker data in memory. Default: frame_cache.shared_frame_cache, which is shared by all providers
+        :param data_source: Where any data which isn't stored yet is downloaded from. Default: yahoo finance
         """
 
         self.ticker_directory = ticker_directory
+        self.storage_format = storage_formats.get_storage_format(storage_format)
+
+        # information about which ranges of data have been retrieved for every symbol and interval
+        self.catalog = catalog if catalog is not None else CoverageCatalog(os.path.join(ticker_directory, 'coverage.sqlite3'))
+
+        # stored data which has already been loaded. Keys include the directory since the cache may be shared by multiple providers.
+        self.cache = cache if cache is not None else frame_cache.shared_frame_cache
+
+        self.data_source = data_source if data_source is not None else data_sources.YFinanceDataSource()
 
-        # information about the last time a specific ticker was retrieved
-        # format: "ticker_str": DataRetrievalInfo
-        self.last_retrieval_info_dict: Dict[str, DataRetrievalInfo] = {}
+        # stops multiple threads (e.g. a RefreshScheduler and the trading loop) from updating the same stored data at the same time
+        # format: (symbol, interval): lock
+        self._write_locks: Dict[Tuple[str, str], threading.RLock] = {}
+        self._write_locks_lock = threading.Lock()
 
         # time delta values for valid intervals. Allows for data to be updated effectively.
         self.interval_deltas = {
@@ -74,9 +97,34 @@ class StockDataProvider:
 
         self.MAX_PAST = "1970-01-01"
 
+    @staticmethod
+    def storage_name(ticker_symbol: str, interval: str) -> str:
+        """
+        Get the name which data for a ticker at a specific interval is stored under, e.g. MSFT_1d
+        """
+        return f'{ticker_symbol.upper()}_{interval}'
+
+    def cache_key(self, ticker_symbol: str, interval: str, resampled_from: str = None) -> Tuple:
+        """
+        Get the key which all stored data for a ticker at a specific interval is cached under
+
+        :param resampled_from: For data which was built from stored data at a finer interval, the interval it was built from
+        """
+        if resampled_from is not None:
+            return self.ticker_directory, ticker_symbol.upper(), interval, resampled_from
+        return self.ticker_directory, ticker_symbol.upper(), interval
+
+    def write_lock(self, ticker_symbol: str, interval: str) -> threading.RLock:
+        """
+        Get the lock which must be held while changing the stored data for a ticker at a specific interval
+        """
+        with self._write_locks_lock:
+            return self._write_locks.setdefault((ticker_symbol.upper(), interval), threading.RLock())
+
     def store_ticker(self, ticker_symbol: str, **kwargs) -> pd.DataFrame:
         r"""
-        Query yahoo finance for any new stock data and store it as a csv file in self.ticker_directory
+        Query yahoo finance for any new stock data and store it in self.ticker_directory using self.storage_format, replacing any data
+        which was previously stored for the ticker at this interval
 
         :param \**kwargs: See below
 
@@ -95,26 +143,115 @@ class StockDataProvider:
         end = kwargs['end'] if 'end' in kwargs else dt.datetime.now()
         interval = kwargs['interval'] if 'interval' in kwargs else '1d'
 
+        # get stock data from yahoo finance
+        ticker_dataframe = self.download_ticker(ticker_symbol, start=start, end=end, interval=interval)
+
+        with self.write_lock(ticker_symbol, interval):
+            self.save_ticker(ticker_symbol, interval, ticker_dataframe)
+            self.catalog.set_coverage(ticker_symbol, interval, start, end)
+
+        return ticker_dataframe
+
+    def download_ticker(self, ticker_symbol: str, start, end, interval: str) -> pd.DataFrame:
+        """
+        Query self.data_source for stock data without storing it
+
+        :return: Pandas dataframe containing data for the given ticker between start and end
+        """
+        ticker_dataframes = self.data_source.download([ticker_symbol], start=start, end=end, interval=interval)
+
+        if ticker_symbol not in ticker_dataframes:
+            raise LookupError(f"No data was returned for {ticker_symbol}")
+
+        return ticker_dataframes[ticker_symbol]
+
+    def save_ticker(self, ticker_symbol: str, interval: str, ticker_dataframe: pd.DataFrame):
+        """
+        Write ticker data to self.ticker_directory. self.catalog should be updated with the range this data covers afterwards.
+        """
+
         # create a new directory to store the data if it doesn't already exist
         if not os.path.exists(self.ticker_directory):
-            os.mkdirs(self.ticker_directory)
+            os.makedirs(self.ticker_directory)
 
-        # get stock data from yahoo finance
-        ticker_dataframe = yf.download(ticker_symbol, start=start, end=end, interval=interval)
+        self.storage_format.write(self.ticker_directory, self.storage_name(ticker_symbol, interval), ticker_dataframe)
+        self.catalog.record_rewrite(ticker_symbol, interval)
+        self.cache.put(self.cache_key(ticker_symbol, interval), ticker_dataframe)
+        self.invalidate_resampled(ticker_symbol, interval)
 
-        self.last_retrieval_info_dict[ticker_symbol] = DataRetrievalInfo(dt.datetime.now(), start=start, end=end, interval=interval)
-        ticker_dataframe.to_csv(os.path.join(self.ticker_directory, f'{ticker_symbol}.csv'))
+    def append_ticker(self, ticker_symbol: str, interval: str, new_dataframe: pd.DataFrame):
+        """
+        Add newly retrieved data to the data stored for a ticker. Depending on self.storage_format, this may only rewrite part of the stored
+        data (see storage_formats.PartitionedStorageFormat). self.catalog should be updated with the range this data covers afterwards.
+        """
+        cache_key = self.cache_key(ticker_symbol, interval)
+        cached_dataframe = self.cache.get(cache_key)
 
-        # pickle the DataRetrievalInfo object
-        with open(os.path.join(self.ticker_directory, f"{ticker_symbol}.dri.pkl"), 'wb') as f:
-            pickle.dump(self.last_retrieval_info_dict[ticker_symbol], f)
+        self.storage_format.append(self.ticker_directory, self.storage_name(ticker_symbol, interval), new_dataframe)
+        if len(new_dataframe):
+            first_time = pd.DatetimeIndex(new_dataframe.index).min()
+            self.catalog.record_append(ticker_symbol, interval, storage_formats.to_utc_ns(first_time))
 
-        return ticker_dataframe
+        if cached_dataframe is not None:
+            self.cache.put(cache_key, self.merge_ticker_data(cached_dataframe, new_dataframe))
+        self.invalidate_resampled(ticker_symbol, interval)
 
-    def get_ticker(self, ticker_symbol: str, start=None, end=None, interval=None) -> pd.DataFrame:
+    def invalidate_resampled(self, ticker_symbol: str, interval: str):
+        """
+        Remove anything which was resampled from the stored data at this interval from self.cache, since it is now out of date
+        """
+        for target_interval in self.interval_deltas:
+            if resampling.can_resample(interval, target_interval):
+                self.cache.invalidate(self.cache_key(ticker_symbol, target_interval, resampled_from=interval))
+
+    @staticmethod
+    def merge_ticker_data(stored_dataframe: pd.DataFrame, new_dataframe: pd.DataFrame) -> pd.DataFrame:
+        """
+        Combine newly retrieved data with stored data. Where both contain the same time, the newly retrieved value is kept.
+        """
+        return storage_formats.merge_dataframes(stored_dataframe, new_dataframe)
+
+    def update_ticker(self, ticker_symbol: str, interval: str, ranges: List[Tuple[dt.datetime, dt.datetime]]) -> pd.DataFrame:
+        """
+        Retrieve only the given missing ranges for a stored ticker and add them to the stored data
+
+        :param ranges: (start, end) ranges which are missing from the stored data. See CoverageCatalog.missing_ranges()
+        :return: Pandas dataframe containing only the newly retrieved data
+        """
+        new_data = None
+        for range_start, range_end in ranges:
+            range_data = self.download_ticker(ticker_symbol, start=range_start, end=range_end, interval=interval)
+            new_data = range_data if new_data is None else self.merge_ticker_data(new_data, range_data)
+
+        with self.write_lock(ticker_symbol, interval):
+            self.append_ticker(ticker_symbol, interval, new_data)
+            for range_start, range_end in ranges:
+                self.catalog.add_coverage(ticker_symbol, interval, range_start, range_end)
+
+        return new_data
+
+    def parse_request_range(self, start=None, end=None, interval=None) -> Tuple[dt.datetime, dt.datetime, str]:
+        """
+        Fill in defaults for a requested range of data and convert date strings (YYYY-MM-DD) to datetime objects
+
+        :return: start, end, interval
+        """
+        start = start if start is not None else self.MAX_PAST
+        end = end if end is not None else dt.datetime.now()
+
+        # convert start and end to datetime objects
+        start = dt.datetime.strptime(start, "%Y-%m-%d") if isinstance(start, str) else start
+        end = dt.datetime.strptime(end, "%Y-%m-%d") if isinstance(end, str) else end
+
+        interval = interval if interval is not None else '1d'
+
+        return start, end, interval
+
+    def get_ticker(self, ticker_symbol: str, start=None, end=None, interval=None, columns=None) -> pd.DataFrame:
         r"""
-        See if the current stock data is up to date. If it is, then return it. If not, call self.store_ticker() to query yahoo finance for
-        up-to-date stock data.
+        See if the current stock data is up to date. If it is, then return it. If not, query yahoo finance for only the ranges which are
+        missing from the stored data and add them to it. If stored data at a finer interval covers the range (e.g. 1m data when 1h data is
+        requested), it is resampled instead of querying yahoo finance at all.
         This process allows for less API calls to be made which has the following benifits:
         - Results in a shorter runtime
         - Reduces chance of being banned from accessing yahoo finance
@@ -123,57 +260,271 @@ class StockDataProvider:
         :param start: start of stock data. Default: 1970-01-01
         :param end: end of stock data. Default: now
         :param interval: How much space should be between each datapoint; the resolution of the data. Default: '1d'
-        :return: Pandas dataframe containing data for the given ticker
+        :param columns: Only return these columns (e.g. ['Close', 'Volume']). When the stored data is up to date and isn't cached, only
+        these columns are read. All columns are returned by default.
+        :return: Pandas dataframe containing data for the given ticker. When the data is already cached in memory this is a slice of the
+        cached dataframe, so it shouldn't be modified.
         """
 
         ticker_dataframe = None
 
         ticker_symbol = ticker_symbol.upper()
 
-        start = start if start is not None else self.MAX_PAST
-        end = end if end is not None else dt.datetime.now()
+        start, end, interval = self.parse_request_range(start, end, interval)
 
-        # convert start and end to datetime objects
-        start = dt.datetime.strptime(start, "%Y-%d-%m") if isinstance(start, str) else start
-        end = dt.datetime.strptime(end, "%Y-%d-%m") if isinstance(end, str) else end
+        tolerance = self.interval_deltas[interval]
 
-        interval = interval if interval is not None else '1d'
+        # if the ticker has already been stored at this interval, see if it covers the right range
+        ranges = None
+        if self.storage_format.exists(self.ticker_directory, self.storage_name(ticker_symbol, interval)) and \
+                self.catalog.get_coverage(ticker_symbol, interval):
+            ranges = self.catalog.missing_ranges(ticker_symbol, interval, start, end, tolerance)
+
+        if ranges == []:
+            return self.load_ticker(ticker_symbol, columns=columns, interval=interval, start=start, end=end)
+        else:
+            # stored data at a finer interval can be combined into bars at this interval without making any API calls
+            ticker_dataframe = self.load_resampled_ticker(ticker_symbol, start, end, interval)
+
+            # if the above checks for valid existing ticker data were unsuccessful, retrieve whatever is missing
+            if ticker_dataframe is None and ranges:
+                self.update_ticker(ticker_symbol, interval, ranges)
+                ticker_dataframe = self.load_ticker(ticker_symbol, interval=interval, start=start, end=end)
+            elif ticker_dataframe is None:
+                ticker_dataframe = self.store_ticker(ticker_symbol, start=start, end=end, interval=interval)
+
+        ticker_dataframe = storage_formats.slice_rows(ticker_dataframe, start, end)
+        return ticker_dataframe[list(columns)] if columns is not None else ticker_dataframe
 
+    def load_resampled_ticker(self, ticker_symbol: str, start: dt.datetime, end: dt.datetime, interval: str) -> pd.DataFrame:
+        """
+        Build data at an interval from stored data at a finer interval, e.g. 1h bars from 1m bars. The result is kept in self.cache.
+
+        :return: All stored data for the ticker resampled to the given interval, or None if no stored data at a finer interval covers the
+        range start-end
+        """
         tolerance = self.interval_deltas[interval]
 
-        ticker_file_path = os.path.join(self.ticker_directory, f'{ticker_symbol}.csv')
-
-        # if the ticker has already been stored, see if it is up to date. If not, store it again.
-        if os.path.isfile(ticker_file_path):
-            retrieval_info = None
-            # attempt to get information about when this data was last stored
-            if ticker_symbol in self.last_retrieval_info_dict:
-                retrieval_info = self.last_retrieval_time_dict[ticker_symbol]
-            elif os.path.isfile(os.path.join(self.ticker_directory, f"{ticker_symbol}.dri.pkl")):
-                with open(os.path.join(self.ticker_directory, f"{ticker_symbol}.dri.pkl"), 'rb') as f:
-                    retrieval_info = pickle.load(f)
-            # if data about the last retrieval is available, see if it is too old or not the right resolution
-            if retrieval_info and retrieval_info.interval == interval:
-                # see if the previous data covers the right range. If not, get new data
-                min_start = start+tolerance
-                max_end = end-tolerance
-                if retrieval_info.start <= min_start and retrieval_info.end >= max_end:
-                    ticker_dataframe = self.store_ticker(ticker_symbol, start=start, end=end).loc[start:end]
-                else:
-                    ticker_dataframe = self.store_ticker(ticker_symbol, start=start, end=end)
-                    print('stock data updated: ', end='')
-                    if retrieval_info.start > min_start:
-                        print('(earlier start time was requested)')
+        for source_interval in resampling.source_intervals(interval):
+            if not self.storage_format.exists(self.ticker_directory, self.storage_name(ticker_symbol, source_interval)) or \
+                    not self.catalog.get_coverage(ticker_symbol, source_interval) or \
+                    self.catalog.missing_ranges(ticker_symbol, source_interval, start, end, tolerance):
+                continue
+
+            cache_key = self.cache_key(ticker_symbol, interval, resampled_from=source_interval)
+            ticker_dataframe = self.cache.get(cache_key)
+            if ticker_dataframe is None:
+                ticker_dataframe = resampling.resample_ohlcv(self.load_ticker(ticker_symbol, interval=source_interval), interval)
+                self.cache.put(cache_key, ticker_dataframe)
+
+            return ticker_dataframe
+
+        return None
+
+    def get_ticker_arrays(self, ticker_symbol: str, start=None, end=None, interval=None, columns=None) -> Dict[str, np.ndarray]:
+        """
+        Get data for a ticker as numpy arrays rather than a dataframe. Missing data is retrieved the same way as in self.get_ticker().
+
+        When self.storage_format is a MemmapStorageFormat, the returned arrays are views of the memory mapped files, so only the requested
+        range is ever read from disk and nothing is copied.
+
+        :param columns: Only get these columns (e.g. ['Close', 'Volume']). All columns are returned by default.
+        :return: column: array for every column, along with 'timestamps', which holds each row's time as int64 nanoseconds since the epoch
+        (UTC). See StorageFormatADT.read_arrays()
+        """
+        ticker_symbol = ticker_symbol.upper()
+        start, end, interval = self.parse_request_range(start, end, interval)
+        storage_name = self.storage_name(ticker_symbol, interval)
+
+        if not self.storage_format.exists(self.ticker_directory, storage_name) or not self.catalog.get_coverage(ticker_symbol, interval) or \
+                self.catalog.missing_ranges(ticker_symbol, interval, start, end, self.interval_deltas[interval]):
+            ticker_dataframe = self.get_ticker(ticker_symbol, start=start, end=end, interval=interval)
+
+            # data which was resampled from a finer interval isn't stored
+            if not self.storage_format.exists(self.ticker_directory, storage_name):
+                return storage_formats.dataframe_to_arrays(ticker_dataframe[list(columns)] if columns is not None else ticker_dataframe)
+
+        return self.storage_format.read_arrays(self.ticker_directory, storage_name, start=start, end=end, columns=columns)
+
+    def get_tickers(self, ticker_symbols: Iterable[str], start=None, end=None, interval=None, batch_size: int = None, max_workers: int = 8,
+                    requests_per_second: float = 2.0, max_retries: int = 3, columns=None, tolerance: dt.timedelta = None) -> 'BulkFetchResult':
+        """
+        Get data for many tickers at once. Only ranges which are missing from the stored data are downloaded. Symbols which need the same
+        range are requested together in batches, which are downloaded on a pool of threads while keeping under a request rate limit.
+        Failed requests are retried with exponential backoff. A symbol failing doesn't stop the rest of the symbols from being retrieved.
+
+        :param ticker_symbols: Stock tickers to get data for e.g. ['MSFT', 'AMD']
+        :param start: start of stock data. Default: 1970-01-01
+        :param end: end of stock data. Default: now
+        :param interval: How much space should be between each datapoint; the resolution of the data. Default: '1d'
+        :param batch_size: Most symbols to request at once. Default: self.data_source.max_batch_size
+        :param max_workers: How many requests can be made at the same time
+        :param requests_per_second: Long term limit for how often requests are made
+        :param max_retries: How many times a failed request is retried
+        :param columns: Only return these columns (e.g. ['Close', 'Volume']). All columns are returned by default.
+        :param tolerance: Missing ranges which are no longer than this aren't downloaded. Default: self.interval_deltas[interval]
+        :return: The data for every symbol which was retrieved, and the reason every other symbol failed
+        """
+        start, end, interval = self.parse_request_range(start, end, interval)
+        tolerance = tolerance if tolerance is not None else self.interval_deltas[interval]
+        batch_size = batch_size if batch_size is not None else self.data_source.max_batch_size
+
+        result = BulkFetchResult()
+
+        # group together symbols which are missing data up to the same time so that they can be requested at once. This is usually the
+        # requested end time, since most symbols are only missing their latest data.
+        # format: range end: [(range start, symbol), ...]
+        symbols_by_end: Dict[dt.datetime, List[Tuple[dt.datetime, str]]] = {}
+        for ticker_symbol in dict.fromkeys(symbol.upper() for symbol in ticker_symbols):
+            if self.storage_format.exists(self.ticker_directory, self.storage_name(ticker_symbol, interval)):
+                ranges = self.catalog.missing_ranges(ticker_symbol, interval, start, end, tolerance)
+            else:
+                self.catalog.remove_coverage(ticker_symbol, interval)
+                ranges = [(start, end)]
+            for range_start, range_end in ranges:
+                symbols_by_end.setdefault(range_end, []).append((range_start, ticker_symbol))
+            result.data[ticker_symbol] = None
+
+        rate_limiter = rate_limiting.TokenBucket(requests_per_second, capacity=max(1, int(requests_per_second)))
+
+        def download_batch(batch: List[str], range_start: dt.datetime, range_end: dt.datetime) -> Dict[str, pd.DataFrame]:
+            def request():
+                rate_limiter.acquire()
+                return self.data_source.download(batch, start=range_start, end=range_end, interval=interval)
+
+            return rate_limiting.retry_with_backoff(request, max_retries=max_retries)
+
+        # format: symbol: [((start, end), dataframe), ...]
+        downloaded: Dict[str, List[Tuple[Tuple[dt.datetime, dt.datetime], pd.DataFrame]]] = {}
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+            for range_end, range_symbols in symbols_by_end.items():
+                # symbols with similar start times are batched together. Each batch is requested from the earliest start in it, so a symbol
+                # is only added to a batch if that wouldn't more than double the amount of data requested for it.
+                batches: List[List[Tuple[dt.datetime, str]]] = []
+                for range_start, ticker_symbol in sorted(range_symbols):
+                    if batches and len(batches[-1]) < batch_size and range_start - batches[-1][0][0] <= range_end - range_start:
+                        batches[-1].append((range_start, ticker_symbol))
+                    else:
+                        batches.append([(range_start, ticker_symbol)])
+
+                for batch_ranges in batches:
+                    batch = [ticker_symbol for _, ticker_symbol in batch_ranges]
+                    missing_range = (batch_ranges[0][0], range_end)
+                    futures[executor.submit(download_batch, batch, *missing_range)] = (batch, missing_range)
+
+            for future in concurrent.futures.as_completed(futures):
+                batch, missing_range = futures[future]
+                try:
+                    batch_dataframes = future.result()
+                except Exception as e:
+                    for ticker_symbol in batch:
+                        result.failures[ticker_symbol] = e
+                    continue
+
+                for ticker_symbol in batch:
+                    if ticker_symbol in batch_dataframes:
+                        downloaded.setdefault(ticker_symbol, []).append((missing_range, batch_dataframes[ticker_symbol]))
                     else:
-                        print('(later end time was requested)')
+                        result.failures[ticker_symbol] = LookupError(f"No data was returned for {ticker_symbol}")
+
+            # write whatever was retrieved for each symbol to the store
+            futures = {executor.submit(self.merge_downloaded_ranges, ticker_symbol, interval, pieces): ticker_symbol
+                       for ticker_symbol, pieces in downloaded.items()}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    result.failures[futures[future]] = e
+
+        for ticker_symbol in list(result.data):
+            if ticker_symbol in result.failures:
+                del result.data[ticker_symbol]
             else:
-                ticker_dataframe = self.store_ticker(ticker_symbol, start=start, end=end)
-                print('stock data updated to new resolution')
-        # if the above check for valid existing ticker data was unsuccessful, retrieve new data
-        else:
-            ticker_dataframe = self.store_ticker(ticker_symbol, start=start, end=end)
+                result.data[ticker_symbol] = self.load_ticker(ticker_symbol, columns=columns, interval=interval, start=start, end=end)
 
-        return ticker_dataframe
+        return result
+
+    def merge_downloaded_ranges(self, ticker_symbol: str, interval: str,
+                                pieces: List[Tuple[Tuple[dt.datetime, dt.datetime], pd.DataFrame]]) -> pd.DataFrame:
+        """
+        Add downloaded data to the stored data for a ticker, or store it as new data if nothing is stored yet
+
+        :param pieces: ((start, end), dataframe) for every range which was downloaded
+        :return: Pandas dataframe containing only the newly retrieved data
+        """
+        new_data = pieces[0][1].iloc[:0]
+        for _, piece_data in pieces:
+            new_data = self.merge_ticker_data(new_data, piece_data)
+
+        with self.write_lock(ticker_symbol, interval):
+            if self.catalog.get_coverage(ticker_symbol, interval):
+                self.append_ticker(ticker_symbol, interval, new_data)
+            else:
+                self.save_ticker(ticker_symbol, interval, new_data)
+            for (range_start, range_end), _ in pieces:
+                self.catalog.add_coverage(ticker_symbol, interval, range_start, range_end)
+
+        return new_data
+
+    def load_ticker(self, ticker_symbol: str, columns=None, interval: str = '1d', start=None, end=None) -> pd.DataFrame:
+        """
+        Load previously stored data for a ticker without checking if it is up to date. All columns are kept in self.cache, so loading the
+        same ticker again won't read from disk.
+
+        :param ticker_symbol: A stock ticker to load data for e.g. 'MSFT'
+        :param columns: Only load these columns (e.g. ['Close', 'Volume']). All columns are loaded by default.
+        :param interval: Resolution of the stored data to load
+        :param start: Only load data at or after this time
+        :param end: Only load data at or before this time
+        :return: Pandas dataframe containing the stored data for the given ticker
+        """
+        storage_name = self.storage_name(ticker_symbol, interval)
+        ticker_dataframe = self.cache.get(self.cache_key(ticker_symbol, interval))
+
+        if ticker_dataframe is None:
+            # when nothing is cached, only read the requested columns, and only the requested range if the storage format can skip the rest
+            if columns is not None or (self.storage_format.supports_range_reads and (start is not None or end is not None)):
+                return self.storage_format.read_range(self.ticker_directory, storage_name, start=start, end=end, columns=columns)
+
+            ticker_dataframe = self.storage_format.read(self.ticker_directory, storage_name)
+            self.cache.put(self.cache_key(ticker_symbol, interval), ticker_dataframe)
+
+        if start is not None or end is not None:
+            ticker_dataframe = storage_formats.slice_rows(ticker_dataframe, start, end)
+
+        return ticker_dataframe[list(columns)] if columns is not None else ticker_dataframe
+
+    def export_ticker(self, ticker_symbol: str, export_directory: str, export_format='csv', interval: str = '1d'):
+        """
+        Write previously stored data for a ticker to another directory, e.g. as a csv file which can be opened in a spreadsheet
+
+        :param ticker_symbol: A stock ticker to export data for e.g. 'MSFT'
+        :param export_directory: Where the exported data should be written
+        :param export_format: Name of the format to export the data in (see storage_formats.STORAGE_FORMATS) or a StorageFormatADT object
+        :param interval: Resolution of the stored data to export
+        """
+        storage_formats.get_storage_format(export_format).write(export_directory, self.storage_name(ticker_symbol, interval),
+                                                                self.load_ticker(ticker_symbol, interval=interval))
+
+    def migrate_retrieval_pickles(self) -> List[str]:
+        """
+        Move data stored before the coverage catalog existed (one {SYMBOL} file and one {SYMBOL}.dri.pkl file per symbol) into the
+        catalog, and rename the stored data to include its interval.
+
+        :return: Symbols which were migrated
+        """
+        imported = self.catalog.import_retrieval_pickles(self.ticker_directory, remove=True)
+
+        for ticker_symbol, retrieval_info in imported.items():
+            if self.storage_format.exists(self.ticker_directory, ticker_symbol):
+                self.save_ticker(ticker_symbol, retrieval_info.interval, self.storage_format.read(self.ticker_directory, ticker_symbol))
+                self.storage_format.delete(self.ticker_directory, ticker_symbol)
+            else:
+                self.catalog.remove_coverage(ticker_symbol, retrieval_info.interval)
+
+        return sorted(imported)
 
 
 class SimulatedStockDataProvider(StockDataProvider):
@@ -181,23 +532,45 @@ class SimulatedStockDataProvider(StockDataProvider):
     After some initial setup, allows for a new data instance to be retrieved every time get_ticker() is called
 
     This allows for a stock trading algorithm can be easily tested against old data
+
+    Each ticker's data is converted to arrays once when the simulation starts, and a cursor marks how many of its rows are visible.
+    Advancing moves the cursor, and the data returned is a view of the rows before it, so every step takes O(1) time and copies nothing.
     """
 
     def __init__(self, ticker_directory=os.path.join('stored_data', 'tickers'),
-                 data: Dict[str, pd.DataFrame] = None, sim_start=None, sim_end=None):
-        super().__init__(self, ticker_directory)
-        self.ticker_data: Dict[str, pd.Dataframe] = data
+                 data: Dict[str, pd.DataFrame] = None, sim_start=None, sim_end=None, interval: str = '1d', **kwargs):
+        r"""
+        :param data: "ticker_str": dataframe to replay for every ticker. Tickers which aren't given are loaded through
+        StockDataProvider.get_ticker() when they are first requested.
+        :param sim_start: Time of the last row which is visible before the first step. Default: only the first row is visible
+        :param sim_end: Time of the last row which will be replayed. Default: the last row
+        :param interval: Resolution of the data which is loaded for tickers which aren't given
+        :param \**kwargs: Passed to StockDataProvider e.g. storage_format
+        """
+        super().__init__(ticker_directory, **kwargs)
+        self.ticker_data: Dict[str, pd.DataFrame] = {symbol.upper(): dataframe for symbol, dataframe in (data or {}).items()}
+        self.interval = interval
 
-        self.last_instance_index = None
+        # format: "ticker_str": index of the last visible row, or None if get_ticker() hasn't been called for the ticker yet
+        self.last_instance_index: Dict[str, int] = {}
 
         self.sim_start = sim_start
         self.sim_end = sim_end
 
+        # format: "ticker_str": (dataframe, arrays, rows visible before the first step, rows visible once the simulation ends)
+        self._replays: Dict[str, Tuple[pd.DataFrame, 'array_ticker.ArrayTicker', int, int]] = {}
+        # format: ("ticker_str", columns): dataframe with only those columns, so that get_ticker(columns=...) doesn't copy on every step
+        self._projections: Dict[Tuple[str, Tuple[str, ...]], pd.DataFrame] = {}
+
     def get_updated_data(self, ticker, start=None, end=None, interval='1d'):
         """
         Retrieve up-to-date stock data for this object
         """
-        self.ticker_data['ticker'] = super().get_ticker(ticker, start=start, end=end, interval=interval)
+        ticker = ticker.upper()
+        self.ticker_data[ticker] = super().get_ticker(ticker, start=start, end=end, interval=interval)
+        self._replays.pop(ticker, None)
+        self._projections = {key: dataframe for key, dataframe in self._projections.items() if key[0] != ticker}
+        self.last_instance_index.pop(ticker, None)
 
     def start_simulation(self, sim_start, sim_end):
         """
@@ -207,16 +580,123 @@ class SimulatedStockDataProvider(StockDataProvider):
         will require that a certain number of data items already exist to work with.
         :param sim_end: Where the simulation should end
         """
-        self.last_instance_index = None
+        self.sim_start = sim_start
+        self.sim_end = sim_end
+        self.last_instance_index = {}
+        self._replays = {}
+        self._projections = {}
+
+        for ticker in self.ticker_data:
+            self._replay(ticker)
+
+    def _replay(self, ticker: str) -> Tuple[pd.DataFrame, 'array_ticker.ArrayTicker', int, int]:
+        # prepare a ticker for replaying the first time it is needed
+        if ticker not in self._replays:
+            import array_ticker
+
+            if ticker not in self.ticker_data:
+                self.ticker_data[ticker] = super().get_ticker(ticker, interval=self.interval)
+
+            ticker_dataframe = self.ticker_data[ticker]
+            replay_arrays = array_ticker.ArrayTicker.from_dataframe(ticker, ticker_dataframe, interval=self.interval)
+
+            first_rows = len(replay_arrays.slice(end=self.sim_start)) if self.sim_start is not None else 1
+            last_rows = len(replay_arrays.slice(end=self.sim_end)) if self.sim_end is not None else len(replay_arrays)
+            self._replays[ticker] = (ticker_dataframe, replay_arrays, max(1, first_rows), max(1, first_rows, last_rows))
+
+        return self._replays[ticker]
+
+    def advance(self, ticker: str) -> bool:
+        """
+        Make one more row of a ticker visible
+
+        :return: False if the simulation has already reached sim_end for this ticker
+        """
+        ticker = ticker.upper()
+        _, _, first_rows, last_rows = self._replay(ticker)
+
+        if ticker not in self.last_instance_index:
+            self.last_instance_index[ticker] = first_rows - 1
+            return True
+
+        if self.last_instance_index[ticker] + 1 >= last_rows:
+            return False
+
+        self.last_instance_index[ticker] += 1
+        return True
+
+    def finished(self, ticker: str) -> bool:
+        """
+        Whether or not every row of a ticker up to sim_end is visible
+        """
+        ticker = ticker.upper()
+        _, _, _, last_rows = self._replay(ticker)
+        return self.last_instance_index.get(ticker, -1) + 1 >= last_rows
+
+    def current_arrays(self, ticker: str) -> 'array_ticker.ArrayTicker':
+        """
+        Get the visible rows of a ticker as an ArrayTicker of views, without advancing
+        """
+        ticker = ticker.upper()
+        _, replay_arrays, first_rows, _ = self._replay(ticker)
+        return replay_arrays[:self.last_instance_index.get(ticker, first_rows - 1) + 1]
+
+    def replay(self, ticker: str) -> Iterator['array_ticker.ArrayTicker']:
+        """
+        Advance through a ticker until sim_end, yielding the visible rows after every step
+        """
+        while self.advance(ticker):
+            yield self.current_arrays(ticker)
+
+    def replay_tickers(self, tickers: Iterable[str] = None, block_size: int = 1024) -> Iterator[simulation.ReplayTick]:
+        """
+        Advance through many tickers together in time order until sim_end, yielding every bar at the same time as one batch.
+
+        The cursor of every ticker in a batch is moved to its bar before the batch is yielded, so current_arrays() gives each ticker's rows
+        up to the current time. Tickers without a bar at a time (missing bars, or not listed yet) keep their previous rows. See
+        simulation.MultiSymbolReplay
+
+        :param tickers: Tickers to replay. Default: every ticker given when the provider was created
+        """
+        tickers = [ticker.upper() for ticker in tickers] if tickers is not None else list(self.ticker_data)
+
+        timestamps, start_rows, end_rows = {}, {}, {}
+        for ticker in tickers:
+            _, replay_arrays, _, last_rows = self._replay(ticker)
+            # rows up to sim_start are visible before the first batch, even for tickers which list later and have none
+            visible_rows = len(replay_arrays.slice(end=self.sim_start)) if self.sim_start is not None else 0
 
-    def get_ticker(self, ticker: str) -> pd.DataFrame:
+            timestamps[ticker] = replay_arrays.timestamps
+            start_rows[ticker] = visible_rows
+            end_rows[ticker] = last_rows
+            self.last_instance_index[ticker] = visible_rows - 1
+
+        for tick in simulation.MultiSymbolReplay(timestamps, start_rows, end_rows, block_size=block_size):
+            for ticker, row in zip(tick.symbols, tick.rows):
+                self.last_instance_index[ticker] = row
+            yield tick
+
+    def get_ticker(self, ticker: str, start=None, end=None, interval=None, columns=None) -> pd.DataFrame:
         """
         Should start by returning the dataframe from the start to the sim_start dates. After the first data instance is given, preceding items
         should include one more instance.
+
+        Once sim_end is reached, the same rows keep being returned. The result is a view of the replayed data, so it shouldn't be modified.
+
+        :param start: Only return rows from this time on
+        :param end: Ignored, since rows after the current one aren't visible
+        :param interval: Ignored. Every ticker is replayed at the interval it was loaded at.
+        :param columns: Only return these columns
         """
-        if not self.last_instance_index:
-            # get data from the start of the dataframe to sim_start
-            pass
-        else:
-            # get data from the start of the dataframe to 1 item after last_instance_index
-            pass
+        ticker = ticker.upper()
+        self.advance(ticker)
+
+        ticker_dataframe, replay_arrays, first_rows, _ = self._replay(ticker)
+        first_row = storage_formats.find_rows(replay_arrays.timestamps, start, None, replay_arrays.timezone)[0] if start is not None else 0
+        if columns is not None:
+            key = (ticker, tuple(columns))
+            if key not in self._projections:
+                self._projections[key] = ticker_dataframe[list(columns)]
+            ticker_dataframe = self._projections[key]
+
+        return ticker_dataframe.iloc[first_row:self.last_instance_index[ticker] + 1]
@@ -0,0 +1,415 @@
+__author__ = "Ethan Posner"
+__copyright__ = ""
+__credits__ = []
+__license__ = ""
+__version__ = "0,1dev"
+__maintainer__ = "Ethan Posner"
+__status__ = "Production"
+
+import http.server
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import zlib
+from abc import ABC, abstractmethod
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+import resampling
+import storage_formats
+
+
+class DataSourceADT(ABC):
+    """
+    Somewhere which stock data can be downloaded from. StockDataProvider uses one of these to retrieve any data which isn't stored yet.
+    """
+
+    # how many symbols should be requested at once by StockDataProvider.get_tickers()
+    max_batch_size: int = 1
+
+    @abstractmethod
+    def download(self, ticker_symbols: List[str], start, end, interval: str) -> Dict[str, pd.DataFrame]:
+        """
+        Download data for one or more symbols in a single request
+
+        :param ticker_symbols: Symbols to download data for e.g. ['MSFT', 'AMD']
+        :param start: Start time for data. Can be string (YYYY-MM-DD) or datetime
+        :param end: End time for data. Can be string (YYYY-MM-DD) or datetime
+        :param interval: How much space should be between each data item; the data resolution
+        :return: symbol: dataframe with Open, High, Low, Close, Adj Close and Volume columns. Symbols which no data was found for are left
+        out.
+        """
+        pass
+
+
+class YFinanceDataSource(DataSourceADT):
+    """
+    Downloads data from yahoo finance through yfinance
+    """
+
+    max_batch_size = 50
+
+    def download(self, ticker_symbols: List[str], start, end, interval: str) -> Dict[str, pd.DataFrame]:
+        ticker_dataframe = yf.download(ticker_symbols, start=start, end=end, interval=interval, group_by='ticker', threads=False,
+                                       progress=False)
+
+        ticker_dataframes = {}
+        for ticker_symbol in ticker_symbols:
+            # data for multiple symbols is returned with the symbol as the first column level
+            if isinstance(ticker_dataframe.columns, pd.MultiIndex):
+                if ticker_symbol not in ticker_dataframe.columns.get_level_values(0):
+                    continue
+                symbol_dataframe = ticker_dataframe[ticker_symbol].dropna(how='all')
+            else:
+                symbol_dataframe = ticker_dataframe
+
+            symbol_dataframe.columns.name = None
+            if len(symbol_dataframe):
+                ticker_dataframes[ticker_symbol] = symbol_dataframe
+
+        return ticker_dataframes
+
+
+class DataSourceUnavailableException(Exception):
+    """
+    Should be thrown when a data source can't be reached or responds with an error. Requests which fail this way may succeed if retried.
+    """
+    pass
+
+
+def _session_times(start, end, interval: str) -> pd.DatetimeIndex:
+    """
+    Get the times which a US stock exchange would have bars for at the given interval between start (inclusive) and end (exclusive)
+    """
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    if start.tzinfo is not None:
+        start = start.tz_convert('America/New_York').tz_localize(None)
+    if end.tzinfo is not None:
+        end = end.tz_convert('America/New_York').tz_localize(None)
+
+    if interval in resampling.INTRADAY_MINUTES:
+        minutes = resampling.INTRADAY_MINUTES[interval]
+        days = pd.bdate_range(start.normalize(), end)
+        # bars from 9:30 until 16:00
+        offsets = pd.to_timedelta(np.arange(9 * 60 + 30, 16 * 60, minutes), unit='min')
+        times = pd.DatetimeIndex((days.values[:, None] + offsets.values[None, :]).reshape(-1), name='Datetime')
+        times = times[(times >= start) & (times < end)]
+        return times.tz_localize('America/New_York')
+
+    frequencies = {'1d': 'B', '5d': '5B', '1wk': 'W-MON', '1mo': 'MS', '3mo': 'QS'}
+    times = pd.date_range(start.normalize(), end, freq=frequencies[interval], name='Date')
+    return times[(times >= start) & (times < end)]
+
+
+def _hash_uniform(keys: np.ndarray, seed: int) -> np.ndarray:
+    """
+    Deterministically map int64 keys to uniform random floats in [0, 1) using the splitmix64 mixing function
+    """
+    with np.errstate(over='ignore'):
+        z = keys.astype(np.uint64) + np.uint64(seed) * np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z = z ^ (z >> np.uint64(31))
+
+    return (z >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+class SyntheticDataSource(DataSourceADT):
+    """
+    Generates realistic looking stock data without making any network requests.
+
+    Every value only depends on the seed, the symbol and the time of the bar, so the same bar always has the same value no matter which
+    range it was requested in. This makes the data consistent when ranges are retrieved separately and merged, which allows caching and
+    refreshing to be tested and benchmarked repeatably.
+    """
+
+    max_batch_size = 100
+
+    def __init__(self, seed: int = 0, start_price: float = 100.0, volatility: float = 0.02, missing_symbols: List[str] = ()):
+        """
+        :param seed: Changes every generated value
+        :param start_price: Roughly where prices for every symbol are centered
+        :param volatility: How much prices move from bar to bar
+        :param missing_symbols: Symbols which should act as if they don't exist, so that no data is returned for them
+        """
+        self.seed = seed
+        self.start_price = start_price
+        self.volatility = volatility
+        self.missing_symbols = {symbol.upper() for symbol in missing_symbols}
+
+    def generate(self, ticker_symbol: str, start, end, interval: str) -> pd.DataFrame:
+        """
+        Generate data for a single symbol
+        """
+        times = _session_times(start, end, interval)
+        symbol_seed = self.seed * 1000003 + zlib.crc32(ticker_symbol.upper().encode())
+        keys = times.values.astype('datetime64[ns]').view('int64') // 10 ** 9
+
+        # slow waves give the prices trends, and hashed noise gives the individual bars variety
+        years = keys / (365.25 * 24 * 60 * 60)
+        phases = _hash_uniform(np.arange(3), symbol_seed) * 2 * np.pi
+        trend = 0.3 * np.sin(years * 0.7 + phases[0]) + 0.15 * np.sin(years * 3.1 + phases[1]) + 0.05 * np.sin(years * 17.0 + phases[2])
+
+        close = self.start_price * np.exp(trend + self.volatility * (_hash_uniform(keys, symbol_seed) - 0.5))
+        open_ = self.start_price * np.exp(trend + self.volatility * (_hash_uniform(keys, symbol_seed + 1) - 0.5))
+        high = np.maximum(open_, close) * (1 + self.volatility * _hash_uniform(keys, symbol_seed + 2))
+        low = np.minimum(open_, close) * (1 - self.volatility * _hash_uniform(keys, symbol_seed + 3))
+        volume = (1e5 + 1e6 * _hash_uniform(keys, symbol_seed + 4)).astype(np.int64)
+
+        return pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Adj Close': close, 'Volume': volume}, index=times)
+
+    def download(self, ticker_symbols: List[str], start, end, interval: str) -> Dict[str, pd.DataFrame]:
+        ticker_dataframes = {}
+        for ticker_symbol in ticker_symbols:
+            if ticker_symbol.upper() not in self.missing_symbols:
+                ticker_dataframe = self.generate(ticker_symbol, start, end, interval)
+                if len(ticker_dataframe):
+                    ticker_dataframes[ticker_symbol] = ticker_dataframe
+
+        return ticker_dataframes
+
+
+def dataframe_to_json(dataframe: pd.DataFrame) -> Dict:
+    """
+    Convert a dataframe with a DatetimeIndex to a json compatible dict without losing its timezone or column types
+    """
+    index = pd.DatetimeIndex(dataframe.index)
+
+    return {
+        'index': index.values.astype('datetime64[ns]').view('int64').tolist(),
+        'index_name': index.name,
+        'timezone': str(index.tz) if index.tz is not None else None,
+        'columns': {str(column): [str(dataframe[column].dtype), dataframe[column].tolist()] for column in dataframe.columns},
+    }
+
+
+def dataframe_from_json(dataframe_json: Dict) -> pd.DataFrame:
+    """
+    Convert a dict created by dataframe_to_json() back to a dataframe
+    """
+    index = pd.DatetimeIndex(np.array(dataframe_json['index'], dtype='int64').view('datetime64[ns]'), name=dataframe_json['index_name'])
+    if dataframe_json['timezone']:
+        index = index.tz_localize('UTC').tz_convert(dataframe_json['timezone'])
+
+    columns = {column: np.array(values, dtype=dtype) for column, (dtype, values) in dataframe_json['columns'].items()}
+    return pd.DataFrame(columns, index=index, columns=list(columns))
+
+
+class RecordingDataSource(DataSourceADT):
+    """
+    Passes requests to another data source and saves every response, so that they can be replayed later by a ReplayDataSource
+    """
+
+    def __init__(self, data_source: DataSourceADT, recording_directory: str):
+        """
+        :param data_source: Where data is actually downloaded from e.g. YFinanceDataSource()
+        :param recording_directory: Where responses are saved
+        """
+        self.data_source = data_source
+        self.recording_directory = recording_directory
+        self.max_batch_size = data_source.max_batch_size
+
+        self._lock = threading.Lock()
+
+    def download(self, ticker_symbols: List[str], start, end, interval: str) -> Dict[str, pd.DataFrame]:
+        ticker_dataframes = self.data_source.download(ticker_symbols, start, end, interval)
+
+        with self._lock:
+            for ticker_symbol, ticker_dataframe in ticker_dataframes.items():
+                directory = os.path.join(self.recording_directory, f'{ticker_symbol.upper()}_{interval}')
+                os.makedirs(directory, exist_ok=True)
+                with open(os.path.join(directory, f'{len(os.listdir(directory))}.json'), 'w') as f:
+                    json.dump(dataframe_to_json(ticker_dataframe), f)
+
+        return ticker_dataframes
+
+
+class ReplayDataSource(DataSourceADT):
+    """
+    Serves responses which were saved by a RecordingDataSource without making any network requests.
+
+    All recordings for a symbol are merged, so any range which they cover can be requested, not just the exact requests which were
+    recorded.
+    """
+
+    max_batch_size = 100
+
+    def __init__(self, recording_directory: str):
+        """
+        :param recording_directory: Where a RecordingDataSource saved its responses
+        """
+        self.recording_directory = recording_directory
+
+        # recordings which have already been loaded. format: (symbol, interval): dataframe
+        self._recordings: Dict = {}
+        self._lock = threading.Lock()
+
+    def _load_recording(self, ticker_symbol: str, interval: str) -> pd.DataFrame:
+        key = (ticker_symbol.upper(), interval)
+
+        with self._lock:
+            if key not in self._recordings:
+                directory = os.path.join(self.recording_directory, f'{ticker_symbol.upper()}_{interval}')
+                recording = None
+                if os.path.isdir(directory):
+                    for recording_file in sorted(os.listdir(directory)):
+                        with open(os.path.join(directory, recording_file), 'r') as f:
+                            recorded_dataframe = dataframe_from_json(json.load(f))
+                        recording = recorded_dataframe if recording is None else \
+                            storage_formats.merge_dataframes(recording, recorded_dataframe)
+                self._recordings[key] = recording
+
+            return self._recordings[key]
+
+    def download(self, ticker_symbols: List[str], start, end, interval: str) -> Dict[str, pd.DataFrame]:
+        ticker_dataframes = {}
+        for ticker_symbol in ticker_symbols:
+            recording = self._load_recording(ticker_symbol, interval)
+            if recording is None:
+                continue
+
+            # end is exclusive, the same as it is for yahoo finance
+            ticker_dataframe = storage_formats.slice_rows(recording, start, pd.Timestamp(end) - pd.Timedelta(1, 'ns'))
+            if len(ticker_dataframe):
+                ticker_dataframes[ticker_symbol] = ticker_dataframe
+
+        return ticker_dataframes
+
+
+class FixtureServer:
+    """
+    A local http server which stands in for a remote data source. Responses come from another data source (e.g. a ReplayDataSource or
+    SyntheticDataSource), and can be delayed or replaced with errors to test how clients deal with a slow or unreliable connection.
+
+    Use an HttpDataSource pointed at self.url to request data from it. It runs on a background thread until stop() is called, and can be
+    used as a context manager.
+    """
+
+    def __init__(self, data_source: DataSourceADT, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0, error_rate: float = 0.0,
+                 seed: int = None):
+        """
+        :param data_source: Where the served data comes from
+        :param port: Port to listen on. Default: any free port
+        :param latency: Seconds to wait before responding to each request
+        :param error_rate: Fraction of requests (0-1) which should be answered with an error instead of data
+        :param seed: Seed for choosing which requests fail, so that failures can be repeated
+        """
+        self.data_source = data_source
+        self.latency = latency
+        self.error_rate = error_rate
+
+        self.request_count = 0
+        self.error_count = 0
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread = None
+
+        fixture_server = self
+
+        class RequestHandler(http.server.BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                fixture_server._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.http_server = http.server.ThreadingHTTPServer((host, port), RequestHandler)
+
+    @property
+    def url(self) -> str:
+        host, port = self.http_server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _handle(self, request: http.server.BaseHTTPRequestHandler):
+        with self._lock:
+            self.request_count += 1
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.error_count += 1
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        url = urllib.parse.urlparse(request.path)
+        if url.path != '/download':
+            request.send_error(404)
+            return
+        if failed:
+            request.send_error(503, "Simulated failure")
+            return
+
+        query = urllib.parse.parse_qs(url.query)
+        ticker_dataframes = self.data_source.download(query['symbols'][0].split(','), pd.Timestamp(query['start'][0]),
+                                                      pd.Timestamp(query['end'][0]), query['interval'][0])
+
+        body = json.dumps({symbol: dataframe_to_json(dataframe) for symbol, dataframe in ticker_dataframes.items()}).encode()
+        request.send_response(200)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def start(self) -> 'FixtureServer':
+        """
+        Start serving requests on a background thread
+        """
+        self._thread = threading.Thread(target=self.http_server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop serving requests and close the server
+        """
+        self.http_server.shutdown()
+        self.http_server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+class HttpDataSource(DataSourceADT):
+    """
+    Requests data from a FixtureServer
+    """
+
+    max_batch_size = 50
+
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        """
+        :param base_url: Address of the server e.g. FixtureServer.url
+        :param timeout: Seconds to wait for a response before giving up
+        """
+        self.base_url = base_url
+        self.timeout = timeout
+
+    def download(self, ticker_symbols: List[str], start, end, interval: str) -> Dict[str, pd.DataFrame]:
+        query = urllib.parse.urlencode({
+            'symbols': ','.join(ticker_symbols),
+            'start': pd.Timestamp(start).isoformat(),
+            'end': pd.Timestamp(end).isoformat(),
+            'interval': interval,
+        })
+
+        try:
+            with urllib.request.urlopen(f'{self.base_url}/download?{query}', timeout=self.timeout) as response:
+                response_json = json.load(response)
+        except (urllib.error.URLError, ConnectionError, TimeoutError) as e:
+            raise DataSourceUnavailableException(f"Request to {self.base_url} failed: {e}") from e
+
+        return {symbol: dataframe_from_json(dataframe_json) for symbol, dataframe_json in response_json.items()}
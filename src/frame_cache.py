@@ -0,0 +1,133 @@
+__author__ = "Ethan Posner"
+__copyright__ = ""
+__credits__ = []
+__license__ = ""
+__version__ = "0,1dev"
+__maintainer__ = "Ethan Posner"
+__status__ = "Production"
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable
+
+import pandas as pd
+
+
+class FrameCache:
+    """
+    Keeps recently used dataframes in memory so that they don't need to be loaded from disk again.
+
+    The total size of the cached dataframes is kept under a byte budget. When a new dataframe doesn't fit, the least recently used ones
+    are evicted until it does. Cached dataframes are shared, so they shouldn't be modified by whoever retrieves them.
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024):
+        """
+        :param max_bytes: How much memory the cached dataframes may use in total
+        """
+        self.max_bytes = max_bytes
+
+        # format: key: (dataframe, size in bytes). Ordered from least to most recently used
+        self._frames: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def frame_size(dataframe: pd.DataFrame) -> int:
+        """
+        Get how many bytes of memory a dataframe uses, including its index
+        """
+        return int(dataframe.memory_usage(index=True, deep=True).sum())
+
+    def get(self, key: Hashable) -> pd.DataFrame:
+        """
+        Get a cached dataframe and mark it as recently used
+
+        :return: The cached dataframe, or None if it isn't cached
+        """
+        with self._lock:
+            if key not in self._frames:
+                self.misses += 1
+                return None
+
+            self._frames.move_to_end(key)
+            self.hits += 1
+            return self._frames[key][0]
+
+    def put(self, key: Hashable, dataframe: pd.DataFrame):
+        """
+        Add a dataframe to the cache, replacing anything previously cached under the same key. Dataframes which are larger than the whole
+        budget aren't cached.
+        """
+        size = self.frame_size(dataframe)
+
+        with self._lock:
+            self._remove(key)
+
+            if size > self.max_bytes:
+                return
+
+            self._frames[key] = (dataframe, size)
+            self.current_bytes += size
+            self._evict()
+
+    def invalidate(self, key: Hashable):
+        """
+        Remove a dataframe from the cache if it is cached
+        """
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        """
+        Remove every dataframe from the cache. The hit, miss and eviction counters are kept.
+        """
+        with self._lock:
+            self._frames.clear()
+            self.current_bytes = 0
+
+    def resize(self, max_bytes: int):
+        """
+        Change the byte budget, evicting dataframes if they no longer fit
+        """
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get counters describing how well the cache is working
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._frames),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def _remove(self, key: Hashable):
+        if key in self._frames:
+            self.current_bytes -= self._frames.pop(key)[1]
+
+    def _evict(self):
+        # remove the least recently used dataframes until everything fits
+        while self.current_bytes > self.max_bytes and self._frames:
+            self.current_bytes -= self._frames.popitem(last=False)[1][1]
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __contains__(self, key: Hashable):
+        return key in self._frames
+
+
+# shared by every StockDataProvider which isn't given its own cache
+shared_frame_cache = FrameCache()
@@ -0,0 +1,193 @@
+__author__ = "Ethan Posner"
+__copyright__ = ""
+__credits__ = []
+__license__ = ""
+__version__ = "0,1dev"
+__maintainer__ = "Ethan Posner"
+__status__ = "Production"
+
+import json
+import os
+import shutil
+from numbers import Number
+from typing import Dict, Tuple
+
+import numpy as np
+
+import data_provider
+import indicators
+
+# rows before the first changed row which are recomputed along with the appended rows. Windowed indicators need window - 1 rows of
+# history, so this is raised for indicators with larger parameters.
+MIN_CONTEXT_ROWS = 50
+
+_STATE_PREFIX = 'state:'
+_OUTPUT_PREFIX = 'output:'
+_META_KEY = 'meta'
+
+
+class IndicatorCache:
+    """
+    Stores computed indicator arrays on disk next to the ticker store, so that indicators on data which hasn't changed aren't computed
+    again.
+
+    Entries are keyed by symbol, interval, indicator name and parameters, and hold the version of the stored data they were computed from
+    (see CoverageCatalog.get_data_version()). When StockDataProvider.store_ticker() rewrites the data, its generation changes and entries
+    computed from the old data are recomputed. When bars are appended, only the rows from the first changed bar on are recomputed:
+    windowed indicators use the rows just before it as history, and recursive ones (EMA, Wilder smoothing) continue from their cached
+    values.
+    """
+
+    def __init__(self, provider: data_provider.StockDataProvider, cache_directory: str = None):
+        """
+        :param provider: Provider whose stored data indicators are computed from
+        :param cache_directory: Where to store computed indicators. Default: an 'indicators' directory in the provider's ticker directory
+        """
+        self.provider = provider
+        self.cache_directory = cache_directory if cache_directory is not None else os.path.join(provider.ticker_directory, 'indicators')
+
+    @staticmethod
+    def indicator_key(indicator) -> str:
+        """
+        Get the name of an indicator with its parameters, e.g. 'sma_50' for ('sma', 50). See IndicatorEngine.compute()
+        """
+        return indicators.result_name((indicator,) if isinstance(indicator, str) else indicator)
+
+    def entry_path(self, ticker_symbol: str, interval: str, indicator) -> str:
+        """
+        Get the location where an indicator is cached
+        """
+        return os.path.join(self.cache_directory, self.provider.storage_name(ticker_symbol.upper(), interval),
+                            f'{self.indicator_key(indicator)}.npz')
+
+    @staticmethod
+    def _context_rows(indicator) -> int:
+        parameters = [] if isinstance(indicator, str) else [parameter for parameter in indicator[1:] if isinstance(parameter, Number)]
+        return int(max([MIN_CONTEXT_ROWS] + parameters)) + 1
+
+    @staticmethod
+    def _read_entry(path: str) -> Tuple[Dict, Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+        """
+        :return: (meta, state arrays, output arrays), or None if nothing is cached
+        """
+        if not os.path.exists(path):
+            return None
+
+        with np.load(path) as entry:
+            meta = json.loads(str(entry[_META_KEY]))
+            state = {key[len(_STATE_PREFIX):]: entry[key] for key in entry.files if key.startswith(_STATE_PREFIX)}
+            outputs = {key[len(_OUTPUT_PREFIX):]: entry[key] for key in entry.files if key.startswith(_OUTPUT_PREFIX)}
+
+        return meta, state, outputs
+
+    @staticmethod
+    def _write_entry(path: str, meta: Dict, state: Dict[str, np.ndarray], outputs: Dict[str, np.ndarray]):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        arrays = {_META_KEY: np.array(json.dumps(meta))}
+        arrays.update({_STATE_PREFIX + name: array for name, array in state.items()})
+        arrays.update({_OUTPUT_PREFIX + name: array for name, array in outputs.items()})
+
+        # write to a temporary file first so that readers never see a partially written entry
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temp_path, path)
+
+    def _recompute_tail(self, indicator, prices: Dict[str, np.ndarray], unchanged_rows: int, state: Dict[str, np.ndarray],
+                        outputs: Dict[str, np.ndarray]) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+        """
+        Recompute the rows of a cached indicator from unchanged_rows on
+
+        :return: (state, outputs) for every row, or None if the cached results can't be continued
+        """
+        context_rows = self._context_rows(indicator)
+        if unchanged_rows <= context_rows:
+            return None
+
+        initial_state = {name: array[unchanged_rows - 1] for name, array in state.items()}
+        if not all(np.isfinite(value) for value in initial_state.values()):
+            return None
+
+        first_row = unchanged_rows - context_rows
+        engine = indicators.IndicatorEngine(*(prices[column][first_row:] if prices.get(column) is not None else None
+                                              for column in ('Close', 'High', 'Low')),
+                                            initial_state=initial_state, state_row=context_rows)
+        tail_outputs = engine.compute(indicator)
+
+        def join(cached: Dict[str, np.ndarray], tail: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+            return {name: np.concatenate([cached[name][:unchanged_rows], array[context_rows:]]) for name, array in tail.items()}
+
+        if set(engine.results) != set(state) or set(tail_outputs) != set(outputs):
+            return None
+
+        return join(state, engine.results), join(outputs, tail_outputs)
+
+    def get(self, ticker_symbol: str, interval: str, indicator) -> Dict[str, np.ndarray]:
+        """
+        Get an indicator computed over all of the stored data for a ticker, computing it only if the cached result is out of date
+
+        :param indicator: Indicator name or tuple of name and parameters, e.g. 'rsi' or ('sma', 50). See IndicatorEngine.compute()
+        :return: Arrays in the same format as IndicatorEngine.compute(), aligned to the stored data
+        """
+        ticker_symbol = ticker_symbol.upper()
+        path = self.entry_path(ticker_symbol, interval, indicator)
+
+        # read the version and the data together so that a write can't happen in between
+        with self.provider.write_lock(ticker_symbol, interval):
+            generation, revision = self.provider.catalog.get_data_version(ticker_symbol, interval)
+            entry = self._read_entry(path)
+
+            if entry is not None and entry[0]['generation'] == generation and entry[0]['revision'] == revision:
+                return entry[2]
+
+            modified_from = None
+            if entry is not None and entry[0]['generation'] == generation:
+                modified_from = self.provider.catalog.modified_since(ticker_symbol, interval, entry[0]['revision'])
+
+            arrays = self.provider.storage_format.read_arrays(self.provider.ticker_directory,
+                                                              self.provider.storage_name(ticker_symbol, interval),
+                                                              columns=['Close', 'High', 'Low'])
+
+        prices = {column: arrays.get(column) for column in ('Close', 'High', 'Low')}
+
+        results = None
+        if modified_from is not None:
+            meta, state, outputs = entry
+            unchanged_rows = min(int(np.searchsorted(arrays['timestamps'], modified_from, side='left')), meta['rows'])
+            results = self._recompute_tail(indicator, prices, unchanged_rows, state, outputs)
+
+        if results is None:
+            engine = indicators.IndicatorEngine(prices['Close'], high=prices['High'], low=prices['Low'])
+            outputs = engine.compute(indicator)
+            results = engine.results, outputs
+
+        state, outputs = results
+        self._write_entry(path, {'generation': generation, 'revision': revision, 'rows': len(arrays['timestamps'])}, state, outputs)
+
+        return outputs
+
+    def get_many(self, ticker_symbol: str, interval: str, *indicator_names) -> Dict[str, np.ndarray]:
+        """
+        Get several indicators at once. See get()
+        """
+        results = {}
+        for indicator in indicator_names:
+            results.update(self.get(ticker_symbol, interval, indicator))
+        return results
+
+    def invalidate(self, ticker_symbol: str, interval: str = None):
+        """
+        Remove cached indicators for a symbol, either at a single interval or at all of them
+        """
+        ticker_symbol = ticker_symbol.upper()
+        if not os.path.isdir(self.cache_directory):
+            return
+
+        for entry in os.listdir(self.cache_directory):
+            if interval is not None:
+                matches = entry == self.provider.storage_name(ticker_symbol, interval)
+            else:
+                matches = entry.startswith(f'{ticker_symbol}_')
+            if matches:
+                shutil.rmtree(os.path.join(self.cache_directory, entry))
@@ -0,0 +1,350 @@
+__author__ = "Ethan Posner"
+__copyright__ = ""
+__credits__ = []
+__license__ = ""
+__version__ = "0,1dev"
+__maintainer__ = "Ethan Posner"
+__status__ = "Production"
+
+from typing import Callable, Dict, Hashable
+
+import numpy as np
+import pandas as pd
+
+import trends
+
+# which IndicatorEngine methods return several arrays, and the names of those arrays
+MULTI_OUTPUT_INDICATORS = {
+    "macd": ("macd", "macd_signal", "macd_histogram"),
+    "bollinger": ("bollinger_middle", "bollinger_upper", "bollinger_lower"),
+    "trend": ("trend_slope", "trend_intercept", "trend_r_squared"),
+}
+
+
+def _as_float_array(values) -> np.ndarray:
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+
+def rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Find the sum of every window of values along the last axis using a cumulative sum, so that each window takes O(1) work
+
+    :param values: 1d array, or 2d array with one row per symbol. Must not contain NaN.
+    :param window: Number of points in each sum. Must be at least 1.
+    :return: Array of the same shape, where each point is the sum of the window ending at it. The first window - 1 points are NaN.
+    """
+    if window < 1:
+        raise ValueError("Windows must contain at least 1 point")
+
+    cumulative = np.cumsum(values, axis=-1, dtype=np.float64)
+    sums = cumulative.copy()
+    sums[..., window:] -= cumulative[..., :-window]
+    sums[..., :window - 1] = np.nan
+    return sums
+
+
+def _window_counts(values: np.ndarray, window: int) -> np.ndarray:
+    # how many points in each window aren't NaN
+    return rolling_sum(~np.isnan(values), window)
+
+
+def sma(values, window: int) -> np.ndarray:
+    """
+    Simple moving average. Windows which contain a NaN are NaN.
+
+    :param values: 1d array, or 2d array with one row per symbol. Averages are taken along the last axis.
+    :param window: Number of points in each average
+    """
+    values = _as_float_array(values)
+    sums = rolling_sum(np.nan_to_num(values), window)
+    return np.where(_window_counts(values, window) == window, sums / window, np.nan)
+
+
+def rolling_std(values, window: int, block_size: int = trends.DEFAULT_BLOCK_SIZE) -> np.ndarray:
+    """
+    Population standard deviation of every window of values. Windows which contain a NaN are NaN.
+
+    The sums are restarted every block_size points and the values are centered on the mean of each block, the same as
+    trends.rolling_linear_regression(), so that the sums stay small and subtracting the squared mean doesn't lose precision on long series.
+
+    :param values: 1d array, or 2d array with one row per symbol. Standard deviations are taken along the last axis.
+    :param window: Number of points in each window. Must be at least 1.
+    :param block_size: How many windows use the same sums. See trends.DEFAULT_BLOCK_SIZE.
+    """
+    if window < 1:
+        raise ValueError("Windows must contain at least 1 point")
+
+    values = _as_float_array(values)
+    length = values.shape[-1]
+    deviations = np.full(values.shape, np.nan)
+
+    # each block gives the windows ending at block_start to block_end, which need the window - 1 points before them too
+    for block_start in range(window - 1, length, block_size):
+        block_end = min(block_start + block_size, length)
+        block = values[..., block_start - window + 1:block_end]
+
+        with np.errstate(invalid="ignore"):
+            centered = block - np.nanmean(block, axis=-1, keepdims=True)
+        centered = np.nan_to_num(centered)
+
+        sums = rolling_sum(centered, window)[..., window - 1:]
+        squared_sums = rolling_sum(centered ** 2, window)[..., window - 1:]
+        deviations[..., block_start:block_end] = np.sqrt(np.maximum((squared_sums - sums ** 2 / window) / window, 0))
+
+    return np.where(_window_counts(values, window) == window, deviations, np.nan)
+
+
+def recursive_smoothing(values, alpha: float, period: int, initial=None) -> np.ndarray:
+    """
+    Exponential smoothing which is seeded with the simple average of the first period values: s[t] = s[t - 1] + alpha * (x[t] - s[t - 1])
+
+    Leading NaNs (e.g. before a symbol was listed) are skipped, and NaNs after the seed are ignored when smoothing but stay NaN in the
+    result.
+
+    :param values: 1d array, or 2d array with one row per symbol. Smoothing is done along the last axis.
+    :param alpha: Weight of each new value
+    :param period: Number of values averaged for the seed. The result is NaN until this many values have been seen.
+    :param initial: Smoothed value just before the first value, to continue smoothing from instead of seeding (one per row for 2d
+    values). Rows where this is NaN are seeded as usual.
+    """
+    values = _as_float_array(values)
+    rows = np.atleast_2d(values)
+    initial_rows = np.broadcast_to(np.asarray(initial if initial is not None else np.nan, dtype=np.float64), rows.shape[:1])
+
+    # the first column holds the initial value, which is dropped after smoothing
+    seeded = np.full((rows.shape[0], rows.shape[1] + 1), np.nan)
+    for row, row_values in enumerate(rows):
+        if not np.isnan(initial_rows[row]):
+            seeded[row, 0] = initial_rows[row]
+            seeded[row, 1:] = row_values
+            continue
+
+        valid = np.flatnonzero(~np.isnan(row_values))
+        if len(valid) < period:
+            continue
+
+        seed_position = valid[period - 1] + 1
+        seeded[row, seed_position] = row_values[valid[:period]].mean()
+        seeded[row, seed_position + 1:] = row_values[seed_position:]
+
+    # pandas does the recursive part in compiled code. Each column is smoothed separately.
+    smoothed = pd.DataFrame(seeded.T).ewm(alpha=alpha, adjust=False, ignore_na=True).mean().to_numpy(copy=True).T
+    smoothed[np.isnan(seeded)] = np.nan
+
+    return np.ascontiguousarray(smoothed[:, 1:].reshape(values.shape))
+
+
+def ema(values, span: int) -> np.ndarray:
+    """
+    Exponential moving average with alpha = 2 / (span + 1), seeded with the simple average of the first span values
+    """
+    return recursive_smoothing(values, 2 / (span + 1), span)
+
+
+def wilder_smoothing(values, period: int) -> np.ndarray:
+    """
+    Wilder's smoothing, used by RSI and ATR. This is an exponential moving average with alpha = 1 / period.
+    """
+    return recursive_smoothing(values, 1 / period, period)
+
+
+def result_name(key: Hashable) -> str:
+    """
+    Get the name of an IndicatorEngine result from its key, e.g. ('sma', 20) is 'sma_20'
+    """
+    return "_".join(str(part) for part in key)
+
+
+class IndicatorEngine:
+    """
+    Computes rolling indicators over a whole price series at once.
+
+    Every indicator and every intermediate array (e.g. the price changes used by RSI or the moving average shared by Bollinger bands and
+    SMA) is computed once and reused, so asking for several indicators costs little more than asking for one. Every result is a contiguous
+    float64 array with the same shape as the prices, aligned to their index. Points before an indicator has enough data are NaN.
+
+    Missing (NaN) prices are handled the same way by every indicator here and in streaming_indicators: windowed indicators (SMA, standard
+    deviation, Bollinger bands, trend) are NaN for every window containing a NaN, and recursive ones (EMA, RSI, MACD, ATR) are NaN at a
+    NaN but skip it when smoothing. Changes into and out of a NaN are NaN too.
+
+    Prices can be 1d arrays, or 2d arrays with one row per symbol, in which case indicators are computed for every symbol at once.
+    """
+
+    def __init__(self, close, high=None, low=None, index: pd.Index = None, initial_state: Dict[str, object] = None, state_row: int = 0):
+        """
+        :param close: Close prices
+        :param high: High prices. Required by ATR.
+        :param low: Low prices. Required by ATR.
+        :param index: Index which the prices are aligned to, if they came from a dataframe
+        :param initial_state: Used to continue indicators which were computed on earlier prices (see indicator_cache). Format:
+        result_name(key): value of that result just before state_row. Recursive indicators found in here continue from that value at
+        state_row instead of being seeded, and are NaN before it. Rows before state_row only provide history for windowed indicators.
+        :param state_row: Row which recursive indicators continue from
+        """
+        self.close = _as_float_array(close)
+        self.high = _as_float_array(high) if high is not None else None
+        self.low = _as_float_array(low) if low is not None else None
+        self.index = index
+        self.initial_state = initial_state if initial_state is not None else {}
+        self.state_row = state_row
+
+        # format: (indicator name, *parameters): result
+        self._results: Dict[Hashable, object] = {}
+
+    @classmethod
+    def from_dataframe(cls, dataframe: pd.DataFrame) -> 'IndicatorEngine':
+        """
+        Create an engine for a dataframe of bars with Close and optionally High and Low columns e.g. a Ticker
+        """
+        return cls(dataframe["Close"].to_numpy(),
+                   high=dataframe["High"].to_numpy() if "High" in dataframe.columns else None,
+                   low=dataframe["Low"].to_numpy() if "Low" in dataframe.columns else None,
+                   index=dataframe.index)
+
+    def _memoize(self, key: Hashable, function: Callable):
+        if key not in self._results:
+            self._results[key] = function()
+        return self._results[key]
+
+    def _smooth(self, key: Hashable, values: np.ndarray, alpha: float, period: int) -> np.ndarray:
+        # recursive smoothing which continues from self.initial_state if it holds a value for this result
+        name = result_name(key)
+        if name not in self.initial_state:
+            return recursive_smoothing(values, alpha, period)
+
+        smoothed = np.full(values.shape, np.nan)
+        smoothed[..., self.state_row:] = recursive_smoothing(values[..., self.state_row:], alpha, period, initial=self.initial_state[name])
+        return smoothed
+
+    @property
+    def results(self) -> Dict[str, np.ndarray]:
+        """
+        Every array computed so far, including intermediate ones, by result_name(). Indicators with several arrays aren't included, but
+        the arrays they were built from are.
+        """
+        return {result_name(key): result for key, result in self._results.items() if isinstance(result, np.ndarray)}
+
+    def deltas(self) -> np.ndarray:
+        """
+        Change in close price from the previous point
+        """
+        def compute():
+            deltas = np.full(self.close.shape, np.nan)
+            deltas[..., 1:] = np.diff(self.close, axis=-1)
+            return deltas
+
+        return self._memoize(("deltas",), compute)
+
+    def sma(self, window: int = 20) -> np.ndarray:
+        return self._memoize(("sma", window), lambda: sma(self.close, window))
+
+    def rolling_std(self, window: int = 20) -> np.ndarray:
+        return self._memoize(("rolling_std", window), lambda: rolling_std(self.close, window))
+
+    def ema(self, span: int = 20) -> np.ndarray:
+        return self._memoize(("ema", span), lambda: self._smooth(("ema", span), self.close, 2 / (span + 1), span))
+
+    def rsi(self, period: int = 14) -> np.ndarray:
+        """
+        Relative strength index, between 0 and 100
+        """
+        def compute():
+            deltas = self.deltas()
+            average_gain = self._memoize(("average_gain", period),
+                                         lambda: self._smooth(("average_gain", period), np.maximum(deltas, 0), 1 / period, period))
+            average_loss = self._memoize(("average_loss", period),
+                                         lambda: self._smooth(("average_loss", period), np.maximum(-deltas, 0), 1 / period, period))
+
+            with np.errstate(divide="ignore", invalid="ignore"):
+                rsi = 100 * average_gain / (average_gain + average_loss)
+
+            # the price didn't move at all during the period
+            rsi[(average_gain == 0) & (average_loss == 0)] = 50
+            return rsi
+
+        return self._memoize(("rsi", period), compute)
+
+    def macd(self, fast: int = 12, slow: int = 26, signal: int = 9) -> Dict[str, np.ndarray]:
+        """
+        Moving average convergence divergence
+
+        :return: macd: the fast EMA minus the slow EMA, macd_signal: EMA of macd over signal points, macd_histogram: macd minus macd_signal
+        """
+        def compute():
+            macd = self.ema(fast) - self.ema(slow)
+            signal_key = ("macd_signal", fast, slow, signal)
+            signal_line = self._memoize(signal_key, lambda: self._smooth(signal_key, macd, 2 / (signal + 1), signal))
+            return {"macd": macd, "macd_signal": signal_line, "macd_histogram": macd - signal_line}
+
+        return self._memoize(("macd", fast, slow, signal), compute)
+
+    def bollinger(self, window: int = 20, num_std: float = 2.0) -> Dict[str, np.ndarray]:
+        """
+        Bollinger bands
+
+        :return: bollinger_middle: SMA over window points, bollinger_upper and bollinger_lower: num_std standard deviations above and below
+        """
+        def compute():
+            middle = self.sma(window)
+            width = num_std * self.rolling_std(window)
+            return {"bollinger_middle": middle, "bollinger_upper": middle + width, "bollinger_lower": middle - width}
+
+        return self._memoize(("bollinger", window, num_std), compute)
+
+    def true_range(self) -> np.ndarray:
+        """
+        The largest of high - low, |high - previous close| and |low - previous close|. The first point uses high - low.
+        """
+        if self.high is None or self.low is None:
+            raise ValueError("High and low prices are required for true range")
+
+        def compute():
+            previous_close = np.full(self.close.shape, np.nan)
+            previous_close[..., 1:] = self.close[..., :-1]
+            # fmax ignores the missing previous close of the first point
+            return np.fmax(self.high - self.low, np.fmax(np.abs(self.high - previous_close), np.abs(self.low - previous_close)))
+
+        return self._memoize(("true_range",), compute)
+
+    def atr(self, period: int = 14) -> np.ndarray:
+        """
+        Average true range
+        """
+        return self._memoize(("atr", period), lambda: self._smooth(("atr", period), self.true_range(), 1 / period, period))
+
+    def trend(self, window: int = 20) -> Dict[str, np.ndarray]:
+        """
+        Least squares line fit to every window of close prices. See trends.rolling_linear_regression()
+
+        :return: trend_slope, trend_intercept and trend_r_squared
+        """
+        def compute():
+            return {"trend_" + name: result for name, result in trends.rolling_linear_regression(self.close, window).items()}
+
+        return self._memoize(("trend", window), compute)
+
+    def compute(self, *indicators) -> Dict[str, np.ndarray]:
+        """
+        Compute several indicators at once
+
+        :param indicators: Indicator names e.g. 'rsi', which use default parameters, or tuples of a name and its parameters e.g. ('sma', 50)
+        or ('macd', 12, 26, 9)
+        :return: Every resulting array. Keys are the indicator name (or for macd, bollinger and trend, the names of their arrays) followed by any
+        parameters given e.g. 'rsi', 'sma_50', 'macd_signal_12_26_9'.
+        """
+        results = {}
+        for indicator in indicators:
+            name, *parameters = (indicator,) if isinstance(indicator, str) else indicator
+            if name not in ("sma", "ema", "rolling_std", "rsi", "macd", "bollinger", "true_range", "atr", "trend"):
+                raise ValueError(f"Unknown indicator '{name}'")
+
+            suffix = "".join(f"_{parameter}" for parameter in parameters)
+            result = getattr(self, name)(*parameters)
+
+            if name in MULTI_OUTPUT_INDICATORS:
+                for key in MULTI_OUTPUT_INDICATORS[name]:
+                    results[key + suffix] = result[key]
+            else:
+                results[name + suffix] = result
+
+        return results
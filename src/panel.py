@@ -0,0 +1,262 @@
+__author__ = "Ethan Posner"
+__copyright__ = ""
+__credits__ = []
+__license__ = ""
+__version__ = "0,1dev"
+__maintainer__ = "Ethan Posner"
+__status__ = "Production"
+
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+import array_ticker
+import data_provider
+import indicators
+import storage_formats
+
+DEFAULT_FIELDS = ('Open', 'High', 'Low', 'Close', 'Volume')
+
+
+def cross_sectional_rank(values: np.ndarray, ascending: bool = True, pct: bool = True) -> np.ndarray:
+    """
+    Rank every symbol against the others at each time
+
+    :param values: symbols x timestamps array e.g. an indicator computed on a panel. NaNs aren't ranked.
+    :param ascending: Whether the smallest value gets the lowest rank
+    :param pct: Give ranks as a fraction of the number of ranked symbols (0 to 1] instead of 1 to n
+    :return: symbols x timestamps array of ranks. Ties get the average of their ranks.
+    """
+    return pd.DataFrame(values).rank(axis=0, ascending=ascending, pct=pct).to_numpy()
+
+
+def cross_sectional_zscore(values: np.ndarray) -> np.ndarray:
+    """
+    Find how many standard deviations each symbol is above the mean of all symbols at each time
+
+    :param values: symbols x timestamps array. NaNs are left out of the mean and standard deviation.
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (values - np.nanmean(values, axis=0)) / np.nanstd(values, axis=0)
+
+
+def rank_score(weighted_values: Iterable[Tuple[np.ndarray, float]]) -> np.ndarray:
+    """
+    Combine several indicators into one score by averaging their cross sectional ranks
+
+    :param weighted_values: (symbols x timestamps array, weight) for every indicator. Higher values score better for positive weights, and
+    lower values score better for negative weights.
+    :return: symbols x timestamps array of scores between 0 and 1. Symbols missing any of the indicators at a time have no score.
+    """
+    total = None
+    total_weight = 0.0
+    for values, weight in weighted_values:
+        ranks = cross_sectional_rank(values, ascending=weight > 0) * abs(weight)
+        total = ranks if total is None else total + ranks
+        total_weight += abs(weight)
+
+    return total / total_weight
+
+
+class TickerPanel:
+    """
+    Bars for many symbols aligned to the same timestamps, so that indicators and scores can be computed for every symbol at once with 2d
+    array operations instead of looping over tickers.
+
+    The panel is logically symbols x timestamps x fields. Each field is held as its own contiguous symbols x timestamps array (see
+    field()) because that is the layout the indicator functions work on, and to_array() stacks them when the 3d form is needed. mask is
+    True where a symbol has a bar. Missing bars (e.g. before a symbol was listed) are NaN in every field.
+    """
+
+    def __init__(self, symbols: Sequence[str], timestamps: np.ndarray, fields: Dict[str, np.ndarray], mask: np.ndarray,
+                 interval: str = '1d', timezone: str = None):
+        """
+        :param symbols: Symbol of every row
+        :param timestamps: Sorted int64 nanoseconds since the epoch (UTC) of every column
+        :param fields: field name: symbols x timestamps array
+        :param mask: symbols x timestamps bool array which is True where a symbol has a bar
+        :param timezone: Timezone which timezone naive start and end times are treated as being in. Default: UTC
+        """
+        self.symbols = [symbol.upper() for symbol in symbols]
+        self.timestamps = timestamps
+        self.fields = fields
+        self.mask = mask
+        self.interval = interval
+        self.timezone = timezone
+
+        # format: "ticker_str": exception for every symbol which couldn't be loaded
+        self.failures: Dict[str, Exception] = {}
+
+        self._rows = {symbol: row for row, symbol in enumerate(self.symbols)}
+        self._engine: indicators.IndicatorEngine = None
+
+    @classmethod
+    def from_arrays(cls, symbol_arrays: Dict[str, Dict[str, np.ndarray]], fields: Sequence[str] = DEFAULT_FIELDS, interval: str = '1d',
+                    timezone: str = None) -> 'TickerPanel':
+        """
+        Align arrays for many symbols, in the format returned by StockDataProvider.get_ticker_arrays()
+
+        :param symbol_arrays: "ticker_str": arrays for every symbol
+        :param fields: Which columns to include. Columns which a symbol doesn't have are NaN.
+        """
+        symbols = list(symbol_arrays)
+        timestamps = np.unique(np.concatenate([np.asarray(arrays['timestamps'], dtype=np.int64) for arrays in symbol_arrays.values()])) \
+            if symbols else np.empty(0, dtype=np.int64)
+
+        mask = np.zeros((len(symbols), len(timestamps)), dtype=bool)
+        panel_fields = {field: np.full((len(symbols), len(timestamps)), np.nan) for field in fields}
+
+        for row, arrays in enumerate(symbol_arrays.values()):
+            columns = np.searchsorted(timestamps, arrays['timestamps'])
+            mask[row, columns] = True
+            for field in fields:
+                if field in arrays:
+                    panel_fields[field][row, columns] = arrays[field]
+
+        return cls(symbols, timestamps, panel_fields, mask, interval=interval, timezone=timezone)
+
+    @classmethod
+    def from_tickers(cls, tickers: Iterable[array_ticker.ArrayTicker], fields: Sequence[str] = DEFAULT_FIELDS) -> 'TickerPanel':
+        """
+        Align ArrayTickers, which must all have the same interval
+        """
+        tickers = list(tickers)
+        symbol_arrays = {}
+        for ticker in tickers:
+            arrays = {'timestamps': ticker.timestamps}
+            for column, field in array_ticker.COLUMN_FIELDS.items():
+                if getattr(ticker, field) is not None:
+                    arrays[column] = getattr(ticker, field)
+            symbol_arrays[ticker.symbol] = arrays
+
+        interval = tickers[0].interval if tickers else '1d'
+        timezone = tickers[0].timezone if tickers else None
+        return cls.from_arrays(symbol_arrays, fields=fields, interval=interval, timezone=timezone)
+
+    @classmethod
+    def from_provider(cls, provider: data_provider.StockDataProvider, ticker_symbols: Iterable[str], start=None, end=None,
+                      interval: str = '1d', fields: Sequence[str] = DEFAULT_FIELDS, **kwargs) -> 'TickerPanel':
+        """
+        Load many symbols through StockDataProvider.get_tickers(), which downloads anything missing from the ticker store in bulk.
+        Symbols which couldn't be loaded are left out of the panel and listed in its failures.
+
+        :param kwargs: Passed to StockDataProvider.get_tickers() e.g. max_workers
+        """
+        result = provider.get_tickers(ticker_symbols, start=start, end=end, interval=interval, **kwargs)
+
+        symbol_arrays = {}
+        timezone = None
+        for ticker_symbol, ticker_dataframe in result.data.items():
+            symbol_arrays[ticker_symbol] = storage_formats.dataframe_to_arrays(ticker_dataframe)
+            index = pd.DatetimeIndex(ticker_dataframe.index)
+            if timezone is None and index.tz is not None:
+                timezone = str(index.tz)
+
+        panel = cls.from_arrays(symbol_arrays, fields=fields, interval=interval, timezone=timezone)
+        panel.failures = dict(result.failures)
+        return panel
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        """
+        (symbols, timestamps, fields)
+        """
+        return len(self.symbols), len(self.timestamps), len(self.fields)
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        """
+        Time of every column as a DatetimeIndex, in the panel's timezone
+        """
+        index = pd.DatetimeIndex(self.timestamps.view('datetime64[ns]'))
+        if self.timezone is not None:
+            index = index.tz_localize('UTC').tz_convert(self.timezone)
+        return index
+
+    def field(self, field: str) -> np.ndarray:
+        """
+        Get a symbols x timestamps array of one field e.g. 'Close'
+        """
+        return self.fields[field]
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self.fields[field]
+
+    def row(self, ticker_symbol: str) -> int:
+        """
+        Get which row of the panel holds a symbol
+        """
+        return self._rows[ticker_symbol.upper()]
+
+    def to_array(self) -> np.ndarray:
+        """
+        Stack every field into a symbols x timestamps x fields array. This copies the data.
+        """
+        return np.stack(list(self.fields.values()), axis=-1)
+
+    def to_dataframe(self, field: str) -> pd.DataFrame:
+        """
+        Get one field as a dataframe with a row for every time and a column for every symbol
+        """
+        return pd.DataFrame(self.fields[field].T, index=self.index, columns=self.symbols)
+
+    def slice(self, start=None, end=None) -> 'TickerPanel':
+        """
+        Get the columns between start and end (inclusive). The result holds views of this panel's arrays.
+        """
+        first_column, last_column = storage_formats.find_rows(self.timestamps, start, end, self.timezone)
+        panel = TickerPanel(self.symbols, self.timestamps[first_column:last_column],
+                            {field: values[:, first_column:last_column] for field, values in self.fields.items()},
+                            self.mask[:, first_column:last_column], interval=self.interval, timezone=self.timezone)
+        panel.failures = self.failures
+        return panel
+
+    @property
+    def engine(self) -> indicators.IndicatorEngine:
+        """
+        Indicator engine for every symbol's prices at once. It keeps computed indicators, so they are shared by later calls.
+        """
+        if self._engine is None:
+            self._engine = indicators.IndicatorEngine(self.fields['Close'], high=self.fields.get('High'), low=self.fields.get('Low'),
+                                                      index=self.index)
+        return self._engine
+
+    def indicators(self, *indicator_names) -> Dict[str, np.ndarray]:
+        """
+        Compute rolling indicators for every symbol at once. See indicators.IndicatorEngine.compute()
+
+        :return: symbols x timestamps array for every indicator
+        """
+        return self.engine.compute(*indicator_names)
+
+    def rank(self, values: np.ndarray, ascending: bool = True, pct: bool = True) -> np.ndarray:
+        """
+        Rank every symbol against the others at each time. See cross_sectional_rank()
+        """
+        return cross_sectional_rank(values, ascending=ascending, pct=pct)
+
+    def latest(self, values: np.ndarray) -> np.ndarray:
+        """
+        Get the last value which isn't NaN for every symbol, e.g. each symbol's current score even if it didn't trade in the last bar
+
+        :param values: symbols x timestamps array
+        :return: Value for every symbol, or NaN for symbols with no values
+        """
+        valid = ~np.isnan(values)
+        last_columns = values.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+        latest = values[np.arange(values.shape[0]), last_columns] if values.shape[1] else np.full(values.shape[0], np.nan)
+        return np.where(valid.any(axis=1), latest, np.nan)
+
+    def top(self, values: np.ndarray, count: int = 10, column: int = None) -> List[Tuple[str, float]]:
+        """
+        Find the symbols with the highest values
+
+        :param values: symbols x timestamps array e.g. a score
+        :param count: How many symbols to return
+        :param column: Which time to compare symbols at. Default: each symbol's latest value
+        :return: (symbol, value) pairs, highest first. Symbols without a value are left out.
+        """
+        scores = self.latest(values) if column is None else values[:, column]
+        ranked = [row for row in np.argsort(-scores, kind='stable') if not np.isnan(scores[row])]
+        return [(self.symbols[row], float(scores[row])) for row in ranked[:count]]
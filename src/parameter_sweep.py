@@ -0,0 +1,508 @@
+__author__ = "Ethan Posner"
+__copyright__ = ""
+__credits__ = []
+__license__ = ""
+__version__ = "0,1dev"
+__maintainer__ = "Ethan Posner"
+__status__ = "Production"
+
+import argparse
+import concurrent.futures
+import contextlib
+import hashlib
+import itertools
+import json
+import os
+import sqlite3
+import time
+from multiprocessing import shared_memory
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+import array_ticker
+import data_provider
+import vectorized_backtest
+
+# format: ArrayTicker attribute: dtype it is stored as in shared memory
+_SHARED_FIELDS = {'timestamps': np.int64}
+_SHARED_FIELDS.update({field: np.float64 for field in array_ticker.COLUMN_FIELDS.values()})
+
+
+class SharedPriceData:
+    """
+    Bars for many tickers packed into one block of shared memory, so that worker processes can read them without them being pickled.
+
+    The process which creates the block owns it and must unlink() it when it is done (or use it as a context manager). Workers attach()
+    to it by name using the layout, and get read only ArrayTickers whose arrays are views of the shared block.
+    """
+
+    def __init__(self, memory: shared_memory.SharedMemory, layout: Dict[str, Dict], owner: bool = False):
+        """
+        :param memory: The shared block
+        :param layout: "ticker_str": interval, timezone, rows and the offset of every field in the block. See create()
+        :param owner: Whether this object created the block
+        """
+        self.memory = memory
+        self.layout = layout
+        self.owner = owner
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+    @classmethod
+    def create(cls, tickers: Iterable[array_ticker.ArrayTicker]) -> 'SharedPriceData':
+        """
+        Copy tickers into a new block of shared memory
+        """
+        tickers = list(tickers)
+        layout = {}
+        offset = 0
+        for ticker in tickers:
+            fields = {}
+            for field, dtype in _SHARED_FIELDS.items():
+                if getattr(ticker, field) is not None:
+                    fields[field] = offset
+                    offset += len(ticker) * np.dtype(dtype).itemsize
+            layout[ticker.symbol] = {'interval': ticker.interval, 'timezone': ticker.timezone, 'rows': len(ticker), 'fields': fields}
+
+        # shared memory blocks can't be empty
+        memory = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        shared = cls(memory, layout, owner=True)
+
+        for ticker in tickers:
+            for field, array in shared._field_arrays(ticker.symbol, writeable=True).items():
+                array[:] = getattr(ticker, field)
+
+        return shared
+
+    @classmethod
+    def attach(cls, name: str, layout: Dict[str, Dict]) -> 'SharedPriceData':
+        """
+        Open a block created by another process
+        """
+        # worker processes share their parent's resource tracker, so the block isn't removed when a worker exits
+        return cls(shared_memory.SharedMemory(name=name), layout)
+
+    def _field_arrays(self, symbol: str, writeable: bool = False) -> Dict[str, np.ndarray]:
+        ticker_layout = self.layout[symbol]
+        arrays = {}
+        for field, offset in ticker_layout['fields'].items():
+            array = np.ndarray(ticker_layout['rows'], dtype=_SHARED_FIELDS[field], buffer=self.memory.buf, offset=offset)
+            array.flags.writeable = writeable
+            arrays[field] = array
+        return arrays
+
+    def ticker(self, symbol: str) -> array_ticker.ArrayTicker:
+        """
+        Get a ticker whose arrays are read only views of the shared block
+        """
+        ticker_layout = self.layout[symbol]
+        return array_ticker.ArrayTicker(symbol, interval=ticker_layout['interval'], timezone=ticker_layout['timezone'],
+                                        **self._field_arrays(symbol))
+
+    def tickers(self) -> Dict[str, array_ticker.ArrayTicker]:
+        return {symbol: self.ticker(symbol) for symbol in self.layout}
+
+    def close(self):
+        """
+        Stop using the block in this process. Arrays from ticker() can't be used afterwards.
+        """
+        self.memory.close()
+
+    def unlink(self):
+        """
+        Free the block once every process is done with it. Only the process which created it should do this.
+        """
+        self.memory.unlink()
+
+    def __enter__(self) -> 'SharedPriceData':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        if self.owner:
+            self.unlink()
+
+
+def parameter_grid(**parameter_values: Iterable) -> List[Dict[str, any]]:
+    """
+    Get every combination of parameter values
+
+    e.g. parameter_grid(fast=[5, 10], slow=[50]) gives [{'fast': 5, 'slow': 50}, {'fast': 10, 'slow': 50}]
+    """
+    names = list(parameter_values)
+    return [dict(zip(names, values)) for values in itertools.product(*(list(values) for values in parameter_values.values()))]
+
+
+def walk_forward_windows(start, end, train_period, test_period, step=None, anchored: bool = False) -> List[Tuple[int, int, int]]:
+    """
+    Split a time range into rolling train and test windows. Parameters are chosen on each train window and judged on the test window which
+    follows it.
+
+    :param start: Start of the first train window
+    :param end: Windows whose test window would end after this are left out
+    :param train_period: Length of every train window, e.g. '730D' or pd.DateOffset(years=2)
+    :param test_period: Length of every test window
+    :param step: How far apart windows start. Default: test_period, so the test windows don't overlap
+    :param anchored: Whether every train window starts at start instead of rolling forward
+    :return: (train_start, test_start, test_end) of every window in nanoseconds since the epoch (UTC). Train windows are
+    [train_start, test_start) and test windows are [test_start, test_end).
+    """
+    def to_offset(period):
+        return pd.tseries.frequencies.to_offset(period) if isinstance(period, str) else period
+
+    train_period, test_period = to_offset(train_period), to_offset(test_period)
+    step = to_offset(step) if step is not None else test_period
+    start, end = (time if time.tzinfo is not None else time.tz_localize('UTC') for time in (pd.Timestamp(start), pd.Timestamp(end)))
+
+    windows = []
+    test_start = start + train_period
+    while test_start + test_period <= end:
+        train_start = start if anchored else test_start - train_period
+        windows.append((train_start.value, test_start.value, (test_start + test_period).value))
+        test_start = test_start + step
+
+    return windows
+
+
+def ema_crossover(ticker: array_ticker.ArrayTicker, parameters: Dict[str, any], first_row: int = 0) -> Dict[str, float]:
+    """
+    Example strategy to sweep: hold one share while the fast EMA is above the slow EMA. Evaluation functions take a ticker, the
+    parameters of a cell and the first row to judge the strategy from (the rows before it are only history for indicators), and return
+    metrics.
+
+    :param parameters: fast, slow: EMA periods
+    :return: total_return, max_drawdown, trades
+    """
+    fast_period, slow_period = parameters['fast'], parameters['slow']
+    if len(ticker) - first_row < 2:
+        return {'total_return': float('nan'), 'max_drawdown': float('nan'), 'trades': 0}
+
+    values = ticker.indicators(('ema', fast_period), ('ema', slow_period))
+    fast_ema, slow_ema = values[f'ema_{fast_period}'], values[f'ema_{slow_period}']
+
+    entries = fast_ema > slow_ema
+    entries[:first_row] = False
+    exits = fast_ema < slow_ema
+
+    # enough cash for one share, so returns are comparable between tickers
+    result = vectorized_backtest.backtest_signals(ticker, entries, exits, size=1, cash=float(ticker.close[first_row]))
+    equity = result.equity[first_row:]
+
+    return {
+        'total_return': float(equity[-1] / equity[0] - 1),
+        'max_drawdown': float((1 - equity / np.maximum.accumulate(equity)).max()),
+        'trades': int(len(result.trades['pnl'])),
+    }
+
+
+def _code_hash(code) -> str:
+    # hash of a code object's bytecode, constants and names. Nested functions are code objects in the constants, and are hashed the same way.
+    digest = hashlib.sha1()
+
+    def add(code_object):
+        digest.update(code_object.co_code)
+        digest.update(repr(code_object.co_names).encode())
+        for constant in code_object.co_consts:
+            if hasattr(constant, 'co_code'):
+                add(constant)
+            else:
+                digest.update(repr(constant).encode())
+
+    add(code)
+    return digest.hexdigest()
+
+
+class SweepResults:
+    """
+    Results of parameter sweeps, kept in a sqlite database with one row per cell so that an interrupted sweep can continue from where it
+    stopped.
+
+    A cell is one symbol, walk forward window and set of parameters, evaluated with one set of settings (see settings_key()). Cells are
+    keyed on the bounds of their window rather than its number, so running a sweep again with different windows, a different range,
+    evaluation function or warmup_bars evaluates new cells instead of reusing results which no longer apply. metrics are measured on the
+    train window (or the whole range if there are no windows), and test_metrics on the test window.
+    """
+
+    def __init__(self, path: str = os.path.join('stored_data', 'sweeps.sqlite3')):
+        self.path = path
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        # transactions are managed manually through self._transaction()
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+
+        with self._transaction() as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS sweep_results (
+                    sweep TEXT NOT NULL,
+                    symbol TEXT NOT NULL,
+                    train_start INTEGER NOT NULL,
+                    test_start INTEGER NOT NULL,
+                    test_end INTEGER NOT NULL,
+                    settings TEXT NOT NULL,
+                    parameters TEXT NOT NULL,
+                    metrics TEXT NOT NULL,
+                    test_metrics TEXT,
+                    PRIMARY KEY (sweep, symbol, train_start, test_start, test_end, settings, parameters)
+                ) WITHOUT ROWID
+            """)
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    @staticmethod
+    def parameters_key(parameters: Dict[str, any]) -> str:
+        return json.dumps(parameters, sort_keys=True)
+
+    @staticmethod
+    def settings_key(evaluate: Callable, warmup_bars: int, version: str = None) -> str:
+        """
+        Fingerprint of the settings which a sweep's metrics depend on besides the window and parameters: the evaluation function, warmup_bars
+        and a version.
+
+        The evaluation function is identified by its name and a hash of its code, including its constants and the names it uses, so editing
+        it counts as a change. Changes to functions it calls (e.g. vectorized_backtest.backtest_signals()) aren't seen, so version should be
+        changed when they would change the metrics.
+
+        :param version: Any string which identifies the version of the code being evaluated
+        """
+        code = getattr(evaluate, '__code__', None)
+        return json.dumps({
+            'evaluate': f"{evaluate.__module__}.{getattr(evaluate, '__qualname__', type(evaluate).__qualname__)}",
+            'code': _code_hash(code) if code is not None else None,
+            'warmup_bars': warmup_bars,
+            'version': version,
+        }, sort_keys=True)
+
+    def finished_cells(self, sweep: str, settings: str) -> set:
+        """
+        :param settings: From settings_key()
+        :return: (symbol, train_start, test_start, test_end, parameters key) of every cell with results for these settings
+        """
+        rows = self.connection.execute("SELECT symbol, train_start, test_start, test_end, parameters FROM sweep_results "
+                                       "WHERE sweep = ? AND settings = ?", (sweep, settings))
+        return set(rows)
+
+    def add(self, sweep: str, settings: str, results: Iterable[Tuple[str, int, int, int, str, Dict, Dict]]):
+        """
+        :param settings: From settings_key()
+        :param results: (symbol, train_start, test_start, test_end, parameters key, metrics, test metrics) for every finished cell
+        """
+        with self._transaction() as connection:
+            connection.executemany("INSERT OR REPLACE INTO sweep_results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                   [(sweep, symbol, train_start, test_start, test_end, settings, parameters, json.dumps(metrics),
+                                     json.dumps(test_metrics) if test_metrics is not None else None)
+                                    for symbol, train_start, test_start, test_end, parameters, metrics, test_metrics in results])
+
+    def to_dataframe(self, sweep: str, settings: str = None) -> pd.DataFrame:
+        """
+        Get the results of a sweep with a column for every parameter and metric. Test metrics are prefixed with 'test_'. Window bounds are
+        given as UTC timestamps.
+
+        :param settings: Only get results evaluated with these settings (from settings_key()). Default: every result in the sweep
+        """
+        query = "SELECT symbol, train_start, test_start, test_end, settings, parameters, metrics, test_metrics FROM sweep_results " \
+                "WHERE sweep = ?"
+        query_args = (sweep,)
+        if settings is not None:
+            query += " AND settings = ?"
+            query_args += (settings,)
+
+        records = []
+        for symbol, train_start, test_start, test_end, cell_settings, parameters, metrics, test_metrics in self.connection.execute(
+                query, query_args):
+            record = {'symbol': symbol, 'train_start': pd.Timestamp(train_start, tz='UTC'), 'test_start': pd.Timestamp(test_start, tz='UTC'),
+                      'test_end': pd.Timestamp(test_end, tz='UTC'), 'settings': cell_settings}
+            record.update(json.loads(parameters))
+            record.update(json.loads(metrics))
+            if test_metrics is not None:
+                record.update({f'test_{name}': value for name, value in json.loads(test_metrics).items()})
+            records.append(record)
+        return pd.DataFrame(records)
+
+    def close(self):
+        self.connection.close()
+
+
+# set in every worker process by _init_worker()
+_worker_tickers: Dict[str, array_ticker.ArrayTicker] = None
+_worker_evaluate: Callable = None
+_worker_shared: SharedPriceData = None
+
+
+def _init_worker(name: str, layout: Dict[str, Dict], evaluate: Callable):
+    global _worker_tickers, _worker_evaluate, _worker_shared
+    _worker_shared = SharedPriceData.attach(name, layout)
+    _worker_tickers = _worker_shared.tickers()
+    _worker_evaluate = evaluate
+
+
+def _window_rows(timestamps: np.ndarray, first_time: int, last_time: int, warmup_bars: int) -> Tuple[int, int, int]:
+    # rows of the window [first_time, last_time), and where it starts once warmup_bars of history are added before it
+    first_row, last_row = np.searchsorted(timestamps, [first_time, last_time], side='left')
+    return max(0, first_row - warmup_bars), int(first_row), int(last_row)
+
+
+def _whole_range(ticker: array_ticker.ArrayTicker) -> Tuple[int, int, int]:
+    # bounds of a cell which is evaluated over every bar of a ticker. The test window is empty, since there isn't one.
+    if not len(ticker):
+        return 0, 0, 0
+    last_time = int(ticker.timestamps[-1]) + 1
+    return int(ticker.timestamps[0]), last_time, last_time
+
+
+def _evaluate_cells(cells: List[Tuple[str, int, int, int, str]], warmup_bars: int) -> List[Tuple[str, int, int, int, str, Dict, Dict]]:
+    """
+    Evaluate a chunk of cells in a worker process
+    """
+    results = []
+    for symbol, train_start, test_start, test_end, parameters_key in cells:
+        ticker = _worker_tickers[symbol]
+        parameters = json.loads(parameters_key)
+
+        if test_start == test_end:
+            metrics, test_metrics = _worker_evaluate(ticker, parameters, 0), None
+        else:
+            history_row, first_row, last_row = _window_rows(ticker.timestamps, train_start, test_start, warmup_bars)
+            metrics = _worker_evaluate(ticker[history_row:last_row], parameters, first_row - history_row)
+            history_row, first_row, last_row = _window_rows(ticker.timestamps, test_start, test_end, warmup_bars)
+            test_metrics = _worker_evaluate(ticker[history_row:last_row], parameters, first_row - history_row)
+
+        results.append((symbol, train_start, test_start, test_end, parameters_key, metrics, test_metrics))
+
+    return results
+
+
+def run_sweep(sweep: str, tickers: Iterable[array_ticker.ArrayTicker], grid: List[Dict[str, any]], evaluate: Callable = ema_crossover,
+              results: SweepResults = None, windows: List[Tuple[int, int, int]] = None, warmup_bars: int = 200, max_workers: int = None,
+              chunk_size: int = 16, progress: Callable[[int, int, float], None] = None, version: str = None) -> SweepResults:
+    """
+    Evaluate every set of parameters on every ticker (and every walk forward window) across a pool of processes.
+
+    The tickers are copied into shared memory once, and workers read them from there, so only the cells to evaluate and their metrics
+    are sent between processes. Results are written as chunks finish. Cells which already have results in the table for the same window
+    bounds, evaluate function and warmup_bars are skipped, so running an interrupted sweep again continues it.
+
+    :param sweep: Name of the sweep in the results table
+    :param tickers: Bars to evaluate on
+    :param grid: Parameter sets, e.g. from parameter_grid()
+    :param evaluate: Takes (ticker, parameters, first_row) and returns a dict of JSON serializable metrics. See ema_crossover(). Must be
+    defined at the top level of a module so that it can be sent to worker processes.
+    :param results: Where to store the results. Default: stored_data/sweeps.sqlite3
+    :param windows: Walk forward windows from walk_forward_windows(). Default: evaluate every ticker's whole range
+    :param warmup_bars: Bars of history before each window which are given to evaluate for indicators to warm up
+    :param max_workers: How many processes to use. Default: one per core
+    :param chunk_size: How many cells each task evaluates
+    :param progress: Called with (finished cells, total cells, elapsed seconds) after every chunk
+    :param version: Identifies the version of the code being evaluated. Cells evaluated with a different version are evaluated again. See
+    SweepResults.settings_key()
+    """
+    results = results if results is not None else SweepResults()
+    tickers = list(tickers)
+    settings = SweepResults.settings_key(evaluate, warmup_bars, version)
+
+    finished = results.finished_cells(sweep, settings)
+    cells = [(ticker.symbol, *window, SweepResults.parameters_key(parameters))
+             for ticker in tickers for window in (windows or [_whole_range(ticker)]) for parameters in grid]
+    total = len(cells)
+    cells = [cell for cell in cells if cell not in finished]
+    chunks = [cells[i:i + chunk_size] for i in range(0, len(cells), chunk_size)]
+
+    start_time = time.monotonic()
+    done = total - len(cells)
+    if not chunks:
+        return results
+
+    with SharedPriceData.create(tickers) as shared:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                                    initargs=(shared.name, shared.layout, evaluate)) as executor:
+            # only keep a few chunks per worker queued, so results are written steadily and huge grids don't fill memory with futures
+            max_pending = 4 * (max_workers or os.cpu_count() or 1)
+            chunk_iterator = iter(chunks)
+            pending = set()
+
+            while True:
+                for chunk in itertools.islice(chunk_iterator, max_pending - len(pending)):
+                    pending.add(executor.submit(_evaluate_cells, chunk, warmup_bars))
+                if not pending:
+                    break
+
+                completed, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in completed:
+                    chunk_results = future.result()
+                    results.add(sweep, settings, chunk_results)
+                    done += len(chunk_results)
+                    if progress is not None:
+                        progress(done, total, time.monotonic() - start_time)
+
+    return results
+
+
+def walk_forward_summary(results: SweepResults, sweep: str, metric: str = 'total_return', maximize: bool = True,
+                         settings: str = None) -> pd.DataFrame:
+    """
+    Choose the best parameters on every train window, and show how they did on the test window which follows it
+
+    :param metric: Train metric to choose parameters by
+    :param settings: Only use results evaluated with these settings (from SweepResults.settings_key()). Default: every result, where each
+    set of settings is summarized separately
+    :return: A row for every symbol, window and set of settings with the chosen parameters, their train metrics and their test metrics
+    """
+    table = results.to_dataframe(sweep, settings)
+    if table.empty:
+        return table
+
+    table = table.dropna(subset=[metric])
+    groups = table.groupby(['symbol', 'train_start', 'test_start', 'test_end', 'settings'])[metric]
+    best_rows = groups.idxmax() if maximize else groups.idxmin()
+    return table.loc[best_rows.values].reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Sweep EMA crossover periods over stored tickers with walk forward windows")
+    parser.add_argument('ticker_symbols', nargs='+')
+    parser.add_argument('--ticker-directory', default=os.path.join('stored_data', 'tickers'))
+    parser.add_argument('--interval', default='1d')
+    parser.add_argument('--start', default='2010-01-01')
+    parser.add_argument('--end', default=None)
+    parser.add_argument('--train', default='730D', help="Length of train windows")
+    parser.add_argument('--test', default='180D', help="Length of test windows")
+    parser.add_argument('--warmup-bars', type=int, default=200, help="Bars of history given before each window")
+    parser.add_argument('--code-version', default=None, help="Change this to evaluate every cell again after changing the strategy code")
+    parser.add_argument('--workers', type=int, default=None, help="Number of processes. Default: one per core")
+    parser.add_argument('--results', default=os.path.join('stored_data', 'sweeps.sqlite3'))
+    parser.add_argument('--sweep', default='ema_crossover')
+    args = parser.parse_args()
+
+    provider = data_provider.StockDataProvider(args.ticker_directory)
+    sweep_tickers = [array_ticker.ArrayTicker.from_provider(provider, symbol, start=args.start, end=args.end, interval=args.interval)
+                     for symbol in args.ticker_symbols]
+    sweep_end = args.end if args.end is not None else pd.Timestamp.now(tz='UTC')
+    sweep_windows = walk_forward_windows(args.start, sweep_end, args.train, args.test)
+
+    # the fast EMA must be shorter than the slow one for a crossover to mean anything
+    sweep_grid = [parameters for parameters in parameter_grid(fast=range(5, 50, 5), slow=range(20, 200, 20))
+                  if parameters['fast'] < parameters['slow']]
+
+    sweep_results = run_sweep(args.sweep, sweep_tickers, sweep_grid,
+                              results=SweepResults(args.results), windows=sweep_windows, warmup_bars=args.warmup_bars,
+                              max_workers=args.workers, version=args.code_version,
+                              progress=lambda finished, total, elapsed: print(f'{finished}/{total} cells in {elapsed:.1f}s'))
+
+    summary = walk_forward_summary(sweep_results, args.sweep, settings=SweepResults.settings_key(ema_crossover, args.warmup_bars, args.code_version))
+    print(summary.to_string())
@@ -0,0 +1,87 @@
+__author__ = "Ethan Posner"
+__copyright__ = ""
+__credits__ = []
+__license__ = ""
+__version__ = "0,1dev"
+__maintainer__ = "Ethan Posner"
+__status__ = "Production"
+
+import random
+import threading
+import time
+from typing import Callable, Tuple, Type
+
+
+class TokenBucket:
+    """
+    Limits how often requests can be made. Tokens are added at a constant rate up to a maximum, and every request uses one up.
+
+    This allows short bursts of requests while keeping the long term rate under the limit. Can be shared by multiple threads.
+    """
+
+    def __init__(self, rate: float, capacity: int = 1):
+        """
+        :param rate: How many tokens are added every second
+        :param capacity: The most tokens which can be saved up for a burst of requests
+        """
+        self.rate = rate
+        self.capacity = capacity
+
+        self._tokens = float(capacity)
+        self._last_update = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_update) * self.rate)
+        self._last_update = now
+
+    def try_acquire(self) -> bool:
+        """
+        Use up a token if one is available without waiting
+
+        :return: Whether or not a token was available
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self):
+        """
+        Wait until a token is available and use it up
+        """
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self.rate
+
+            time.sleep(wait_time)
+
+
+def retry_with_backoff(function: Callable, max_retries: int = 3, base_delay: float = 1.0, max_delay: float = 60.0,
+                       exceptions: Tuple[Type[BaseException], ...] = (Exception,)):
+    """
+    Call a function, retrying it with exponentially increasing delays if it raises an exception
+
+    :param function: Function which takes no arguments
+    :param max_retries: How many times to retry after the first attempt fails
+    :param base_delay: Seconds to wait before the first retry. This doubles for every retry after it.
+    :param max_delay: The longest time to wait between attempts
+    :param exceptions: Exception types which should be retried. Anything else is raised immediately.
+    :return: What the function returned
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return function()
+        except exceptions:
+            if attempt == max_retries:
+                raise
+
+        # random jitter prevents threads which failed at the same time from all retrying at the same time
+        time.sleep(min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.0))
@@ -0,0 +1,179 @@
+__author__ = "Ethan Posner"
+__copyright__ = ""
+__credits__ = []
+__license__ = ""
+__version__ = "0,1dev"
+__maintainer__ = "Ethan Posner"
+__status__ = "Production"
+
+import datetime as dt
+import threading
+import traceback
+from typing import Dict, Iterable, List
+
+import data_provider
+
+
+class RefreshScheduler:
+    """
+    Keeps stored ticker data up to date on a background thread, so that StockDataProvider.get_ticker() calls made by the trading loop find
+    fresh data locally instead of waiting on a download.
+
+    Every check_period seconds, the coverage catalog is used to find symbols whose stored data will expire within lead_time (see
+    StockDataProvider.interval_deltas) and they are refreshed before that happens. The watchlist is also prefetched once per weekday shortly
+    before the market opens.
+    """
+
+    def __init__(self, provider: data_provider.StockDataProvider, intervals: Iterable[str] = ('1d',), watchlist: Iterable[str] = (),
+                 lead_time: float = 0.25, check_period: float = 60.0, market_open: dt.time = dt.time(9, 30),
+                 prefetch_lead: dt.timedelta = dt.timedelta(minutes=30), prefetch_start=None, max_workers: int = 4,
+                 requests_per_second: float = 2.0):
+        """
+        :param provider: The provider whose stored data should be kept up to date
+        :param intervals: Which intervals of stored data to refresh
+        :param watchlist: Symbols which should be prefetched before the market opens, even if they haven't been stored yet
+        :param lead_time: How early data should be refreshed, as a fraction of the interval. e.g. 0.25 refreshes daily data once it is
+        18 hours old instead of waiting until it is 24 hours old.
+        :param check_period: Seconds between checks for data which needs to be refreshed
+        :param market_open: Local time which the market opens at
+        :param prefetch_lead: How long before the market opens the watchlist should be prefetched
+        :param prefetch_start: Start of the data to prefetch for watchlist symbols which haven't been stored yet. Default: 1970-01-01
+        :param max_workers: How many requests can be made at the same time. See StockDataProvider.get_tickers()
+        :param requests_per_second: Long term limit for how often requests are made. See StockDataProvider.get_tickers()
+        """
+        self.provider = provider
+        self.intervals = list(intervals)
+        self.watchlist = [symbol.upper() for symbol in watchlist]
+        self.lead_time = lead_time
+        self.check_period = check_period
+        self.market_open = market_open
+        self.prefetch_lead = prefetch_lead
+        self.prefetch_start = prefetch_start
+        self.max_workers = max_workers
+        self.requests_per_second = requests_per_second
+
+        # the day which the watchlist was last prefetched on
+        self.last_prefetch_date: dt.date = None
+
+        # how many times each symbol failed to be refreshed. format: "ticker_str": count
+        self.failure_counts: Dict[str, int] = {}
+
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread = None
+
+    def due_symbols(self, interval: str, now: dt.datetime = None) -> List[str]:
+        """
+        Find stored symbols whose data at the given interval will expire within the lead time
+
+        :param now: Time to compare against. Default: now
+        """
+        return self.provider.catalog.stale_symbols(interval, max_age=self.refresh_age(interval), now=now)
+
+    def refresh_age(self, interval: str) -> dt.timedelta:
+        """
+        How old stored data at the given interval may get before it is refreshed
+        """
+        return self.provider.interval_deltas[interval] * (1 - self.lead_time)
+
+    def _fetch(self, ticker_symbols: List[str], start, end: dt.datetime, interval: str,
+               tolerance: dt.timedelta = None) -> data_provider.BulkFetchResult:
+        result = self.provider.get_tickers(ticker_symbols, start=start, end=end, interval=interval, max_workers=self.max_workers,
+                                           requests_per_second=self.requests_per_second, tolerance=tolerance)
+
+        for ticker_symbol in result.failures:
+            self.failure_counts[ticker_symbol] = self.failure_counts.get(ticker_symbol, 0) + 1
+
+        return result
+
+    def refresh(self, now: dt.datetime = None) -> Dict[str, data_provider.BulkFetchResult]:
+        """
+        Refresh every stored symbol whose data will expire within the lead time
+
+        :param now: Time to refresh data up to. Default: now
+        :return: interval: result for every interval which had symbols to refresh
+        """
+        now = now if now is not None else dt.datetime.now()
+
+        results = {}
+        for interval in self.intervals:
+            ticker_symbols = self.due_symbols(interval, now)
+            if not ticker_symbols:
+                continue
+
+            # start from the earliest point where any of these symbols' data runs out, so that only their latest data is missing
+            last_retrieved = self.provider.catalog.last_retrieved(interval)
+            start = min(last_retrieved[ticker_symbol].end for ticker_symbol in ticker_symbols)
+
+            # the provider would ignore data missing for less than a whole interval, so the due symbols wouldn't be downloaded until their
+            # data had expired
+            results[interval] = self._fetch(ticker_symbols, start, now, interval, tolerance=self.refresh_age(interval))
+
+        return results
+
+    def prefetch_watchlist(self, now: dt.datetime = None) -> Dict[str, data_provider.BulkFetchResult]:
+        """
+        Retrieve data for every symbol in the watchlist at every interval, and load it into the provider's cache
+
+        :param now: Time to retrieve data up to. Default: now
+        :return: interval: result for every interval
+        """
+        now = now if now is not None else dt.datetime.now()
+
+        results = {}
+        if self.watchlist:
+            for interval in self.intervals:
+                results[interval] = self._fetch(self.watchlist, self.prefetch_start, now, interval)
+
+        self.last_prefetch_date = now.date()
+
+        return results
+
+    def prefetch_due(self, now: dt.datetime = None) -> bool:
+        """
+        Whether or not it is time to prefetch the watchlist. This is true on weekdays within prefetch_lead before the market opens, if the
+        watchlist hasn't already been prefetched that day.
+        """
+        now = now if now is not None else dt.datetime.now()
+
+        market_open = dt.datetime.combine(now.date(), self.market_open)
+        return now.weekday() < 5 and market_open - self.prefetch_lead <= now < market_open and self.last_prefetch_date != now.date()
+
+    def run_once(self, now: dt.datetime = None):
+        """
+        Do a single check for anything which needs to be refreshed or prefetched
+        """
+        if self.prefetch_due(now):
+            self.prefetch_watchlist(now)
+        self.refresh(now)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                # the scheduler should keep running, since the next check may succeed
+                traceback.print_exc()
+            self._stop_event.wait(self.check_period)
+
+    def start(self) -> 'RefreshScheduler':
+        """
+        Start refreshing data on a background thread
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='RefreshScheduler', daemon=True)
+            self._thread.start()
+
+        return self
+
+    def stop(self, timeout: float = None):
+        """
+        Stop refreshing data. A refresh which is in progress is allowed to finish.
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
@@ -0,0 +1,159 @@
+__author__ = "Ethan Posner"
+__copyright__ = ""
+__credits__ = []
+__license__ = ""
+__version__ = "0,1dev"
+__maintainer__ = "Ethan Posner"
+__status__ = "Production"
+
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+# length of every intraday interval in minutes
+INTRADAY_MINUTES = {
+    "1m": 1,
+    "2m": 2,
+    "5m": 5,
+    "15m": 15,
+    "30m": 30,
+    "60m": 60,
+    "90m": 90,
+    "1h": 60,
+}
+
+# intervals which are aligned to the calendar, from finest to coarsest. Each can be built from any interval before it except that
+# months can't be built from weeks, since weeks can span two months.
+CALENDAR_INTERVALS = ["1d", "1wk", "1mo", "3mo"]
+
+# how each column is combined when bars are merged. Any other column keeps its last value.
+OHLCV_AGGREGATIONS = {
+    "Open": "first",
+    "High": "max",
+    "Low": "min",
+    "Close": "last",
+    "Adj Close": "last",
+    "Volume": "sum",
+}
+
+_MINUTE_NS = 60 * 10 ** 9
+
+
+def can_resample(source_interval: str, target_interval: str) -> bool:
+    """
+    Whether or not bars at target_interval can be built by combining bars at source_interval
+    """
+    if source_interval == target_interval:
+        return False
+
+    if target_interval in INTRADAY_MINUTES:
+        return source_interval in INTRADAY_MINUTES and INTRADAY_MINUTES[target_interval] % INTRADAY_MINUTES[source_interval] == 0 and \
+            INTRADAY_MINUTES[target_interval] > INTRADAY_MINUTES[source_interval]
+
+    if target_interval in CALENDAR_INTERVALS:
+        if source_interval in INTRADAY_MINUTES:
+            return True
+        if source_interval == "1wk" and target_interval in ("1mo", "3mo"):
+            return False
+        return source_interval in CALENDAR_INTERVALS and CALENDAR_INTERVALS.index(source_interval) < CALENDAR_INTERVALS.index(target_interval)
+
+    return False
+
+
+def source_intervals(target_interval: str) -> List[str]:
+    """
+    Get every interval which bars at target_interval can be built from, coarsest first since those require the least work
+    """
+    candidates = [interval for interval in list(INTRADAY_MINUTES) + CALENDAR_INTERVALS if can_resample(interval, target_interval)]
+    return candidates[::-1]
+
+
+def _local_ns(index: pd.DatetimeIndex) -> np.ndarray:
+    """
+    Get the wall clock time of every row in nanoseconds. Sessions are split by local calendar day, so this is used instead of UTC time.
+    """
+    local_index = index.tz_localize(None) if index.tz is not None else index
+    return local_index.values.astype("datetime64[ns]").view("int64")
+
+
+def _bar_labels(index: pd.DatetimeIndex, target_interval: str) -> np.ndarray:
+    """
+    Find which resampled bar every row belongs to
+
+    :return: int64 array of labels which only increase, since the index is sorted. Intraday labels are the local start time of each bar.
+    """
+    ns = _local_ns(index)
+    days = ns // (24 * 60 * _MINUTE_NS)
+
+    if target_interval in INTRADAY_MINUTES:
+        # bars start at the first bar of each session (e.g. 9:30) so that no bar spans two trading sessions
+        _, first_rows, day_numbers = np.unique(days, return_index=True, return_inverse=True)
+        session_start = ns[first_rows][day_numbers.reshape(-1)]
+        bar_ns = INTRADAY_MINUTES[target_interval] * _MINUTE_NS
+        return session_start + (ns - session_start) // bar_ns * bar_ns
+
+    if target_interval == "1d":
+        return days
+    if target_interval == "1wk":
+        # weekly bars are labelled by monday. 1970-01-01 was a thursday.
+        return days - (days + 3) % 7
+
+    months = days.astype("datetime64[D]").astype("datetime64[M]").astype("int64")
+    if target_interval == "1mo":
+        return months
+    if target_interval == "3mo":
+        return months - months % 3
+
+    raise ValueError(f"Can't resample to interval '{target_interval}'")
+
+
+def resample_ohlcv(dataframe: pd.DataFrame, target_interval: str) -> pd.DataFrame:
+    """
+    Combine bars into bars with a longer interval. Open is the first open, High the highest high, Low the lowest low, Close the last close
+    and Volume the total volume of the combined bars.
+
+    Intraday bars never span two trading sessions. Daily and longer bars are labelled by the first day of their period (monday for weeks),
+    which is how yahoo finance labels them.
+
+    :param dataframe: Bars with a sorted DatetimeIndex and any of the Open, High, Low, Close, Adj Close and Volume columns
+    :param target_interval: The interval of the returned bars e.g. '1h', '1d', '1wk'
+    :return: Resampled bars
+    """
+    dataframe = dataframe.dropna(how="all")
+    index = pd.DatetimeIndex(dataframe.index)
+
+    if not len(dataframe):
+        return dataframe
+
+    labels = _bar_labels(index, target_interval)
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    ends = np.r_[starts[1:], len(labels)] - 1
+
+    columns = {}
+    for column in dataframe.columns:
+        values = dataframe[column].to_numpy()
+        aggregation = OHLCV_AGGREGATIONS.get(column, "last")
+        if aggregation == "first":
+            columns[column] = values[starts]
+        elif aggregation == "last":
+            columns[column] = values[ends]
+        elif aggregation == "max":
+            columns[column] = np.fmax.reduceat(values, starts)
+        elif aggregation == "min":
+            columns[column] = np.fmin.reduceat(values, starts)
+        elif aggregation == "sum":
+            columns[column] = np.add.reduceat(np.nan_to_num(values), starts)
+
+    if target_interval in INTRADAY_MINUTES:
+        # shift the original times to the start of their bar. This avoids converting local times back, which is ambiguous around DST changes.
+        bar_ns = index.values.astype("datetime64[ns]").view("int64") + (labels - _local_ns(index))
+        resampled_index = pd.DatetimeIndex(bar_ns[starts].view("datetime64[ns]"), name=index.name)
+        if index.tz is not None:
+            resampled_index = resampled_index.tz_localize("UTC").tz_convert(index.tz)
+    elif target_interval in ("1d", "1wk"):
+        resampled_index = pd.DatetimeIndex(labels[starts].astype("datetime64[D]").astype("datetime64[ns]"), name="Date")
+    else:
+        resampled_index = pd.DatetimeIndex(labels[starts].astype("datetime64[M]").astype("datetime64[ns]"), name="Date")
+
+    return pd.DataFrame(columns, index=resampled_index, columns=list(dataframe.columns))
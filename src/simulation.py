@@ -0,0 +1,379 @@
+__author__ = "Ethan Posner"
+__copyright__ = ""
+__credits__ = []
+__license__ = ""
+__version__ = "0,1dev"
+__maintainer__ = "Ethan Posner"
+__status__ = "Production"
+
+import heapq
+import itertools
+import random
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+NANOSECONDS_PER_SECOND = 10**9
+
+
+class SimulatedClock:
+    """
+    Time in a simulation. It only moves when it is advanced, so a simulation over years of data runs as fast as the events in it can be
+    processed.
+
+    Times are int64 nanoseconds since the epoch (UTC), the same as the timestamps of StorageFormatADT.read_arrays() and ArrayTicker.
+    """
+
+    def __init__(self, now: int = 0, timezone: str = None):
+        """
+        :param now: Time to start at
+        :param timezone: Timezone of datetime. Default: UTC
+        """
+        self.now = now
+        self.timezone = timezone
+
+    def advance_to(self, time: int):
+        """
+        Move the clock forward. Time never goes backwards, so earlier times are ignored.
+        """
+        if time > self.now:
+            self.now = time
+
+    @property
+    def datetime(self) -> pd.Timestamp:
+        """
+        The current time as a timezone aware timestamp
+        """
+        return pd.Timestamp(self.now, tz='UTC').tz_convert(self.timezone) if self.timezone is not None else pd.Timestamp(self.now, tz='UTC')
+
+
+class EventScheduler:
+    """
+    Runs callbacks at simulated times in time order, using a heap as a priority queue.
+
+    Events at the same time run in the order they were scheduled. Each event is a plain tuple, so scheduling and running one only costs
+    a heap push and pop.
+    """
+
+    def __init__(self, clock: SimulatedClock = None):
+        """
+        :param clock: Clock which is advanced to each event's time before it runs. Default: a new clock starting at 0
+        """
+        self.clock = clock if clock is not None else SimulatedClock()
+
+        # (time, sequence number, callback, args). The sequence number keeps events at the same time in order and stops callbacks from being
+        # compared.
+        self._events: List[Tuple[int, int, Callable, tuple]] = []
+        self._sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    @property
+    def next_time(self) -> int:
+        """
+        Time of the next event, or None if nothing is scheduled
+        """
+        return self._events[0][0] if self._events else None
+
+    def schedule(self, time: int, callback: Callable, *args):
+        """
+        Run callback(*args) at a time. Events scheduled in the past run the next time events are run.
+        """
+        heapq.heappush(self._events, (time, next(self._sequence), callback, args))
+
+    def schedule_after(self, delay: int, callback: Callable, *args):
+        """
+        Run callback(*args) delay nanoseconds after the current time
+        """
+        heapq.heappush(self._events, (self.clock.now + delay, next(self._sequence), callback, args))
+
+    def run_until(self, time: int) -> int:
+        """
+        Run every event scheduled up to and including a time, including ones scheduled by the events themselves, then advance the clock to
+        that time
+
+        :return: How many events were run
+        """
+        events = self._events
+        clock = self.clock
+        count = 0
+
+        while events and events[0][0] <= time:
+            event_time, _, callback, args = heapq.heappop(events)
+            if event_time > clock.now:
+                clock.now = event_time
+            callback(*args)
+            count += 1
+
+        clock.advance_to(time)
+        return count
+
+    def run(self) -> int:
+        """
+        Run every scheduled event
+
+        :return: How many events were run
+        """
+        count = 0
+        while self._events:
+            count += self.run_until(self._events[0][0])
+        return count
+
+
+class LatencyModelADT(ABC):
+    """
+    How long it takes for an order to reach the market after it is sent
+    """
+
+    @abstractmethod
+    def delay(self, order) -> int:
+        """
+        :param order: The StockOrder being sent
+        :return: Delay in nanoseconds
+        """
+        pass
+
+
+class FixedLatency(LatencyModelADT):
+
+    def __init__(self, seconds: float = 0.0):
+        self.nanoseconds = int(seconds * NANOSECONDS_PER_SECOND)
+
+    def delay(self, order) -> int:
+        return self.nanoseconds
+
+
+class RandomLatency(LatencyModelADT):
+    """
+    Delays chosen uniformly between a minimum and maximum
+    """
+
+    def __init__(self, min_seconds: float, max_seconds: float, seed: int = None):
+        """
+        :param seed: Seed for the random delays, so that simulations can be repeated
+        """
+        self.min_nanoseconds = int(min_seconds * NANOSECONDS_PER_SECOND)
+        self.max_nanoseconds = int(max_seconds * NANOSECONDS_PER_SECOND)
+        self._random = random.Random(seed)
+
+    def delay(self, order) -> int:
+        return self._random.randint(self.min_nanoseconds, self.max_nanoseconds)
+
+
+class SlippageModelADT(ABC):
+    """
+    How far the price an order is filled at is from the market price
+    """
+
+    @abstractmethod
+    def fill_price(self, side: str, price: float, amount: float) -> float:
+        """
+        :param side: 'buy' or 'sell'
+        :param price: Market price when the order is filled
+        :param amount: Number of stocks being traded
+        :return: Price per share which the order is filled at
+        """
+        pass
+
+
+class NoSlippage(SlippageModelADT):
+
+    def fill_price(self, side: str, price: float, amount: float) -> float:
+        return price
+
+
+class FixedSlippage(SlippageModelADT):
+    """
+    Buys are filled a fixed amount per share above the market price, and sells the same amount below it
+    """
+
+    def __init__(self, per_share: float):
+        self.per_share = per_share
+
+    def fill_price(self, side: str, price: float, amount: float) -> float:
+        return price + self.per_share if side == 'buy' else price - self.per_share
+
+
+class PercentSlippage(SlippageModelADT):
+    """
+    Buys are filled a fraction of the price above the market price, and sells the same fraction below it
+    """
+
+    def __init__(self, fraction: float):
+        """
+        :param fraction: e.g. 0.0005 for 5 basis points
+        """
+        self.fraction = fraction
+
+    def fill_price(self, side: str, price: float, amount: float) -> float:
+        return price * (1 + self.fraction) if side == 'buy' else price * (1 - self.fraction)
+
+
+class CommissionModelADT(ABC):
+    """
+    How much the broker charges for filling an order
+
+    Slippage and commission models only use elementwise operations, so vectorized_backtest can apply them to arrays of fills.
+    """
+
+    @abstractmethod
+    def commission(self, amount: float, price: float) -> float:
+        """
+        :param amount: Number of stocks traded
+        :param price: Price per share the order was filled at
+        :return: Commission in dollars
+        """
+        pass
+
+
+class NoCommission(CommissionModelADT):
+
+    def commission(self, amount: float, price: float) -> float:
+        return 0.0
+
+
+class PerShareCommission(CommissionModelADT):
+
+    def __init__(self, per_share: float, minimum: float = 0.0):
+        """
+        :param minimum: The least which is charged for an order
+        """
+        self.per_share = per_share
+        self.minimum = minimum
+
+    def commission(self, amount: float, price: float) -> float:
+        return np.maximum(self.minimum, np.abs(amount) * self.per_share)
+
+
+class PercentCommission(CommissionModelADT):
+
+    def __init__(self, fraction: float, minimum: float = 0.0):
+        """
+        :param fraction: Fraction of the traded value which is charged e.g. 0.001 for 0.1%
+        :param minimum: The least which is charged for an order
+        """
+        self.fraction = fraction
+        self.minimum = minimum
+
+    def commission(self, amount: float, price: float) -> float:
+        return np.maximum(self.minimum, np.abs(amount) * price * self.fraction)
+
+
+class ReplayTick:
+    """
+    Every bar at one time in a MultiSymbolReplay
+    """
+
+    __slots__ = ('time', 'symbols', 'rows', 'listed', 'delisted')
+
+    def __init__(self, time: int, symbols: List[str], rows: List[int], listed: List[str], delisted: List[str]):
+        """
+        :param time: Time of the bars in nanoseconds since the epoch (UTC)
+        :param symbols: Symbols which have a bar at this time. Symbols with a missing bar are left out.
+        :param rows: Row of each symbol's bar in its arrays
+        :param listed: Symbols whose first bar is at this time, after the replay started
+        :param delisted: Symbols whose last bar is at this time, before the replay ends
+        """
+        self.time = time
+        self.symbols = symbols
+        self.rows = rows
+        self.listed = listed
+        self.delisted = delisted
+
+    def __repr__(self) -> str:
+        return f'ReplayTick({pd.Timestamp(self.time, tz="UTC")}, {len(self.symbols)} symbols)'
+
+
+class MultiSymbolReplay:
+    """
+    Replays bars from many symbols in time order, with every bar at the same time delivered together as one ReplayTick.
+
+    The per symbol timestamp arrays are merged lazily with a heap holding each symbol's next time, so the work per bar is O(log symbols)
+    and the memory used doesn't grow with the length of the replay. Timestamps are read in blocks to avoid indexing numpy arrays one
+    element at a time. The arrays can be memory mapped (e.g. from the 'mmap' storage format), in which case only the blocks being read
+    need to be in memory.
+    """
+
+    def __init__(self, timestamps: Dict[str, np.ndarray], start_rows: Dict[str, int] = None, end_rows: Dict[str, int] = None,
+                 block_size: int = 1024):
+        """
+        :param timestamps: "ticker_str": sorted int64 nanoseconds since the epoch (UTC) of every bar
+        :param start_rows: "ticker_str": first row to replay. Default: 0
+        :param end_rows: "ticker_str": row after the last one to replay. Default: every row
+        :param block_size: How many timestamps of each symbol are read at once
+        """
+        self.timestamps = timestamps
+        self.start_rows = {symbol: (start_rows or {}).get(symbol, 0) for symbol in timestamps}
+        self.end_rows = {symbol: (end_rows or {}).get(symbol, len(symbol_timestamps)) for symbol, symbol_timestamps in timestamps.items()}
+        self.block_size = block_size
+
+        replayed = [symbol for symbol in timestamps if self.start_rows[symbol] < self.end_rows[symbol]]
+        self.first_time = min((int(timestamps[symbol][self.start_rows[symbol]]) for symbol in replayed), default=None)
+        self.last_time = max((int(timestamps[symbol][self.end_rows[symbol] - 1]) for symbol in replayed), default=None)
+
+    @classmethod
+    def from_tickers(cls, tickers, start=None, end=None, block_size: int = 1024) -> 'MultiSymbolReplay':
+        """
+        Replay ArrayTickers between start and end (inclusive)
+        """
+        # imported here since storage_formats isn't otherwise needed by simulations
+        import storage_formats
+
+        timestamps, start_rows, end_rows = {}, {}, {}
+        for ticker in tickers:
+            timestamps[ticker.symbol] = ticker.timestamps
+            start_rows[ticker.symbol], end_rows[ticker.symbol] = storage_formats.find_rows(ticker.timestamps, start, end, ticker.timezone)
+
+        return cls(timestamps, start_rows, end_rows, block_size=block_size)
+
+    def __iter__(self) -> Iterator[ReplayTick]:
+        symbols = list(self.timestamps)
+        timestamp_arrays = [self.timestamps[symbol] for symbol in symbols]
+        end_rows = [self.end_rows[symbol] for symbol in symbols]
+        last_rows = [len(self.timestamps[symbol]) - 1 for symbol in symbols]
+        block_size = self.block_size
+
+        # the block of timestamps being read for every symbol, and the row it starts at
+        blocks: List[List[int]] = [[] for _ in symbols]
+        block_starts = [0] * len(symbols)
+
+        def next_time(number: int, row: int) -> int:
+            position = row - block_starts[number]
+            block = blocks[number]
+            if position >= len(block):
+                block = blocks[number] = timestamp_arrays[number][row:min(row + block_size, end_rows[number])].tolist()
+                block_starts[number] = row
+                position = 0
+            return block[position]
+
+        # (next time, symbol number, row)
+        heap = [(next_time(number, self.start_rows[symbol]), number, self.start_rows[symbol]) for number, symbol in enumerate(symbols)
+                if self.start_rows[symbol] < end_rows[number]]
+        heapq.heapify(heap)
+
+        first_time, last_time = self.first_time, self.last_time
+        while heap:
+            time = heap[0][0]
+            tick_symbols, tick_rows, listed, delisted = [], [], [], []
+
+            while heap and heap[0][0] == time:
+                _, number, row = heap[0]
+                symbol = symbols[number]
+                tick_symbols.append(symbol)
+                tick_rows.append(row)
+
+                if row == 0 and time > first_time:
+                    listed.append(symbol)
+                if row == last_rows[number] and time < last_time:
+                    delisted.append(symbol)
+
+                if row + 1 < end_rows[number]:
+                    heapq.heapreplace(heap, (next_time(number, row + 1), number, row + 1))
+                else:
+                    heapq.heappop(heap)
+                    blocks[number] = []
+
+            yield ReplayTick(time, tick_symbols, tick_rows, listed, delisted)
@@ -0,0 +1,581 @@
+#!/usr/bin/env python
+
+__author__ = "Ethan Posner"
+__copyright__ = ""
+__credits__ = []
+__license__ = ""
+__version__ = "0,1dev"
+__maintainer__ = "Ethan Posner"
+__status__ = "Production"
+
+import argparse
+import json
+import os
+import shutil
+from abc import ABC, abstractmethod
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+
+class StorageFormatADT(ABC):
+    """
+    Reads and writes stored ticker dataframes in a specific file format.
+
+    Every stored dataframe is identified by a directory and a name (e.g. the ticker symbol). Implementations decide how the name is mapped
+    onto one or more files inside of the directory.
+    """
+
+    # appended to the name of every stored entry, e.g. 'csv' for MSFT.csv
+    extension: str = None
+
+    # whether or not read_range() can avoid reading data outside of the requested range
+    supports_range_reads: bool = False
+
+    def path(self, directory: str, name: str) -> str:
+        """
+        Get the location where the dataframe with the given name is stored
+        """
+        return os.path.join(directory, f'{name}.{self.extension}')
+
+    def exists(self, directory: str, name: str) -> bool:
+        """
+        Whether or not a dataframe with the given name has been stored in the directory
+        """
+        return os.path.exists(self.path(directory, name))
+
+    def list_names(self, directory: str) -> List[str]:
+        """
+        Get the names of all dataframes stored in the directory using this format
+        """
+        if not os.path.isdir(directory):
+            return []
+
+        suffix = f'.{self.extension}'
+        return sorted(entry[:-len(suffix)] for entry in os.listdir(directory) if entry.endswith(suffix))
+
+    def delete(self, directory: str, name: str):
+        """
+        Remove a stored dataframe if it exists
+        """
+        path = self.path(directory, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.isfile(path):
+            os.remove(path)
+
+    @abstractmethod
+    def write(self, directory: str, name: str, dataframe: pd.DataFrame):
+        """
+        Store a dataframe, replacing anything previously stored under the same name
+        """
+        pass
+
+    @abstractmethod
+    def read(self, directory: str, name: str, columns: Sequence[str] = None) -> pd.DataFrame:
+        """
+        Load a stored dataframe
+
+        :param columns: Only load these columns. All columns are loaded if this isn't given.
+        :return: The stored dataframe with a DatetimeIndex
+        """
+        pass
+
+    def read_range(self, directory: str, name: str, start=None, end=None, columns: Sequence[str] = None) -> pd.DataFrame:
+        """
+        Load the rows of a stored dataframe between start and end (inclusive)
+
+        :param columns: Only load these columns. All columns are loaded if this isn't given.
+        """
+        return slice_rows(self.read(directory, name, columns=columns), start, end)
+
+    def append(self, directory: str, name: str, dataframe: pd.DataFrame):
+        """
+        Add rows to a stored dataframe, or store the dataframe if nothing is stored under this name yet. Where the stored and new rows have
+        the same time, the new row is kept.
+        """
+        if self.exists(directory, name):
+            dataframe = merge_dataframes(self.read(directory, name), dataframe)
+        self.write(directory, name, dataframe)
+
+    def read_timezone(self, directory: str, name: str) -> str:
+        """
+        Get the timezone of a stored dataframe's index, which read_arrays() drops since its timestamps are in UTC
+
+        :return: The timezone name, or None if the index is timezone naive
+        """
+        return _index_timezone(pd.DatetimeIndex(self.read(directory, name, columns=[]).index))
+
+    def read_arrays(self, directory: str, name: str, start=None, end=None, columns: Sequence[str] = None) -> Dict[str, np.ndarray]:
+        """
+        Load a stored dataframe as numpy arrays
+
+        :param start: Only load rows at or after this time
+        :param end: Only load rows at or before this time
+        :param columns: Only load these columns. All columns are loaded if this isn't given.
+        :return: column: array for every column, along with 'timestamps', which holds each row's time as int64 nanoseconds since the epoch
+        (UTC)
+        """
+        return dataframe_to_arrays(self.read(directory, name, columns=columns), start, end)
+
+
+def to_utc_ns(time, timezone: str = None) -> int:
+    """
+    Convert a time to nanoseconds since the epoch (UTC). Timezone naive times are treated as being in the given timezone.
+    """
+    time = pd.Timestamp(time)
+    if time.tzinfo is None and timezone is not None:
+        time = time.tz_localize(timezone)
+    if time.tzinfo is not None:
+        time = time.tz_convert('UTC').tz_localize(None)
+
+    return int(np.datetime64(time.to_datetime64(), 'ns').astype('int64'))
+
+
+def find_rows(timestamps: np.ndarray, start=None, end=None, timezone: str = None) -> Tuple[int, int]:
+    """
+    Binary search sorted int64 timestamps for the rows between start and end (inclusive)
+
+    :return: first_row, last_row such that timestamps[first_row:last_row] is within the range
+    """
+    first_row = int(np.searchsorted(timestamps, to_utc_ns(start, timezone), side='left')) if start is not None else 0
+    last_row = int(np.searchsorted(timestamps, to_utc_ns(end, timezone), side='right')) if end is not None else len(timestamps)
+
+    return first_row, max(first_row, last_row)
+
+
+def _index_timezone(index: pd.DatetimeIndex) -> str:
+    return str(index.tz) if index.tz is not None else None
+
+
+def slice_rows(dataframe: pd.DataFrame, start=None, end=None) -> pd.DataFrame:
+    """
+    Get the rows of a dataframe with a sorted DatetimeIndex between start and end (inclusive). Timezone naive start and end times are
+    treated as being in the timezone of the index.
+    """
+    index = pd.DatetimeIndex(dataframe.index)
+    first_row, last_row = find_rows(index.values.astype('datetime64[ns]').view('int64'), start, end, _index_timezone(index))
+
+    return dataframe.iloc[first_row:last_row]
+
+
+def merge_dataframes(stored_dataframe: pd.DataFrame, new_dataframe: pd.DataFrame) -> pd.DataFrame:
+    """
+    Combine new rows with stored rows. Where both contain the same time, the new row is kept.
+    """
+    merged_dataframe = pd.concat([stored_dataframe, new_dataframe])
+    merged_dataframe = merged_dataframe[~merged_dataframe.index.duplicated(keep='last')]
+
+    return merged_dataframe.sort_index()
+
+
+def dataframe_to_arrays(dataframe: pd.DataFrame, start=None, end=None) -> Dict[str, np.ndarray]:
+    """
+    Convert the rows of a dataframe between start and end (inclusive) into the arrays returned by StorageFormatADT.read_arrays()
+    """
+    index = pd.DatetimeIndex(dataframe.index)
+
+    timestamps = index.values.astype('datetime64[ns]').view('int64')
+    first_row, last_row = find_rows(timestamps, start, end, _index_timezone(index))
+
+    arrays = {'timestamps': timestamps[first_row:last_row]}
+    for column in dataframe.columns:
+        arrays[str(column)] = dataframe[column].to_numpy()[first_row:last_row]
+
+    return arrays
+
+
+class CsvStorageFormat(StorageFormatADT):
+    """
+    Plain text storage. This is slow to parse, but is useful for exporting data to be viewed by other programs.
+    """
+
+    extension = 'csv'
+
+    def write(self, directory: str, name: str, dataframe: pd.DataFrame):
+        os.makedirs(directory, exist_ok=True)
+        dataframe.to_csv(self.path(directory, name))
+
+    def read(self, directory: str, name: str, columns: Sequence[str] = None) -> pd.DataFrame:
+        usecols = None
+        if columns is not None:
+            # the index column must always be read so that the dates can be parsed
+            with open(self.path(directory, name), 'r') as f:
+                index_name = f.readline().split(',')[0].strip()
+            usecols = [index_name] + [column for column in columns if column != index_name]
+
+        return pd.read_csv(self.path(directory, name), index_col=0, parse_dates=True, usecols=usecols)
+
+    def read_timezone(self, directory: str, name: str) -> str:
+        """
+        CSV files only hold UTC offsets rather than timezone names, so timezone aware dataframes are given as UTC
+        """
+        with open(self.path(directory, name), 'r') as f:
+            f.readline()
+            first_row = f.readline()
+
+        if not first_row.strip():
+            return None
+        return 'UTC' if pd.Timestamp(first_row.split(',')[0]).tzinfo is not None else None
+
+
+class NpyStorageFormat(StorageFormatADT):
+    """
+    Columnar binary storage which only requires numpy.
+
+    Each dataframe is stored as a directory containing one .npy file per column, an int64 file holding the index as nanoseconds since the
+    epoch, and a small json file describing the column names, index name and timezone. Loading a subset of columns only reads those files.
+    """
+
+    extension = 'npyd'
+
+    INDEX_FILE = 'index.npy'
+    META_FILE = 'meta.json'
+
+    def __init__(self, mmap: bool = False, float_dtype=None):
+        """
+        :param mmap: Whether or not to memory map the stored files instead of reading them into memory. See MemmapStorageFormat.
+        :param float_dtype: dtype which floating point columns are converted to when written e.g. np.float32 to halve their size. They
+        are written unchanged by default.
+        """
+        self.mmap = mmap
+        self.float_dtype = float_dtype
+
+    def write(self, directory: str, name: str, dataframe: pd.DataFrame):
+        path = self.path(directory, name)
+
+        # write to a temporary directory first so that readers never see a partially written dataframe
+        temp_path = f'{path}.tmp'
+        if os.path.isdir(temp_path):
+            shutil.rmtree(temp_path)
+        os.makedirs(temp_path)
+
+        index = pd.DatetimeIndex(dataframe.index)
+        timezone = str(index.tz) if index.tz is not None else None
+
+        # tz aware indexes give their values in UTC
+        np.save(os.path.join(temp_path, self.INDEX_FILE), index.values.astype('datetime64[ns]').view('int64'))
+
+        column_files = {}
+        for column_num, column in enumerate(dataframe.columns):
+            column_file = f'col{column_num}.npy'
+            values = dataframe[column].to_numpy()
+            if self.float_dtype is not None and np.issubdtype(values.dtype, np.floating):
+                values = values.astype(self.float_dtype)
+            np.save(os.path.join(temp_path, column_file), values)
+            column_files[str(column)] = column_file
+
+        with open(os.path.join(temp_path, self.META_FILE), 'w') as f:
+            json.dump({'index_name': index.name, 'timezone': timezone, 'columns': column_files}, f)
+
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.replace(temp_path, path)
+
+    def read_meta(self, directory: str, name: str) -> Dict:
+        """
+        Get the column names, index name and timezone of a stored dataframe without loading any of its data
+        """
+        with open(os.path.join(self.path(directory, name), self.META_FILE), 'r') as f:
+            return json.load(f)
+
+    def read_timezone(self, directory: str, name: str) -> str:
+        return self.read_meta(directory, name)['timezone']
+
+    def _load(self, path: str) -> np.ndarray:
+        return np.load(path, mmap_mode='r' if self.mmap else None)
+
+    def read(self, directory: str, name: str, columns: Sequence[str] = None) -> pd.DataFrame:
+        path = self.path(directory, name)
+        meta = self.read_meta(directory, name)
+
+        index = pd.DatetimeIndex(self._load(os.path.join(path, self.INDEX_FILE)).view('datetime64[ns]'), name=meta['index_name'])
+        if meta['timezone']:
+            index = index.tz_localize('UTC').tz_convert(meta['timezone'])
+
+        columns = [column for column in meta['columns'] if columns is None or column in columns]
+        data = {column: self._load(os.path.join(path, meta['columns'][column])) for column in columns}
+
+        return pd.DataFrame(data, index=index, columns=columns)
+
+    def read_arrays(self, directory: str, name: str, start=None, end=None, columns: Sequence[str] = None) -> Dict[str, np.ndarray]:
+        path = self.path(directory, name)
+        meta = self.read_meta(directory, name)
+
+        timestamps = self._load(os.path.join(path, self.INDEX_FILE))
+        first_row, last_row = find_rows(timestamps, start, end, meta['timezone'])
+
+        # slicing a memory mapped array gives a view, so nothing outside of the range is read
+        arrays = {'timestamps': timestamps[first_row:last_row]}
+        for column, column_file in meta['columns'].items():
+            if columns is None or column in columns:
+                arrays[column] = self._load(os.path.join(path, column_file))[first_row:last_row]
+
+        return arrays
+
+
+class MemmapStorageFormat(NpyStorageFormat):
+    """
+    The same layout as NpyStorageFormat, but the stored arrays are memory mapped rather than read into memory, and prices are stored as
+    float32 by default.
+
+    read_arrays() binary searches the timestamps for the requested range and returns views of the mapped files, so only the pages which
+    are actually used are read. Processes on the same machine share these pages through the operating system's page cache instead of
+    each holding their own copy.
+    """
+
+    def __init__(self, float_dtype=np.float32):
+        super().__init__(mmap=True, float_dtype=float_dtype)
+
+
+class ParquetStorageFormat(StorageFormatADT):
+    """
+    Columnar binary storage using Apache Parquet. Requires pyarrow to be installed.
+    """
+
+    extension = 'parquet'
+
+    def __init__(self):
+        if pyarrow is None:
+            raise ImportError("pyarrow must be installed to store ticker data as parquet files")
+
+    def write(self, directory: str, name: str, dataframe: pd.DataFrame):
+        os.makedirs(directory, exist_ok=True)
+        dataframe.to_parquet(self.path(directory, name))
+
+    def read(self, directory: str, name: str, columns: Sequence[str] = None) -> pd.DataFrame:
+        return pd.read_parquet(self.path(directory, name), columns=list(columns) if columns is not None else None)
+
+
+class FeatherStorageFormat(StorageFormatADT):
+    """
+    Columnar binary storage using the Arrow IPC (feather) format. Requires pyarrow to be installed.
+
+    Feather files can't hold an index, so the index is stored as the first column.
+    """
+
+    extension = 'feather'
+
+    def __init__(self):
+        if pyarrow is None:
+            raise ImportError("pyarrow must be installed to store ticker data as feather files")
+
+    def write(self, directory: str, name: str, dataframe: pd.DataFrame):
+        os.makedirs(directory, exist_ok=True)
+        dataframe.reset_index().to_feather(self.path(directory, name))
+
+    def read(self, directory: str, name: str, columns: Sequence[str] = None) -> pd.DataFrame:
+        if columns is not None:
+            index_name = pyarrow.ipc.open_file(self.path(directory, name)).schema.names[0]
+            columns = [index_name] + [column for column in columns if column != index_name]
+
+        dataframe = pd.read_feather(self.path(directory, name), columns=columns)
+        return dataframe.set_index(dataframe.columns[0])
+
+
+class PartitionedStorageFormat(StorageFormatADT):
+    """
+    Splits every stored dataframe into one partition per year, or per month for intraday data, which are each stored using another
+    storage format.
+
+    Reading a range only loads the partitions which overlap it, and appending new rows only rewrites the partitions they fall into. Since
+    new data is usually added to the end, an append normally only touches the newest partition.
+    """
+
+    extension = 'parts'
+    supports_range_reads = True
+
+    META_FILE = 'partitioning.json'
+
+    def __init__(self, partition_format='npy', granularity: str = 'auto'):
+        """
+        :param partition_format: Name of the format (see STORAGE_FORMATS) or StorageFormatADT object used to store each partition
+        :param granularity: 'year', 'month', or 'auto' to partition intraday data by month and everything else by year. This is only
+        used when a dataframe is first written. Appends keep using the granularity it was written with.
+        """
+        self.partition_format = get_storage_format(partition_format)
+        self.granularity = granularity
+
+    @staticmethod
+    def _partition_keys(index: pd.DatetimeIndex, granularity: str) -> np.ndarray:
+        """
+        Get the partition which every row belongs to e.g. '2021' or '2021-03'. Keys sort in time order.
+        """
+        # partitions follow the local calendar of the data
+        local_index = index.tz_localize(None) if index.tz is not None else index
+        return local_index.strftime('%Y' if granularity == 'year' else '%Y-%m').to_numpy()
+
+    @staticmethod
+    def _time_key(time, timezone: str, granularity: str) -> str:
+        time = pd.Timestamp(time)
+        if time.tzinfo is not None and timezone is not None:
+            time = time.tz_convert(timezone)
+        return time.strftime('%Y' if granularity == 'year' else '%Y-%m')
+
+    def _choose_granularity(self, index: pd.DatetimeIndex) -> str:
+        if self.granularity != 'auto':
+            return self.granularity
+        if len(index) > 1 and np.median(np.diff(index.values.astype('datetime64[ns]').view('int64'))) < 24 * 60 * 60 * 10 ** 9:
+            return 'month'
+        return 'year'
+
+    def read_meta(self, directory: str, name: str) -> Dict:
+        """
+        Get the granularity and timezone of a stored dataframe
+        """
+        with open(os.path.join(self.path(directory, name), self.META_FILE), 'r') as f:
+            return json.load(f)
+
+    def read_timezone(self, directory: str, name: str) -> str:
+        return self.read_meta(directory, name)['timezone']
+
+    def _write_partitions(self, path: str, dataframe: pd.DataFrame, granularity: str):
+        keys = self._partition_keys(pd.DatetimeIndex(dataframe.index), granularity)
+        if not len(keys):
+            return
+
+        # rows are sorted, so each partition is a contiguous block
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        ends = np.r_[starts[1:], len(keys)]
+        for first_row, last_row in zip(starts, ends):
+            self.partition_format.write(path, keys[first_row], dataframe.iloc[first_row:last_row])
+
+    def write(self, directory: str, name: str, dataframe: pd.DataFrame):
+        path = self.path(directory, name)
+        index = pd.DatetimeIndex(dataframe.index)
+
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.makedirs(path)
+
+        meta = {'granularity': self._choose_granularity(index), 'timezone': _index_timezone(index)}
+        with open(os.path.join(path, self.META_FILE), 'w') as f:
+            json.dump(meta, f)
+
+        self._write_partitions(path, dataframe, meta['granularity'])
+
+    def append(self, directory: str, name: str, dataframe: pd.DataFrame):
+        if not self.exists(directory, name):
+            self.write(directory, name, dataframe)
+            return
+
+        path = self.path(directory, name)
+        granularity = self.read_meta(directory, name)['granularity']
+
+        keys = self._partition_keys(pd.DatetimeIndex(dataframe.index), granularity)
+        for key in np.unique(keys):
+            new_rows = dataframe.loc[keys == key]
+            if self.partition_format.exists(path, key):
+                new_rows = merge_dataframes(self.partition_format.read(path, key), new_rows)
+            self.partition_format.write(path, key, new_rows)
+
+    def list_partitions(self, directory: str, name: str, start=None, end=None) -> List[str]:
+        """
+        Get the keys of the stored partitions which overlap the range start-end, in time order
+        """
+        meta = self.read_meta(directory, name)
+        partitions = self.partition_format.list_names(self.path(directory, name))
+
+        if start is not None:
+            start_key = self._time_key(start, meta['timezone'], meta['granularity'])
+            partitions = [key for key in partitions if key >= start_key]
+        if end is not None:
+            end_key = self._time_key(end, meta['timezone'], meta['granularity'])
+            partitions = [key for key in partitions if key <= end_key]
+
+        return partitions
+
+    def read_range(self, directory: str, name: str, start=None, end=None, columns: Sequence[str] = None) -> pd.DataFrame:
+        path = self.path(directory, name)
+        partitions = self.list_partitions(directory, name, start, end)
+
+        if not partitions:
+            # an empty dataframe with the right columns
+            all_partitions = self.partition_format.list_names(path)
+            if all_partitions:
+                return self.partition_format.read(path, all_partitions[0], columns=columns).iloc[:0]
+            return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([]))
+
+        dataframe = pd.concat([self.partition_format.read(path, key, columns=columns) for key in partitions])
+        return slice_rows(dataframe, start, end)
+
+    def read(self, directory: str, name: str, columns: Sequence[str] = None) -> pd.DataFrame:
+        return self.read_range(directory, name, columns=columns)
+
+    def read_arrays(self, directory: str, name: str, start=None, end=None, columns: Sequence[str] = None) -> Dict[str, np.ndarray]:
+        path = self.path(directory, name)
+        partition_arrays = [self.partition_format.read_arrays(path, key, start=start, end=end, columns=columns)
+                            for key in self.list_partitions(directory, name, start, end)]
+
+        if not partition_arrays:
+            return dataframe_to_arrays(self.read_range(directory, name, start, end, columns=columns))
+        if len(partition_arrays) == 1:
+            return partition_arrays[0]
+
+        return {column: np.concatenate([arrays[column] for arrays in partition_arrays]) for column in partition_arrays[0]}
+
+
+# formats which can be chosen by name
+STORAGE_FORMATS = {
+    'csv': CsvStorageFormat,
+    'npy': NpyStorageFormat,
+    'mmap': MemmapStorageFormat,
+    'partitioned': PartitionedStorageFormat,
+    'parquet': ParquetStorageFormat,
+    'feather': FeatherStorageFormat,
+}
+
+
+def get_storage_format(storage_format) -> StorageFormatADT:
+    """
+    Get a storage format object from either its name (see STORAGE_FORMATS) or an existing StorageFormatADT object
+    """
+    if isinstance(storage_format, StorageFormatADT):
+        return storage_format
+
+    if storage_format not in STORAGE_FORMATS:
+        raise ValueError(f"Unknown storage format '{storage_format}'. Valid formats are: {', '.join(STORAGE_FORMATS)}")
+
+    return STORAGE_FORMATS[storage_format]()
+
+
+def migrate_ticker_directory(ticker_directory: str, source_format='csv', target_format='npy', remove_source: bool = False) -> List[str]:
+    """
+    Convert every dataframe stored in a ticker directory from one storage format to another
+
+    :param ticker_directory: Directory containing the stored ticker data e.g. stored_data/tickers
+    :param source_format: Name or object of the format the data is currently stored in
+    :param target_format: Name or object of the format the data should be converted to
+    :param remove_source: Whether or not to delete the old files once they have been converted
+    :return: Names of all dataframes which were converted
+    """
+    source_format = get_storage_format(source_format)
+    target_format = get_storage_format(target_format)
+
+    migrated = []
+    for name in source_format.list_names(ticker_directory):
+        target_format.write(ticker_directory, name, source_format.read(ticker_directory, name))
+        if remove_source:
+            source_format.delete(ticker_directory, name)
+        migrated.append(name)
+
+    return migrated
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert stored ticker data from one storage format to another")
+    parser.add_argument('ticker_directory', nargs='?', default=os.path.join('stored_data', 'tickers'))
+    parser.add_argument('--source', default='csv', choices=STORAGE_FORMATS.keys())
+    parser.add_argument('--target', default='npy', choices=STORAGE_FORMATS.keys())
+    parser.add_argument('--remove-source', action='store_true', help="Delete the old files after they are converted")
+    args = parser.parse_args()
+
+    for migrated_name in migrate_ticker_directory(args.ticker_directory, args.source, args.target, args.remove_source):
+        print(f'migrated {migrated_name}')
@@ -0,0 +1,374 @@
+__author__ = "Ethan Posner"
+__copyright__ = ""
+__credits__ = []
+__license__ = ""
+__version__ = "0,1dev"
+__maintainer__ = "Ethan Posner"
+__status__ = "Production"
+
+import math
+from abc import ABC, abstractmethod
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+import indicators
+
+
+class StreamingIndicatorADT(ABC):
+    """
+    Indicator which is updated one bar at a time in constant time and memory, instead of being recomputed over the whole history.
+
+    Indicators can be seeded with existing history (e.g. from a Ticker) and then updated as new bars arrive. After any number of updates,
+    value matches the last point of the equivalent batch indicator in the indicators module, up to floating point error.
+
+    Missing (NaN) values follow the same policy as the indicators module: windowed indicators are NaN while a NaN is in their window, and
+    recursive (smoothed) indicators are NaN at a NaN but otherwise skip it, continuing from their last value. Indicators of changes (RSI)
+    also skip the change into and out of a NaN, since it is missing too.
+    """
+
+    @abstractmethod
+    def update(self, value: float) -> float:
+        """
+        Add the next value of the series
+
+        :return: The indicator's new value, or NaN if it doesn't have enough data yet
+        """
+        pass
+
+    @property
+    @abstractmethod
+    def value(self) -> float:
+        """
+        The indicator's current value, or NaN if it doesn't have enough data yet
+        """
+        pass
+
+    def seed(self, values):
+        """
+        Add a history of values at once. This is equivalent to calling update() for every value.
+        """
+        for value in np.asarray(values, dtype=np.float64):
+            self.update(value)
+
+    @classmethod
+    def from_ticker(cls, ticker: pd.DataFrame, *args, column: str = "Close", **kwargs) -> 'StreamingIndicatorADT':
+        """
+        Create an indicator seeded with a ticker's history
+
+        :param ticker: Ticker or dataframe of bars
+        :param args: Parameters of the indicator e.g. window
+        :param column: Which column the indicator follows
+        """
+        indicator = cls(*args, **kwargs)
+        indicator.seed(ticker[column].to_numpy())
+        return indicator
+
+
+class RunningMean(StreamingIndicatorADT):
+    """
+    Mean of the last window values. Matches indicators.sma(), so it is NaN while a NaN is in the window.
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self._values = deque(maxlen=window)
+        # sum of the values in the window which aren't NaN, and how many are NaN
+        self._sum = 0.0
+        self._missing = 0
+        self._updates_since_sum = 0
+
+    def update(self, value: float) -> float:
+        if len(self._values) == self.window:
+            old_value = self._values[0]
+            if math.isnan(old_value):
+                self._missing -= 1
+            else:
+                self._sum -= old_value
+
+        self._values.append(value)
+        if math.isnan(value):
+            self._missing += 1
+        else:
+            self._sum += value
+
+        # adding and subtracting builds up floating point error, so the sum is recalculated once every window (O(1) per update on average)
+        self._updates_since_sum += 1
+        if self._updates_since_sum >= self.window:
+            self._sum = math.fsum(value for value in self._values if not math.isnan(value))
+            self._updates_since_sum = 0
+
+        return self.value
+
+    @property
+    def value(self) -> float:
+        return self._sum / self.window if len(self._values) == self.window and not self._missing else math.nan
+
+    def seed(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        for value in values[-self.window:]:
+            self.update(value)
+
+
+class ExponentialSmoothing(StreamingIndicatorADT):
+    """
+    Exponential smoothing seeded with the simple average of the first period values. Matches indicators.recursive_smoothing(): NaNs are
+    skipped when smoothing, but the value is NaN right after one.
+    """
+
+    def __init__(self, alpha: float, period: int):
+        """
+        :param alpha: Weight of each new value
+        :param period: Number of values averaged for the seed
+        """
+        self.alpha = alpha
+        self.period = period
+
+        self._value = math.nan
+        # values seen before the seed, which are averaged to create it
+        self._seed_values = []
+        # whether the last value was NaN
+        self._missing = False
+
+    def update(self, value: float) -> float:
+        self._missing = math.isnan(value)
+        if self._missing:
+            return math.nan
+
+        if self._seed_values is not None:
+            self._seed_values.append(value)
+            if len(self._seed_values) == self.period:
+                self._value = math.fsum(self._seed_values) / self.period
+                self._seed_values = None
+            return self._value
+
+        self._value += self.alpha * (value - self._value)
+        return self._value
+
+    @property
+    def value(self) -> float:
+        return math.nan if self._missing else self._value
+
+    def seed(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if self._seed_values is not None and len(self._seed_values) + np.count_nonzero(~np.isnan(values)) >= self.period:
+            # smooth the whole history at once, starting from any values added before
+            smoothed = indicators.recursive_smoothing(np.r_[self._seed_values, values], self.alpha, self.period)
+            self._value = smoothed[~np.isnan(smoothed)][-1]
+            self._seed_values = None
+            self._missing = bool(np.isnan(values[-1]))
+        else:
+            super().seed(values)
+
+
+class StreamingEMA(ExponentialSmoothing):
+    """
+    Exponential moving average. Matches indicators.ema().
+    """
+
+    def __init__(self, span: int):
+        super().__init__(2 / (span + 1), span)
+
+
+class WilderSmoothing(ExponentialSmoothing):
+    """
+    Wilder's smoothing. Matches indicators.wilder_smoothing().
+    """
+
+    def __init__(self, period: int):
+        super().__init__(1 / period, period)
+
+
+class StreamingRSI(StreamingIndicatorADT):
+    """
+    Relative strength index. Matches IndicatorEngine.rsi(): the change into and out of a NaN is missing, so the RSI is NaN at a NaN and at
+    the value after it.
+    """
+
+    def __init__(self, period: int = 14):
+        self.average_gain = WilderSmoothing(period)
+        self.average_loss = WilderSmoothing(period)
+        self._previous = math.nan
+        # whether the change to the last value was missing
+        self._missing = True
+
+    def update(self, value: float) -> float:
+        self._missing = math.isnan(value) or math.isnan(self._previous)
+        if not self._missing:
+            delta = value - self._previous
+            self.average_gain.update(max(delta, 0.0))
+            self.average_loss.update(max(-delta, 0.0))
+        self._previous = value
+
+        return self.value
+
+    @property
+    def value(self) -> float:
+        if self._missing:
+            return math.nan
+
+        average_gain = self.average_gain.value
+        average_loss = self.average_loss.value
+        if math.isnan(average_gain):
+            return math.nan
+        if average_gain + average_loss == 0:
+            return 50.0
+        return 100 * average_gain / (average_gain + average_loss)
+
+    def seed(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+
+        # np.maximum keeps the NaN changes next to missing values, which the smoothing skips
+        deltas = np.diff(np.r_[self._previous, values])
+        self.average_gain.seed(np.maximum(deltas, 0))
+        self.average_loss.seed(np.maximum(-deltas, 0))
+        self._previous = values[-1]
+        self._missing = bool(np.isnan(deltas[-1]))
+
+
+class _RollingExtreme(StreamingIndicatorADT):
+    """
+    Largest or smallest of the last window values, using a monotonic deque. Each value is added and removed once, so updates take O(1)
+    time on average. Like the windowed indicators, it is NaN while a NaN is in the window.
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        # format: (position, value). Values only decrease (or increase for minimums) from front to back, and the front is the extreme.
+        self._candidates = deque()
+        self._count = 0
+        # position of the last NaN
+        self._last_missing = -window - 1
+
+    @staticmethod
+    @abstractmethod
+    def _replaces(new_value: float, old_value: float) -> bool:
+        # whether a new value means an older value can never be the extreme again
+        pass
+
+    def update(self, value: float) -> float:
+        if math.isnan(value):
+            self._last_missing = self._count
+        else:
+            while self._candidates and self._replaces(value, self._candidates[-1][1]):
+                self._candidates.pop()
+            self._candidates.append((self._count, value))
+        self._count += 1
+
+        # drop the extreme once it leaves the window
+        if self._candidates and self._candidates[0][0] <= self._count - 1 - self.window:
+            self._candidates.popleft()
+
+        return self.value
+
+    @property
+    def value(self) -> float:
+        if self._count < self.window or self._last_missing > self._count - 1 - self.window:
+            return math.nan
+        return self._candidates[0][1]
+
+    def seed(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) >= self.window:
+            # only the last window values can affect the result, but the count must include everything
+            self._count += len(values) - self.window
+            self._candidates.clear()
+            values = values[-self.window:]
+
+        for value in values:
+            self.update(value)
+
+
+class RollingMax(_RollingExtreme):
+    """
+    Largest of the last window values
+    """
+
+    @staticmethod
+    def _replaces(new_value: float, old_value: float) -> bool:
+        return new_value >= old_value
+
+
+class RollingMin(_RollingExtreme):
+    """
+    Smallest of the last window values
+    """
+
+    @staticmethod
+    def _replaces(new_value: float, old_value: float) -> bool:
+        return new_value <= old_value
+
+
+class RollingVariance(StreamingIndicatorADT):
+    """
+    Variance of the last window values, updated with Welford's method so that it stays accurate over long series. Uses the population
+    variance by default, which matches indicators.rolling_std() squared, so it is NaN while a NaN is in the window.
+    """
+
+    def __init__(self, window: int, ddof: int = 0):
+        """
+        :param ddof: 0 for the population variance, 1 for the sample variance
+        """
+        self.window = window
+        self.ddof = ddof
+
+        self._values = deque(maxlen=window)
+        # mean and sum of squared differences from the mean of the values in the window which aren't NaN, and how many there are
+        self._mean = 0.0
+        self._squared_deviations = 0.0
+        self._valid = 0
+
+    def _add(self, value: float):
+        self._valid += 1
+        delta = value - self._mean
+        self._mean += delta / self._valid
+        self._squared_deviations += delta * (value - self._mean)
+
+    def _remove(self, value: float):
+        self._valid -= 1
+        if not self._valid:
+            self._mean = self._squared_deviations = 0.0
+            return
+        delta = value - self._mean
+        self._mean -= delta / self._valid
+        self._squared_deviations -= delta * (value - self._mean)
+
+    def update(self, value: float) -> float:
+        old_value = self._values[0] if len(self._values) == self.window else math.nan
+
+        if self._valid == self.window and not math.isnan(value):
+            # replace the oldest value with the new one
+            old_mean = self._mean
+            self._mean += (value - old_value) / self.window
+            self._squared_deviations += (value - old_value) * (value - self._mean + old_value - old_mean)
+        else:
+            if not math.isnan(old_value):
+                self._remove(old_value)
+            if not math.isnan(value):
+                self._add(value)
+
+        self._values.append(value)
+        return self.value
+
+    @property
+    def value(self) -> float:
+        if self._valid < self.window:
+            return math.nan
+        return max(self._squared_deviations, 0.0) / (self.window - self.ddof)
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.value)
+
+    def seed(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = np.r_[list(self._values), values][-self.window:]
+        valid_values = values[~np.isnan(values)]
+
+        self._values = deque(values, maxlen=self.window)
+        self._valid = len(valid_values)
+        self._mean = valid_values.mean() if len(valid_values) else 0.0
+        self._squared_deviations = float(((valid_values - self._mean) ** 2).sum())
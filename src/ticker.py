@@ -7,44 +7,217 @@ __maintainer__ = "Ethan Posner"
 __status__ = "Production"
 
 import datetime
+import threading
+from typing import Dict, Iterable, List
 
 import numpy as np
 import pandas as pd
 
 import data_provider
+import indicators
+import trend_vertices
+import trends
 
 
-class Ticker(pd.DataFrame):
+# created when the first Ticker without its own provider is loaded, and shared by every such Ticker after that
+_default_provider: data_provider.StockDataProvider = None
+_default_provider_lock = threading.Lock()
+
+
+def default_provider() -> data_provider.StockDataProvider:
+    """
+    Get the provider used by Tickers which aren't given one
+    """
+    global _default_provider
+    with _default_provider_lock:
+        if _default_provider is None:
+            _default_provider = data_provider.StockDataProvider()
+        return _default_provider
+
+
+class TickerBatch:
+    """
+    Tickers which are loaded together. When the first of them is accessed, every ticker in the batch which hasn't been loaded yet is
+    retrieved with a single StockDataProvider.get_tickers() call.
+    """
+
+    def __init__(self, provider: data_provider.StockDataProvider = None, start=None, end=None, interval: str = '1d', columns=None,
+                 **kwargs):
+        r"""
+        :param provider: Where the tickers' data is retrieved from. Default: default_provider()
+        :param start: start of stock data. Default: 1970-01-01
+        :param end: end of stock data. Default: now
+        :param interval: Resolution of the data. Default: '1d'
+        :param columns: Only load these columns. All columns are loaded by default.
+        :param \**kwargs: Passed to StockDataProvider.get_tickers() e.g. max_workers
+        """
+        self.provider = provider
+        self.start = start
+        self.end = end
+        self.interval = interval
+        self.columns = columns
+        self.fetch_options = kwargs
+
+        self.tickers: List['Ticker'] = []
+        self._lock = threading.Lock()
+
+    def add(self, ticker: 'Ticker'):
+        self.tickers.append(ticker)
+
+    def load(self):
+        """
+        Retrieve the data for every ticker in the batch which hasn't been loaded yet
+        """
+        with self._lock:
+            pending = [ticker for ticker in self.tickers if not ticker.loaded]
+            if not pending:
+                return
+
+            provider = self.provider if self.provider is not None else default_provider()
+            result = provider.get_tickers([ticker.symbol for ticker in pending], start=self.start, end=self.end, interval=self.interval,
+                                          columns=self.columns, **self.fetch_options)
+
+            for ticker in pending:
+                if ticker.symbol in result:
+                    ticker._data = result[ticker.symbol]
+                else:
+                    ticker._error = result.failures.get(ticker.symbol, LookupError(f"No data was returned for {ticker.symbol}"))
+
+
+class Ticker:
     """
     Represents a stock market ticker. Holds data
+
+    Nothing is loaded when a Ticker is created. The first time its data is accessed, only the requested columns and range are retrieved
+    through a StockDataProvider. Tickers created together with Ticker.batch() are all retrieved at once when the first of them is accessed.
+
+    Attributes and items which aren't defined here come from the loaded dataframe, so a Ticker can be used like one e.g. ticker.Close,
+    ticker['Open'], ticker.index.
     """
 
-    def __init__(self, symbol, start=None, end=None):
+    def __init__(self, symbol, start=None, end=None, interval: str = '1d', columns=None,
+                 provider: data_provider.StockDataProvider = None, batch: TickerBatch = None):
+        """
+        :param symbol: A stock ticker e.g. 'MSFT'
+        :param start: start of stock data. Default: 1970-01-01
+        :param end: end of stock data. Default: now
+        :param interval: Resolution of the data. Default: '1d'
+        :param columns: Only load these columns (e.g. ['Close', 'Volume']). All columns are loaded by default.
+        :param provider: Where the data is retrieved from. Default: default_provider()
+        :param batch: Batch to load this ticker with. The batch's range, interval and columns are used instead of the ones given here.
+        """
+        self.symbol = symbol.upper()
+        self.start = start
+        self.end = end
+        self.interval = interval
+        self.columns = columns
+        self.provider = provider
+
+        self._batch = batch
+        self._data: pd.DataFrame = None
+        self._error: Exception = None
+
+        if batch is not None:
+            self.start, self.end, self.interval, self.columns = batch.start, batch.end, batch.interval, batch.columns
+            batch.add(self)
+
+    @classmethod
+    def batch(cls, symbols: Iterable[str], start=None, end=None, interval: str = '1d', columns=None,
+              provider: data_provider.StockDataProvider = None, **kwargs) -> List['Ticker']:
+        r"""
+        Create tickers for many symbols which are all retrieved at once when the first of them is accessed. See TickerBatch
+
+        :param \**kwargs: Passed to StockDataProvider.get_tickers() e.g. max_workers
+        """
+        ticker_batch = TickerBatch(provider, start=start, end=end, interval=interval, columns=columns, **kwargs)
+        return [cls(symbol, provider=provider, batch=ticker_batch) for symbol in symbols]
+
+    @property
+    def loaded(self) -> bool:
+        """
+        Whether or not this ticker's data has been retrieved
+        """
+        return self._data is not None
+
+    def load(self) -> 'Ticker':
+        """
+        Retrieve this ticker's data now instead of waiting for it to be accessed
+        """
+        if self._data is None:
+            if self._batch is not None:
+                self._batch.load()
+            else:
+                provider = self.provider if self.provider is not None else default_provider()
+                self._data = provider.get_ticker(self.symbol, start=self.start, end=self.end, interval=self.interval, columns=self.columns)
+
+        if self._data is None:
+            raise self._error
+
+        return self
 
-        # update to latest stock data if it is older than 5 minutes
-        stock_data_provider = data_provider.StockDataProvider(tolerance=60 * 60 * 24)
+    @property
+    def data(self) -> pd.DataFrame:
+        """
+        This ticker's data, which is retrieved the first time it is accessed. It may be shared with the provider's cache, so it shouldn't
+        be modified.
+        """
+        return self.load()._data
 
-        yfinance_ticker_data = stock_data_provider.get_ticker(symbol)
+    def __getattr__(self, name):
+        # only called for attributes which aren't defined on Ticker, which are looked up on the data instead
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.data, name)
 
-        if start and end:
-            mask = (yfinance_ticker_data.index >= start) & (yfinance_ticker_data.index <= end)
-            yfinance_ticker_data = yfinance_ticker_data.loc[mask]
-        elif start:
-            mask = (yfinance_ticker_data.index >= start)
-            yfinance_ticker_data = yfinance_ticker_data.loc[mask]
-        elif end:
-            mask = yfinance_ticker_data.index <= end
-            yfinance_ticker_data = yfinance_ticker_data.loc[mask]
+    def __getitem__(self, key):
+        return self.data[key]
 
-        super().__init__(yfinance_ticker_data)
+    def __len__(self) -> int:
+        return len(self.data)
 
-        self.symbol = symbol
+    def __repr__(self) -> str:
+        return f'Ticker({self.symbol}, {self.interval}, {"loaded" if self.loaded else "not loaded"})'
 
     def update_data(self):
         """
-        Update this ticker for the latest available data
+        Update this ticker for the latest available data. It is retrieved again the next time it is accessed.
+        """
+        self._data = None
+        self._error = None
+        self._batch = None
+
+    def indicators(self, *indicator_names) -> Dict[str, np.ndarray]:
+        """
+        Compute rolling indicators over this ticker's whole history. See indicators.IndicatorEngine.compute()
+
+        :param indicator_names: e.g. 'rsi', ('sma', 50), ('macd', 12, 26, 9)
+        :return: Arrays aligned to this ticker's index
+        """
+        return indicators.IndicatorEngine.from_dataframe(self.data).compute(*indicator_names)
+
+    def rolling_trends(self, windows: Iterable[int] = (20,)) -> Dict[int, Dict[str, np.ndarray]]:
+        """
+        Fit a least squares trend line to every window of close prices, for several window lengths. See trends.rolling_trends()
+
+        :param windows: Lengths of the windows in bars
+        :return: window: slope, intercept and r_squared arrays aligned to this ticker's index
+        """
+        return trends.rolling_trends(self.Close.to_numpy(), windows)
+
+    def trend_vertices(self, factors: Dict[str, float] = None) -> Dict[str, Dict[str, np.ndarray]]:
+        """
+        Find the vertices of the minor, secondary and primary trends in the close prices, and the trends between them.
+        See trend_vertices.find_multi_scale_vertices()
+
+        :param factors: scale: percent reversal which ends a trend at that scale. Default: the factors in alg_conf.json
+        :return: scale: vertices: indices of the vertices in this ticker, and the arrays from trend_vertices.trend_segments()
         """
-        pass
+        close = self.Close.to_numpy()
+        results = {}
+        for scale, vertices in trend_vertices.find_multi_scale_vertices(close, factors).items():
+            results[scale] = {'vertices': vertices, **trend_vertices.trend_segments(close, vertices)}
+
+        return results
 
     def slope_at_point(self, point: int) -> float:
         """
@@ -52,57 +225,61 @@ class Ticker(pd.DataFrame):
         :param point: The point at which the slope will be calculated
         :return: Slope of graph at given point
         """
-        graph = self.Close.to_array()
+        graph = self.Close.to_numpy()
 
         return graph[point + 1] - graph[point]
 
-    def moving_avg(self, start=None, end=None) -> float:
-
+    def _close_between(self, start=None, end=None) -> pd.Series:
         if not start:
             start = self.index[0]
         if not end:
             end = self.index[-1]
 
         mask = (self.Close.index >= start) & (self.Close.index <= end)
-        graph = self.Close.loc[mask]
+        return self.Close.loc[mask]
 
-        avg_slope_val: float
-        graph_len: int = len(graph)
+    def moving_avg(self, start=None, end=None) -> float:
 
-        # find the average slope of the graph
-        avg_slope_val = sum([graph[x_val + 1] - graph[x_val] for x_val in range(0, graph_len - 1)]) / graph_len
+        graph = self._close_between(start, end)
 
-        return avg_slope_val
+        return average_slope(graph.to_numpy())
 
     def moving_avg_line(self, start: datetime.datetime = None, end: datetime.datetime = None) -> pd.Series:
 
-        if not start:
-            start = self.index[0]
-        if not end:
-            end = self.index[-1]
+        graph = self._close_between(start, end)
 
-        mask = (self.Close.index >= start) & (self.Close.index <= end)
-        graph = self.Close.loc[mask]
+        return pd.Series(average_slope_line(graph.to_numpy()), index=graph.keys(), name='Moving Avg')
+
+
+def average_slope(graph: np.ndarray) -> float:
+    """
+    Find the average slope of a graph, which is the sum of the differences between consecutive points divided by the number of points
+
+    :param graph: Values of the graph e.g. close prices
+    """
+    return np.diff(graph).sum() / len(graph)
 
-        tan_line_vals: np.array = np.empty(len(graph))
 
-        avg_slope_val: float
-        graph_len: int = len(graph)
+def average_slope_line(graph: np.ndarray) -> np.ndarray:
+    """
+    Find a line with the average slope of a graph (see average_slope()), placed so that its middle is at the average height of the graph
 
-        # find the average slope of the graph
-        avg_slope_val = sum([graph[x_val + 1] - graph[x_val] for x_val in range(0, graph_len - 1)]) / graph_len
+    :param graph: Values of the graph e.g. close prices
+    :return: Value of the line at every point of the graph
+    """
+    graph_len: int = len(graph)
 
-        # find the best y-intercept so that the middle of the equation is at the average height of the graph
-        avg_height: float = graph.to_numpy().sum() / graph_len
+    # find the average slope of the graph
+    avg_slope_val: float = average_slope(graph)
 
-        # find what the height of this tangent line should be in the middle
-        middle_height = avg_slope_val * (graph_len / 2)
+    # find the best y-intercept so that the middle of the equation is at the average height of the graph
+    avg_height: float = graph.sum() / graph_len
 
-        # find how high up the tangent line should start
-        y_int = avg_height - middle_height
+    # find what the height of this tangent line should be in the middle
+    middle_height = avg_slope_val * (graph_len / 2)
 
-        for x_val in range(graph_len):
-            # tangent line: y = mx + b
-            tan_line_vals[x_val] = avg_slope_val * x_val + y_int
+    # find how high up the tangent line should start
+    y_int = avg_height - middle_height
 
-        return pd.Series(tan_line_vals, index=graph.keys(), name='Moving Avg')
+    # tangent line: y = mx + b
+    return avg_slope_val * np.arange(graph_len) + y_int
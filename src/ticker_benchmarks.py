@@ -0,0 +1,103 @@
+__author__ = "Ethan Posner"
+__copyright__ = ""
+__credits__ = []
+__license__ = ""
+__version__ = "0,1dev"
+__maintainer__ = "Ethan Posner"
+__status__ = "Production"
+
+import argparse
+import time
+from typing import Callable, Tuple
+
+import numpy as np
+import pandas as pd
+
+import ticker
+
+
+def loop_average_slope(graph: pd.Series) -> float:
+    """
+    The original Python loop implementation of ticker.average_slope(), kept for comparison
+    """
+    graph_len: int = len(graph)
+
+    return sum([graph.iloc[x_val + 1] - graph.iloc[x_val] for x_val in range(0, graph_len - 1)]) / graph_len
+
+
+def loop_average_slope_line(graph: pd.Series) -> np.ndarray:
+    """
+    The original Python loop implementation of ticker.average_slope_line(), kept for comparison
+    """
+    tan_line_vals: np.array = np.empty(len(graph))
+    graph_len: int = len(graph)
+
+    avg_slope_val = loop_average_slope(graph)
+    avg_height: float = graph.to_numpy().sum() / graph_len
+    middle_height = avg_slope_val * (graph_len / 2)
+    y_int = avg_height - middle_height
+
+    for x_val in range(0, graph_len):
+        tan_line_vals[x_val] = avg_slope_val * x_val + y_int
+
+    return tan_line_vals
+
+
+def random_walk(points: int, seed: int = 0) -> pd.Series:
+    """
+    Generate a close price series which looks like 1 minute bars
+    """
+    rng = np.random.default_rng(seed)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, points)))
+    index = pd.date_range("2000-01-03 09:30", periods=points, freq="min", name="Datetime")
+    return pd.Series(prices, index=index, name="Close")
+
+
+def time_call(function: Callable, *args) -> Tuple[float, object]:
+    """
+    :return: (seconds taken, what the function returned)
+    """
+    start_time = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start_time, result
+
+
+def run_benchmarks(min_exponent: int = 4, max_exponent: int = 7, max_loop_points: int = 10 ** 6):
+    """
+    Compare the loop and vectorized implementations of the average slope and average slope line on series of 10^min_exponent to
+    10^max_exponent points, and check that they give the same results
+
+    :param max_loop_points: The loop implementations are skipped on longer series, since they take minutes
+    """
+    print(f"{'points':>10} {'function':>20} {'loop (s)':>10} {'numpy (s)':>10} {'speedup':>10}")
+
+    for exponent in range(min_exponent, max_exponent + 1):
+        graph = random_walk(10 ** exponent)
+        values = graph.to_numpy()
+
+        implementations = [
+            ("average_slope", loop_average_slope, ticker.average_slope),
+            ("average_slope_line", loop_average_slope_line, ticker.average_slope_line),
+        ]
+        for name, loop_function, vectorized_function in implementations:
+            vectorized_time, vectorized_result = time_call(vectorized_function, values)
+
+            if len(graph) > max_loop_points:
+                print(f"{len(graph):>10} {name:>20} {'skipped':>10} {vectorized_time:>10.4f} {'':>10}")
+                continue
+
+            loop_time, loop_result = time_call(loop_function, graph)
+            if not np.allclose(loop_result, vectorized_result, rtol=1e-9, atol=1e-9):
+                raise AssertionError(f"{name} results differ on {len(graph)} points")
+
+            print(f"{len(graph):>10} {name:>20} {loop_time:>10.4f} {vectorized_time:>10.4f} {loop_time / vectorized_time:>9.0f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Ticker moving average functions")
+    parser.add_argument("--min-exponent", type=int, default=4, help="Shortest series has 10^min-exponent points")
+    parser.add_argument("--max-exponent", type=int, default=7, help="Longest series has 10^max-exponent points")
+    parser.add_argument("--max-loop-points", type=int, default=10 ** 6, help="Skip the loop implementations on longer series")
+    args = parser.parse_args()
+
+    run_benchmarks(args.min_exponent, args.max_exponent, args.max_loop_points)
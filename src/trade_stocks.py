@@ -13,6 +13,11 @@ import traceback
 
 import alpaca_trade_api
 
+import simulation
+
+# positions smaller than this many stocks are treated as empty
+POSITION_TOLERANCE = 1e-9
+
 
 class StockTraderADT(ABC):
     """
@@ -176,6 +181,8 @@ class StockOrder(StockOrderADT):
         self._status = status
         self.id: str = id
         self.price_per_share: float = None  # TODO: Figure out how to properly implement this
+        self.filled_amount: float = None  # number of stocks which were traded. Only set by simulated trading.
+        self.commission: float = 0.0
 
         self.trade_api: any = trade_api
 
@@ -204,7 +211,8 @@ class StockOrder(StockOrderADT):
         """
         Attempt to cancel this order. If it cannot be cancelled (e.g. it has already been filled), an UncancellableOrderException will be raised.
         """
-        self.status = self.status()
+        # request the current status, since the order may have been filled since it was last checked
+        self._status = self.status
 
         if self._status == 'filled':
             raise UncancellableOrderException("Order has already been filled")
@@ -389,25 +397,149 @@ class SimulatedTrader(StockTraderADT):
         - The simulated trading algorithm should be executed in an environment which simulates the passage of time. For example, simulating a trading
         algorithm on 100 years of data shouldn't actually take 100 years to complete; it should be executed in a matter of minutes/seconds. For
         this to work properly, the passage of time would need to be simulated.
+
+    Time is kept by a simulation.SimulatedClock, which only moves when the scheduler runs events (see backtest.BacktestEngine). A new order is
+    sent to the market after the latency model's delay, and is then filled at the next price given for its symbol through update_price(),
+    adjusted by the slippage model. Orders which can't be afforded, or which sell more than is owned, are rejected when they would be filled.
     """
 
-    def __init__(self):
-        pass
+    def __init__(self, api_params: Dict[str, any] = None, cash: float = 100000.0, scheduler: simulation.EventScheduler = None,
+                 latency: simulation.LatencyModelADT = None, slippage: simulation.SlippageModelADT = None,
+                 commission: simulation.CommissionModelADT = None):
+        """
+        :param api_params: Not used, since no API is used for simulated trading
+        :param cash: Dollars available to buy stocks with at the start of the simulation
+        :param scheduler: Scheduler which orders are sent to the market through. Default: a new scheduler with its own clock
+        :param latency: Default: orders reach the market immediately, and are filled at the next price
+        :param slippage: Default: orders are filled at the market price
+        :param commission: Default: no commission
+        """
+        self.cash = cash
+        self.scheduler = scheduler if scheduler is not None else simulation.EventScheduler()
+        self.latency = latency if latency is not None else simulation.FixedLatency()
+        self.slippage = slippage if slippage is not None else simulation.NoSlippage()
+        self.commission = commission if commission is not None else simulation.NoCommission()
+
+        self.orders: List[StockOrder] = []
+        self.positions: Dict[str, StockPosition] = {}
+
+        # format: "ticker_str": latest market price
+        self.prices: Dict[str, float] = {}
+
+        # format: "ticker_str": orders which have reached the market and are waiting for the next price
+        self._pending: Dict[str, List[StockOrder]] = {}
+
+    @property
+    def clock(self) -> simulation.SimulatedClock:
+        return self.scheduler.clock
+
+    @property
+    def equity(self) -> float:
+        """
+        Cash plus the value of every position at the latest prices
+        """
+        return self.cash + sum(position._amount * self.prices[symbol] for symbol, position in self.positions.items())
+
+    def _submit(self, side: str, symbol: str, amount: float, notional: bool) -> bool:
+        if amount <= 0:
+            return False
+
+        order = StockOrder(side=side, symbol=symbol, amount=amount, notional=notional, status='new', id=str(len(self.orders)))
+        order.time['created_at'] = self.clock.datetime
+        self.orders.append(order)
+
+        self.scheduler.schedule_after(self.latency.delay(order), self._accept, order)
+        return True
+
+    def _accept(self, order: 'StockOrder'):
+        # the order has reached the market, so it is filled at the next price for its symbol
+        if order._status != 'new':
+            return
+        order._status = 'accepted'
+        self._pending.setdefault(order.symbol, []).append(order)
+
+    def _fill(self, order: 'StockOrder', market_price: float):
+        if order._status != 'accepted':
+            return
+
+        # notional orders are filled at the market price, since their size depends on it
+        amount = order.amount / market_price if order.notional else order.amount
+        position = self.positions.get(order.symbol)
+        # selling a whole position by its value can come out a rounding error above the amount owned
+        if order.side == 'sell' and position is not None and 0 < amount - position._amount < POSITION_TOLERANCE:
+            amount = position._amount
+        price = self.slippage.fill_price(order.side, market_price, amount)
+        commission = self.commission.commission(amount, price)
+
+        if order.side == 'buy':
+            if amount * price + commission > self.cash:
+                order._status = 'rejected'
+                return
+            self.cash -= amount * price + commission
+            if position is None:
+                position = self.positions[order.symbol] = StockPosition(order.symbol)
+            position.add_stock(amount)
+        else:
+            if position is None or amount > position._amount:
+                order._status = 'rejected'
+                return
+            self.cash += amount * price - commission
+            position.remove_stock(amount)
+            # notional sells leave rounding errors behind, so tiny positions are treated as closed
+            if abs(position._amount) < POSITION_TOLERANCE:
+                del self.positions[order.symbol]
+
+        order._status = 'filled'
+        order.price_per_share = price
+        order.filled_amount = amount
+        order.commission = commission
+        order.time['filled_at'] = self.clock.datetime
+
+        if order.symbol in self.positions:
+            position._value = position._amount * market_price
+
+    def update_price(self, symbol: str, price: float, fill: bool = True):
+        """
+        Set the market price of a stock. Orders for it which have reached the market are filled at this price.
+
+        :param fill: Whether or not waiting orders should be filled. e.g. backtest.BacktestEngine only fills at the open of each bar, and
+        updates the price to the close without filling.
+        """
+        # orders and positions are kept under upper case symbols
+        symbol = symbol.upper()
+        self.prices[symbol] = price
+
+        if fill and symbol in self._pending:
+            for order in self._pending.pop(symbol):
+                self._fill(order, price)
+
+        position = self.positions.get(symbol)
+        if position is not None:
+            position._value = position._amount * price
 
     def buy(self, symbol: str, amount: float, notional: bool = False) -> bool:
         symbol = symbol.upper()
-        pass
+        return self._submit('buy', symbol, amount, notional)
 
     def sell(self, symbol: str, amount: float, notional: bool = False) -> bool:
         symbol = symbol.upper()
-        pass
+        return self._submit('sell', symbol, amount, notional)
 
-    def get_symbol_orders(self, symbol: str):
+    def get_symbol_orders(self, symbol: str) -> List[StockOrder]:
         symbol = symbol.upper()
-        pass
+        return [order for order in self.orders if order.symbol == symbol]
 
-    def get_orders(self):
-        pass
+    def get_orders(self) -> List[StockOrder]:
+        return self.orders
+
+    def get_symbol_position(self, symbol: str) -> StockPosition:
+        symbol = symbol.upper()
+        if symbol not in self.positions:
+            raise PositionDoesNotExistException(f"No position exists for {symbol}")
+        return self.positions[symbol]
+
+    def get_positions(self) -> List[StockPosition]:
+        return list(self.positions.values())
 
 
 class StockTrader(StockTraderADT):
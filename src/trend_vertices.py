@@ -0,0 +1,332 @@
+__author__ = "Ethan Posner"
+__copyright__ = ""
+__credits__ = []
+__license__ = ""
+__version__ = "0,1dev"
+__maintainer__ = "Ethan Posner"
+__status__ = "Production"
+
+import json
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+
+# trend scales from smallest to largest, and the alg_conf.json setting which holds each one's factor
+VERTEX_FACTOR_SETTINGS = {
+    "minor": "MINOR_VERTEXT_FACTOR",
+    "secondary": "SECONDARY_VERTEXT_FACTOR",
+    "primary": "PRIMARY_VERTEXT_FACTOR",
+}
+
+
+def load_vertex_factors(conf_path: str = os.path.join(dir_path, 'alg_conf.json')) -> Dict[str, float]:
+    """
+    Load the vertex factor for every trend scale from alg_conf.json (created by setup.sh)
+
+    :return: scale: factor, ordered from the smallest scale to the largest. Factors are the percent move needed to reverse a trend.
+    """
+    with open(conf_path, 'r') as json_file:
+        alg_conf = json.load(json_file)
+
+    return {scale: float(alg_conf[setting]) for scale, setting in VERTEX_FACTOR_SETTINGS.items()}
+
+
+def turning_points(values: np.ndarray) -> np.ndarray:
+    """
+    Find every local high and low, plus the first and last points. Every trend vertex is one of these, so vertex detection only needs to
+    look at them.
+
+    :param values: Prices without NaNs
+    :return: Sorted indices of the turning points
+    """
+    if len(values) < 3:
+        return np.arange(len(values))
+
+    changes = np.diff(values)
+    moving = np.flatnonzero(changes)
+    directions = np.sign(changes[moving])
+
+    # the point where the direction changes is the extreme. Flat stretches are skipped, so the last point of a flat top or bottom is used.
+    turns = moving[1:][directions[1:] != directions[:-1]]
+
+    # turns are sorted and never include the first or last point, so they don't need np.unique()
+    return np.concatenate([[0], turns, [len(values) - 1]]).astype(np.int64)
+
+
+# when the threshold is less than this many times the average move between candidates, trends are only tens of candidates long, and the
+# plain loop is faster than searching each trend with arrays
+_LOOP_MOVES = 10
+# how many candidates the average move is measured over
+_MOVE_SAMPLE_SIZE = 10000
+# short trends are cheaper to follow value by value than with array operations, so this many values are checked in Python before the
+# search moves to arrays
+_SCAN_SIZE = 64
+# how many values the array search covers at first. It doubles in size until a reversal is found, so each trend costs O(its length)
+# array work and a few Python steps.
+_INITIAL_SEARCH_SIZE = 512
+
+
+def _first_reversal(values: np.ndarray, start: int, direction: int, threshold: float) -> Tuple[int, int]:
+    """
+    Find where a trend starting at values[start] reverses, using the running extreme of the trend
+
+    :param direction: 1 for an uptrend, -1 for a downtrend
+    :return: (position of the trend's extreme, position of the first value which is far enough past it to confirm the reversal, or None if
+    the trend hasn't reversed by the end of values)
+    """
+    size = _INITIAL_SEARCH_SIZE
+    while True:
+        end = min(start + size, len(values))
+        window = values[start:end]
+
+        if direction > 0:
+            extremes = np.maximum.accumulate(window)
+            reversals = window[1:] <= extremes[:-1] * (1 - threshold)
+        else:
+            extremes = np.minimum.accumulate(window)
+            reversals = window[1:] >= extremes[:-1] * (1 + threshold)
+
+        found = np.flatnonzero(reversals)
+        if len(found):
+            reversal = int(found[0]) + 1
+            trend = window[:reversal]
+            # argmax and argmin give the first position of the extreme, which is the vertex
+            return start + int(np.argmax(trend) if direction > 0 else np.argmin(trend)), start + reversal
+
+        if end == len(values):
+            return start + int(np.argmax(window) if direction > 0 else np.argmin(window)), None
+        size *= 2
+
+
+def _first_trend(values: np.ndarray, threshold: float) -> Tuple[int, int, int]:
+    """
+    Find where the first trend is confirmed. Until then, the highest and lowest points are both possible vertices, and the first trend is
+    the first move from one of them to a new extreme which is far enough from the other.
+
+    :return: (position of the first vertex, direction of the trend after it, position where the trend was confirmed), or None if no
+    trend is confirmed
+    """
+    size = _INITIAL_SEARCH_SIZE
+    while True:
+        end = min(size, len(values))
+        window = values[:end]
+
+        highs = np.maximum.accumulate(window)
+        lows = np.minimum.accumulate(window)
+        new_highs = window[1:] > highs[:-1]
+        new_lows = window[1:] < lows[:-1]
+        rises = new_highs & (window[1:] >= lows[:-1] * (1 + threshold))
+        falls = new_lows & (window[1:] <= highs[:-1] * (1 - threshold))
+
+        found = np.flatnonzero(rises | falls)
+        if len(found):
+            position = int(found[0]) + 1
+            if rises[position - 1]:
+                return int(np.argmin(window[:position])), 1, position
+            return int(np.argmax(window[:position])), -1, position
+
+        if end == len(values):
+            return None
+        size *= 2
+
+
+def _zigzag_loop(values: List[float], threshold: float) -> List[int]:
+    """
+    _zigzag() which follows every value in Python
+    """
+    vertices = []
+    if not values:
+        return vertices
+
+    high = low = 0
+    direction = 0
+    extreme = 0
+
+    for position in range(1, len(values)):
+        value = values[position]
+
+        if direction == 0:
+            if value > values[high]:
+                high = position
+                if value >= values[low] * (1 + threshold):
+                    vertices.append(low)
+                    direction, extreme = 1, position
+            elif value < values[low]:
+                low = position
+                if value <= values[high] * (1 - threshold):
+                    vertices.append(high)
+                    direction, extreme = -1, position
+
+        elif direction > 0:
+            if value > values[extreme]:
+                extreme = position
+            elif value <= values[extreme] * (1 - threshold):
+                vertices.append(extreme)
+                direction, extreme = -1, position
+
+        else:
+            if value < values[extreme]:
+                extreme = position
+            elif value >= values[extreme] * (1 + threshold):
+                vertices.append(extreme)
+                direction, extreme = 1, position
+
+    if direction != 0:
+        vertices.append(extreme)
+
+    return vertices
+
+
+def _uses_loop(values: np.ndarray, threshold: float) -> bool:
+    """
+    Whether _zigzag() follows values with _zigzag_loop() rather than _zigzag_search(), since its trends are too short to search with arrays
+    """
+    sample = values[:_MOVE_SAMPLE_SIZE]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        average_move = np.mean(np.abs(np.diff(sample) / sample[:-1])) if len(sample) > 1 else 0.0
+    # an undefined average move (e.g. from prices of 0) uses the loop, which handles anything
+    return not threshold >= _LOOP_MOVES * average_move
+
+
+def _zigzag(values: np.ndarray, threshold: float) -> List[int]:
+    """
+    Find the trend vertices of a sequence of prices. A vertex is confirmed once the price moves the other way by more than threshold as
+    a fraction of the vertex's price.
+
+    :return: Positions of every vertex in values. The last one is the extreme of the current trend, which may still move.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if _uses_loop(values, threshold):
+        return _zigzag_loop(values.tolist(), threshold)
+    return _zigzag_search(values, threshold)
+
+
+def _zigzag_search(values: np.ndarray, threshold: float) -> List[int]:
+    """
+    _zigzag() for long trends. They are found with running maximums or minimums over their values, and only the first few values of each
+    trend are checked in Python, so the Python work is proportional to the number of vertices rather than the number of values.
+    """
+    if len(values) < 2:
+        return []
+
+    first_trend = _first_trend(values, threshold)
+    if first_trend is None:
+        return []
+
+    first_vertex, direction, position = first_trend
+    vertices = [first_vertex]
+    value_list = values.tolist()
+    count = len(value_list)
+    down_factor, up_factor = 1 - threshold, 1 + threshold
+
+    # follow each trend value by value for its first _SCAN_SIZE values, then hand the rest of it to _first_reversal() and carry on from
+    # where it reversed
+    start = position
+    while start is not None:
+        extreme, extreme_value = start, value_list[start]
+        limit = extreme_value * (down_factor if direction > 0 else up_factor)
+        scan_end = start + _SCAN_SIZE
+        start = None
+
+        for position in range(extreme + 1, count):
+            if position == scan_end:
+                # the running extreme from the trend's extreme so far is the same as from its start
+                extreme, start = _first_reversal(values, extreme, direction, threshold)
+                if start is not None:
+                    vertices.append(extreme)
+                    direction = -direction
+                break
+
+            value = value_list[position]
+            if direction > 0:
+                if value > extreme_value:
+                    extreme, extreme_value, limit = position, value, value * down_factor
+                elif value <= limit:
+                    vertices.append(extreme)
+                    direction, extreme, extreme_value, limit = -1, position, value, value * up_factor
+                    scan_end = position + _SCAN_SIZE
+            else:
+                if value < extreme_value:
+                    extreme, extreme_value, limit = position, value, value * up_factor
+                elif value >= limit:
+                    vertices.append(extreme)
+                    direction, extreme, extreme_value, limit = 1, position, value, value * down_factor
+                    scan_end = position + _SCAN_SIZE
+
+    vertices.append(extreme)
+    return vertices
+
+
+def find_vertices(values, factor: float, candidates: np.ndarray = None) -> np.ndarray:
+    """
+    Find the vertices (turning points) of the trends in a price series, where the price reversed by at least factor percent (ZigZag)
+
+    :param values: Prices. NaNs are ignored.
+    :param factor: Percent move against a trend which ends it e.g. 10 ends an uptrend once the price falls 10% from its high
+    :param candidates: Sorted indices of the only points which may be vertices. Default: turning_points() of values.
+    :return: Sorted indices of the vertices. The last one is the extreme of the current trend, which isn't confirmed yet.
+    """
+    values = np.asarray(values, dtype=np.float64)
+
+    if candidates is None:
+        valid = np.flatnonzero(~np.isnan(values))
+        candidates = valid[turning_points(values[valid])]
+    else:
+        candidates = candidates[~np.isnan(values[candidates])]
+
+    vertices = _zigzag(values[candidates], factor / 100)
+    return candidates[np.asarray(vertices, dtype=np.int64)]
+
+
+def find_multi_scale_vertices(values, factors: Dict[str, float] = None) -> Dict[str, np.ndarray]:
+    """
+    Find trend vertices at several scales. Each scale only searches the vertices of the next smaller scale (plus the first and last
+    points), so the largest scales take very little work.
+
+    :param values: Prices. NaNs are ignored.
+    :param factors: scale: factor (see find_vertices()). Default: the factors in alg_conf.json
+    :return: scale: vertex indices
+    """
+    values = np.asarray(values, dtype=np.float64)
+    factors = factors if factors is not None else load_vertex_factors()
+
+    valid = np.flatnonzero(~np.isnan(values))
+    candidates = valid[turning_points(values[valid])]
+
+    results = {}
+    # smaller factors find more vertices, so go from the smallest factor to the largest
+    for scale, factor in sorted(factors.items(), key=lambda item: item[1]):
+        results[scale] = find_vertices(values, factor, candidates)
+        if len(candidates):
+            candidates = np.unique(np.r_[candidates[0], results[scale], candidates[-1]])
+
+    return {scale: results[scale] for scale in factors}
+
+
+def trend_segments(values, vertices: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Describe the trends between consecutive vertices
+
+    :param values: Prices which the vertices were found in
+    :param vertices: Vertex indices from find_vertices()
+    :return: start, end: indices of the vertices at each end of the trend, start_value, end_value: prices at those vertices,
+    direction: 1 for uptrends and -1 for downtrends, change: fractional change in price, slope: change in price per point
+    """
+    values = np.asarray(values, dtype=np.float64)
+    starts = vertices[:-1]
+    ends = vertices[1:]
+    start_values = values[starts]
+    end_values = values[ends]
+
+    return {
+        "start": starts,
+        "end": ends,
+        "start_value": start_values,
+        "end_value": end_values,
+        "direction": np.sign(end_values - start_values).astype(np.int8),
+        "change": end_values / start_values - 1,
+        "slope": (end_values - start_values) / (ends - starts),
+    }
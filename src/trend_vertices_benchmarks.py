@@ -0,0 +1,60 @@
+__author__ = "Ethan Posner"
+__copyright__ = ""
+__credits__ = []
+__license__ = ""
+__version__ = "0,1dev"
+__maintainer__ = "Ethan Posner"
+__status__ = "Production"
+
+import argparse
+
+import trend_vertices
+from ticker_benchmarks import random_walk, time_call
+
+
+def run_benchmarks(min_exponent: int = 4, max_exponent: int = 7, factors=(0.0001, 0.1, 0.5, 2.0, 5.0, 10.0), max_loop_points: int = 10 ** 6):
+    """
+    Compare the loop implementation of vertex detection with trend_vertices._zigzag(), which searches long trends with arrays, on random
+    walks of 10^min_exponent to 10^max_exponent points, and check that they find the same vertices. Both are given the same
+    turning_points() candidates, which are timed separately. The method column shows which implementation _zigzag() chose.
+
+    :param factors: Vertex factors (percent) to test
+    :param max_loop_points: The loop implementation is skipped on longer series
+    """
+    print(f"{'points':>10} {'factor':>8} {'method':>8} {'vertices':>10} {'filter (s)':>10} {'loop (s)':>10} {'zigzag (s)':>10} "
+          f"{'speedup':>10} {'Mpoints/s':>10}")
+
+    for exponent in range(min_exponent, max_exponent + 1):
+        values = random_walk(10 ** exponent).to_numpy()
+        filter_time, candidates = time_call(trend_vertices.turning_points, values)
+        candidate_values = values[candidates]
+
+        for factor in factors:
+            method = 'loop' if trend_vertices._uses_loop(candidate_values, factor / 100) else 'search'
+            zigzag_time, vertices = time_call(trend_vertices._zigzag, candidate_values, factor / 100)
+            # throughput of the whole of find_vertices(), including the candidate filter
+            throughput = len(values) / (filter_time + zigzag_time) / 1e6
+
+            if len(values) > max_loop_points:
+                print(f"{len(values):>10} {factor:>8} {method:>8} {len(vertices):>10} {filter_time:>10.4f} {'skipped':>10} {zigzag_time:>10.4f} "
+                      f"{'':>10} {throughput:>10.1f}")
+                continue
+
+            # the loop works on a list, and converting to it is part of its cost
+            loop_time, loop_vertices = time_call(lambda: trend_vertices._zigzag_loop(candidate_values.tolist(), factor / 100))
+            if vertices != loop_vertices:
+                raise AssertionError(f"vertices differ on {len(values)} points with factor {factor}")
+
+            print(f"{len(values):>10} {factor:>8} {method:>8} {len(vertices):>10} {filter_time:>10.4f} {loop_time:>10.4f} {zigzag_time:>10.4f} "
+                  f"{loop_time / zigzag_time:>9.1f}x {throughput:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark trend vertex detection")
+    parser.add_argument("--min-exponent", type=int, default=4, help="Shortest series has 10^min-exponent points")
+    parser.add_argument("--max-exponent", type=int, default=7, help="Longest series has 10^max-exponent points")
+    parser.add_argument("--factors", type=float, nargs="+", default=[0.0001, 0.1, 0.5, 2.0, 5.0, 10.0], help="Vertex factors in percent")
+    parser.add_argument("--max-loop-points", type=int, default=10 ** 6, help="Skip the loop implementation on longer series")
+    args = parser.parse_args()
+
+    run_benchmarks(args.min_exponent, args.max_exponent, args.factors, args.max_loop_points)
@@ -0,0 +1,141 @@
+__author__ = "Ethan Posner"
+__copyright__ = ""
+__credits__ = []
+__license__ = ""
+__version__ = "0,1dev"
+__maintainer__ = "Ethan Posner"
+__status__ = "Production"
+
+from typing import Dict, Iterable
+
+import numpy as np
+
+# prefix sums are restarted every this many points. Sums over a whole long series get so large that the difference between two of them
+# loses precision, and this keeps them small without changing the result.
+DEFAULT_BLOCK_SIZE = 2 ** 16
+
+
+def _prefix_sums(values: np.ndarray) -> np.ndarray:
+    # prefix sums along the last axis with a leading 0, so that the sum of values[s:e] is sums[e] - sums[s]
+    sums = np.zeros(values.shape[:-1] + (values.shape[-1] + 1,))
+    np.cumsum(values, axis=-1, out=sums[..., 1:])
+    return sums
+
+
+def _block_sums(values: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Prefix sums of a block of values, which lines can be fit to windows of any length from
+
+    :return: offset: mean which the values were moved by, and prefix sums of count (points which aren't NaN), y, xy and yy
+    """
+    valid = ~np.isnan(values)
+
+    # moving the values to around 0 keeps the sums of squares small. This changes the intercept, which is moved back afterwards.
+    with np.errstate(invalid="ignore"):
+        offset = np.nanmean(values, axis=-1, keepdims=True)
+    offset = np.nan_to_num(offset)
+    y = np.where(valid, values - offset, 0.0)
+    x = np.arange(values.shape[-1], dtype=np.float64)
+
+    return {
+        "offset": offset,
+        "count": _prefix_sums(valid.astype(np.float64)),
+        "y": _prefix_sums(y),
+        "xy": _prefix_sums(x * y),
+        "yy": _prefix_sums(y * y),
+    }
+
+
+def _regress_block(sums: Dict[str, np.ndarray], window: int, first_end: int) -> Dict[str, np.ndarray]:
+    """
+    Fit a line to every window of a block which ends at or after first_end
+
+    :param sums: From _block_sums()
+    :param first_end: Position in the block of the last point of the first window. Must be at least window - 1.
+    :return: Arrays with one point for each window
+    """
+    ends = np.arange(first_end + 1, sums["y"].shape[-1])
+    starts = ends - window
+
+    window_counts = sums["count"][..., ends] - sums["count"][..., starts]
+    window_y = sums["y"][..., ends] - sums["y"][..., starts]
+    # x is measured from the start of each window, which means subtracting start * y from the sum of x * y
+    window_xy = sums["xy"][..., ends] - sums["xy"][..., starts] - starts * window_y
+    window_yy = sums["yy"][..., ends] - sums["yy"][..., starts]
+
+    # x is always 0 to window - 1, so its sums don't need prefix sums
+    window_x = window * (window - 1) / 2
+    x_deviations = window * (window - 1) * (window + 1) / 12
+
+    slope = (window_xy - window_x * window_y / window) / x_deviations
+    intercept = (window_y - slope * window_x) / window + sums["offset"]
+    y_deviations = window_yy - window_y ** 2 / window
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # a flat window is fit perfectly by a flat line
+        r_squared = np.where(y_deviations > 0, np.clip(slope ** 2 * x_deviations / y_deviations, 0, 1), 1.0)
+
+    complete = window_counts == window
+    return {
+        "slope": np.where(complete, slope, np.nan),
+        "intercept": np.where(complete, intercept, np.nan),
+        "r_squared": np.where(complete, r_squared, np.nan),
+    }
+
+
+def rolling_linear_regression(values, window: int, block_size: int = DEFAULT_BLOCK_SIZE) -> Dict[str, np.ndarray]:
+    """
+    Fit a least squares line to every window of values in O(n) total, using prefix sums of y, xy and y^2. x is the position of each point
+    within its window, starting at 0.
+
+    :param values: 1d array, or 2d array with one row per symbol. Lines are fit along the last axis.
+    :param window: Number of points in each window. Must be at least 2.
+    :param block_size: How many windows are fit using the same prefix sums. See DEFAULT_BLOCK_SIZE.
+    :return: slope: change in value per point, intercept: height of the line at the first point of the window, r_squared: fraction of the
+    variance of the window explained by the line. Each is an array of the same shape as values, where each point describes the window
+    ending at it. Points before the first complete window, and windows which contain a NaN, are NaN.
+    """
+    return rolling_trends(values, [window], block_size)[window]
+
+
+def rolling_trends(values, windows: Iterable[int], block_size: int = DEFAULT_BLOCK_SIZE) -> Dict[int, Dict[str, np.ndarray]]:
+    """
+    Fit rolling least squares lines for several window lengths at once. See rolling_linear_regression()
+
+    The prefix sums of each block are computed once and used for every window length, so each extra window length only costs the
+    differences of the sums.
+
+    :return: window: results for every window length
+    """
+    windows = list(dict.fromkeys(windows))
+    if any(window < 2 for window in windows):
+        raise ValueError("Lines can only be fit to windows of at least 2 points")
+    if not windows:
+        return {}
+
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    length = values.shape[-1]
+    longest = max(windows)
+
+    results = {window: {name: np.full(values.shape, np.nan) for name in ("slope", "intercept", "r_squared")} for window in windows}
+
+    # each block fits the windows ending at block_start to block_end, which need up to longest - 1 points before them too
+    for block_start in range(min(windows) - 1, length, block_size):
+        block_end = min(block_start + block_size, length)
+        history_start = max(0, block_start - longest + 1)
+        sums = _block_sums(values[..., history_start:block_end])
+
+        for window in windows:
+            first_end = max(block_start, window - 1)
+            if first_end >= block_end:
+                continue
+            for name, result in _regress_block(sums, window, first_end - history_start).items():
+                results[window][name][..., first_end:block_end] = result
+
+    return results
+
+
+def trend_line_end(results: Dict[str, np.ndarray], window: int) -> np.ndarray:
+    """
+    Find the height of each fitted line at the last point of its window, which is where the trend currently is
+    """
+    return results["intercept"] + results["slope"] * (window - 1)
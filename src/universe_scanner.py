@@ -0,0 +1,187 @@
+__author__ = "Ethan Posner"
+__copyright__ = ""
+__credits__ = []
+__license__ = ""
+__version__ = "0,1dev"
+__maintainer__ = "Ethan Posner"
+__status__ = "Production"
+
+import argparse
+import concurrent.futures
+import heapq
+import math
+import os
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import numpy as np
+
+import array_ticker
+import storage_formats
+import trends
+
+
+def trend_score(ticker: array_ticker.ArrayTicker, window: int = 50) -> float:
+    """
+    Score a ticker by its recent trend: the fractional gain of the least squares line over the last window bars, weighted by how well the
+    line fits (R^2). Steady uptrends score highest.
+
+    :return: The score, or NaN if the ticker has fewer than window bars
+    """
+    if ticker.close is None or len(ticker) < window:
+        return math.nan
+
+    close = np.asarray(ticker.close[-window:], dtype=np.float64)
+    fit = trends.rolling_linear_regression(close, window)
+    last_value = trends.trend_line_end(fit, window)[-1]
+
+    return float(fit['slope'][-1] * (window - 1) / last_value * fit['r_squared'][-1])
+
+
+class ScanProgress:
+    """
+    How far along a universe scan is. Passed to the progress callback of scan_universe() after every chunk of symbols.
+    """
+
+    def __init__(self, scanned: int, total: int, elapsed: float):
+        self.scanned = scanned
+        self.total = total
+        self.elapsed = elapsed
+
+    @property
+    def symbols_per_second(self) -> float:
+        return self.scanned / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self):
+        return f'{self.scanned}/{self.total} symbols scanned in {self.elapsed:.1f}s ({self.symbols_per_second:.0f} symbols/s)'
+
+
+class ScanResult:
+    """
+    Result of scan_universe()
+    """
+
+    def __init__(self, top: List[Tuple[str, float]], scanned: int, failures: Dict[str, str], elapsed: float):
+        # (symbol, score) of the best scoring symbols, highest first
+        self.top = top
+        self.scanned = scanned
+        # format: "ticker_str": error message for every symbol which couldn't be scored
+        self.failures = failures
+        self.elapsed = elapsed
+
+    @property
+    def symbols_per_second(self) -> float:
+        return self.scanned / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def _push_bounded(heap: List[Tuple[float, str]], item: Tuple[float, str], top_k: int):
+    # keep the top_k highest scores. The heap's smallest score is the first one to be replaced.
+    if len(heap) < top_k:
+        heapq.heappush(heap, item)
+    elif item > heap[0]:
+        heapq.heapreplace(heap, item)
+
+
+def _scan_chunk(ticker_directory: str, storage_format, ticker_symbols: List[str], interval: str, start, end,
+                score_function: Callable, top_k: int) -> Tuple[List[Tuple[float, str]], int, Dict[str, str]]:
+    """
+    Score a chunk of symbols in a worker process. Data is read straight from the ticker store (memory mapped when the format allows it)
+    instead of being sent from the parent process.
+
+    :return: (bounded heap of (score, symbol), number of symbols scored, failures)
+    """
+    storage_format = storage_formats.get_storage_format(storage_format)
+
+    heap = []
+    scanned = 0
+    failures = {}
+    for ticker_symbol in ticker_symbols:
+        try:
+            arrays = storage_format.read_arrays(ticker_directory, f'{ticker_symbol}_{interval}', start=start, end=end)
+            score = score_function(array_ticker.ArrayTicker.from_arrays(ticker_symbol, arrays, interval=interval))
+        except Exception as e:
+            failures[ticker_symbol] = repr(e)
+            continue
+
+        scanned += 1
+        if score is not None and not math.isnan(score):
+            _push_bounded(heap, (score, ticker_symbol), top_k)
+
+    return heap, scanned, failures
+
+
+def stored_symbols(ticker_directory: str, interval: str = '1d', storage_format='mmap') -> List[str]:
+    """
+    Get every symbol which has data stored at an interval
+    """
+    suffix = f'_{interval}'
+    names = storage_formats.get_storage_format(storage_format).list_names(ticker_directory)
+    return [name[:-len(suffix)] for name in names if name.endswith(suffix)]
+
+
+def scan_universe(ticker_directory: str = os.path.join('stored_data', 'tickers'), ticker_symbols: Iterable[str] = None, interval: str = '1d',
+                  start=None, end=None, score_function: Callable = trend_score, top_k: int = 20, max_workers: int = None,
+                  chunk_size: int = 64, storage_format='mmap', progress: Callable[[ScanProgress], None] = None) -> ScanResult:
+    """
+    Score every symbol in the ticker store in parallel and find the best ones.
+
+    Symbols are split into chunks which are scored by a pool of processes, so scoring isn't limited to one core by the GIL. Workers read
+    the stored data themselves, memory mapping it by default, so no dataframes are pickled between processes. Each worker only returns its
+    chunk's top_k scores, which are merged with a bounded heap.
+
+    :param ticker_directory: Directory of the ticker store, e.g. StockDataProvider.ticker_directory
+    :param ticker_symbols: Symbols to score. Default: every symbol stored at the interval
+    :param start: Only give the score function bars from this time on
+    :param end: Only give the score function bars up to this time
+    :param score_function: Takes an ArrayTicker and returns its score, or NaN to leave it out. Must be defined at the top level of a module
+    so that it can be sent to worker processes.
+    :param top_k: How many of the best scoring symbols to return
+    :param max_workers: How many processes to use. Default: one per core
+    :param chunk_size: How many symbols each task scores. Smaller chunks give more frequent progress updates.
+    :param storage_format: Format of the ticker store. The default 'mmap' reads data stored in the 'npy' format without loading it.
+    :param progress: Called with a ScanProgress after every chunk
+    """
+    ticker_symbols = [symbol.upper() for symbol in ticker_symbols] if ticker_symbols is not None else \
+        stored_symbols(ticker_directory, interval, storage_format)
+    chunks = [ticker_symbols[i:i + chunk_size] for i in range(0, len(ticker_symbols), chunk_size)]
+
+    start_time = time.monotonic()
+    heap = []
+    scanned = 0
+    failures = {}
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_scan_chunk, ticker_directory, storage_format, chunk, interval, start, end, score_function, top_k)
+                   for chunk in chunks]
+
+        for future in concurrent.futures.as_completed(futures):
+            chunk_heap, chunk_scanned, chunk_failures = future.result()
+            for item in chunk_heap:
+                _push_bounded(heap, item, top_k)
+            scanned += chunk_scanned
+            failures.update(chunk_failures)
+
+            if progress is not None:
+                progress(ScanProgress(scanned + len(failures), len(ticker_symbols), time.monotonic() - start_time))
+
+    top = [(ticker_symbol, score) for score, ticker_symbol in sorted(heap, reverse=True)]
+    return ScanResult(top, scanned, failures, time.monotonic() - start_time)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Score every stored symbol and print the best ones")
+    parser.add_argument('ticker_directory', nargs='?', default=os.path.join('stored_data', 'tickers'))
+    parser.add_argument('--interval', default='1d')
+    parser.add_argument('--start', default=None)
+    parser.add_argument('--top', type=int, default=20, help="How many symbols to print")
+    parser.add_argument('--workers', type=int, default=None, help="Number of processes. Default: one per core")
+    parser.add_argument('--storage-format', default='mmap', choices=storage_formats.STORAGE_FORMATS.keys())
+    args = parser.parse_args()
+
+    scan_result = scan_universe(args.ticker_directory, interval=args.interval, start=args.start, top_k=args.top,
+                                max_workers=args.workers, storage_format=args.storage_format, progress=print)
+
+    for rank, (top_symbol, top_score) in enumerate(scan_result.top, 1):
+        print(f'{rank:>3}. {top_symbol:<8} {top_score:.4f}')
+    for failed_symbol, message in scan_result.failures.items():
+        print(f'failed to score {failed_symbol}: {message}')
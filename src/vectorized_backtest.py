@@ -0,0 +1,356 @@
+__author__ = "Ethan Posner"
+__copyright__ = ""
+__credits__ = []
+__license__ = ""
+__version__ = "0,1dev"
+__maintainer__ = "Ethan Posner"
+__status__ = "Production"
+
+import argparse
+import time
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+import array_ticker
+import backtest
+import panel
+import simulation
+
+
+class VectorizedBacktestResult:
+    """
+    Result of backtest_signals() or backtest_panel(). Every symbol is backtested on its own, starting with the same cash.
+
+    Arrays are symbols x timestamps for panels, and have one value per bar for a single ticker.
+    """
+
+    def __init__(self, symbols: List[str], timestamps: np.ndarray, position: np.ndarray, cash: np.ndarray, equity: np.ndarray,
+                 trades: Dict[str, np.ndarray], timezone: str = None):
+        """
+        :param position: Number of stocks held after every bar
+        :param cash: Cash after every bar
+        :param equity: Cash plus the value of the position at the close of every bar
+        :param trades: See trades
+        """
+        self.symbols = symbols
+        self.timestamps = timestamps
+        self.position = position
+        self.cash = cash
+        self.equity = equity
+        # symbol: row of the symbol, entry_time, exit_time: times of the bars filled at (exit_time is -1 for trades which are still open),
+        # amount, entry_price, exit_price (the last close for open trades), commission: total for both fills, pnl: profit in dollars,
+        # return: pnl as a fraction of the entry cost
+        self.trades = trades
+        self.timezone = timezone
+
+    @property
+    def total_return(self):
+        return self.equity[..., -1] / self.equity[..., 0] - 1
+
+    @property
+    def drawdown(self) -> np.ndarray:
+        """
+        Fraction which equity is below its highest point so far after every bar
+        """
+        return 1 - self.equity / np.maximum.accumulate(self.equity, axis=-1)
+
+    @property
+    def max_drawdown(self):
+        return self.drawdown.max(axis=-1)
+
+    def trade_list(self) -> pd.DataFrame:
+        """
+        Get the trades as a dataframe with a row for every trade
+        """
+        trades = dict(self.trades)
+        trades['symbol'] = np.asarray(self.symbols, dtype=object)[trades['symbol']]
+        return pd.DataFrame(trades)
+
+    def to_series(self) -> pd.Series:
+        """
+        Get the equity curve of a single ticker as a series indexed by time
+        """
+        index = pd.DatetimeIndex(self.timestamps.view('datetime64[ns]'))
+        if self.timezone is not None:
+            index = index.tz_localize('UTC').tz_convert(self.timezone)
+        return pd.Series(self.equity, index=index, name='equity')
+
+
+def _forward_fill(values: np.ndarray) -> np.ndarray:
+    # fill NaNs with the last value before them along each row
+    return pd.DataFrame(values).ffill(axis=1).to_numpy()
+
+
+def _backtest_arrays(timestamps: np.ndarray, opens: np.ndarray, closes: np.ndarray, mask: np.ndarray, entries: np.ndarray,
+                     exits: np.ndarray, size, cash: float, slippage: simulation.SlippageModelADT,
+                     commission: simulation.CommissionModelADT) -> Dict[str, np.ndarray]:
+    """
+    Backtest symbols x timestamps arrays. Signals are only read at bars in mask, and fills only happen at bars in mask.
+    """
+    rows, columns = closes.shape
+    size = np.broadcast_to(np.asarray(size, dtype=np.float64).reshape(-1, 1) if np.ndim(size) else size, (rows, 1))
+
+    # whether a position is wanted after the close of each bar. An exit on the same bar as an entry wins.
+    wanted = np.full((rows, columns), np.nan)
+    wanted[entries & mask] = 1.0
+    wanted[exits & mask] = 0.0
+    wanted = np.nan_to_num(_forward_fill(wanted), nan=0.0)
+
+    # orders sent at a close are filled at the open of the symbol's next bar
+    held = np.full((rows, columns), np.nan)
+    held[:, 1:] = np.where(mask[:, 1:], wanted[:, :-1], np.nan)
+    held[:, 0] = np.where(mask[:, 0], 0.0, np.nan)
+    held = np.nan_to_num(_forward_fill(held), nan=0.0)
+
+    changes = np.diff(held, axis=1, prepend=0.0)
+    entry_rows, entry_columns = np.nonzero(changes > 0)
+    exit_rows, exit_columns = np.nonzero(changes < 0)
+
+    entry_amounts = size[entry_rows, 0]
+    exit_amounts = size[exit_rows, 0]
+    entry_prices = np.asarray(slippage.fill_price('buy', opens[entry_rows, entry_columns], entry_amounts), dtype=np.float64)
+    exit_prices = np.asarray(slippage.fill_price('sell', opens[exit_rows, exit_columns], exit_amounts), dtype=np.float64)
+    entry_commissions = np.broadcast_to(commission.commission(entry_amounts, entry_prices), entry_rows.shape).astype(np.float64)
+    exit_commissions = np.broadcast_to(commission.commission(exit_amounts, exit_prices), exit_rows.shape).astype(np.float64)
+
+    flows = np.zeros((rows, columns))
+    flows[entry_rows, entry_columns] -= entry_amounts * entry_prices + entry_commissions
+    flows[exit_rows, exit_columns] += exit_amounts * exit_prices - exit_commissions
+    cash_after = cash + np.cumsum(flows, axis=1)
+
+    position = held * size
+    last_closes = _forward_fill(np.where(mask, closes, np.nan))
+    equity = cash_after + np.where(position != 0, position * last_closes, 0.0)
+
+    # every row's trades alternate between entries and exits, so the nth exit of a row closes its nth entry
+    entry_numbers = np.arange(len(entry_rows)) - np.searchsorted(entry_rows, entry_rows)
+    closed = entry_numbers < np.bincount(exit_rows, minlength=rows)[entry_rows]
+
+    exit_times = np.full(len(entry_rows), -1, dtype=np.int64)
+    exit_times[closed] = timestamps[exit_columns]
+    final_prices = last_closes[entry_rows, -1] if columns else np.empty(0)
+    trade_exit_prices = np.where(closed, 0.0, final_prices)
+    trade_exit_prices[closed] = exit_prices
+    trade_commissions = entry_commissions.copy()
+    trade_commissions[closed] += exit_commissions
+
+    pnl = (trade_exit_prices - entry_prices) * entry_amounts - trade_commissions
+    trades = {
+        'symbol': entry_rows,
+        'entry_time': timestamps[entry_columns],
+        'exit_time': exit_times,
+        'amount': entry_amounts,
+        'entry_price': entry_prices,
+        'exit_price': trade_exit_prices,
+        'commission': trade_commissions,
+        'pnl': pnl,
+        'return': pnl / (entry_prices * entry_amounts + entry_commissions),
+    }
+
+    return {'position': position, 'cash': cash_after, 'equity': equity, 'trades': trades}
+
+
+def backtest_panel(ticker_panel: panel.TickerPanel, entries: np.ndarray, exits: np.ndarray, size=1.0, cash: float = 100000.0,
+                   slippage: simulation.SlippageModelADT = None, commission: simulation.CommissionModelADT = None) -> VectorizedBacktestResult:
+    """
+    Backtest a long only strategy given as signal arrays on every symbol of a panel at once, using only array operations.
+
+    Signals are read at the close of each bar. A position is opened after an entry and closed after an exit, and every order is filled
+    at the open of the symbol's next bar, the same as backtest.BacktestEngine. An exit at the same bar as an entry wins. Cash isn't
+    checked before buying, so size should be affordable.
+
+    :param ticker_panel: Must have Open and Close fields
+    :param entries: symbols x timestamps bool array, e.g. fast_ema > slow_ema. Signals at missing bars are ignored.
+    :param exits: symbols x timestamps bool array, e.g. ~entries
+    :param size: Number of stocks bought by each entry, either for every symbol or an array with one value per symbol
+    :param cash: Dollars each symbol starts with
+    :param slippage: Default: fills at the open
+    :param commission: Default: no commission
+    """
+    arrays = _backtest_arrays(ticker_panel.timestamps, ticker_panel['Open'], ticker_panel['Close'], ticker_panel.mask,
+                              np.asarray(entries, dtype=bool), np.asarray(exits, dtype=bool), size, cash,
+                              slippage if slippage is not None else simulation.NoSlippage(),
+                              commission if commission is not None else simulation.NoCommission())
+
+    return VectorizedBacktestResult(ticker_panel.symbols, ticker_panel.timestamps, arrays['position'], arrays['cash'], arrays['equity'],
+                                    arrays['trades'], timezone=ticker_panel.timezone)
+
+
+def _to_array_ticker(ticker) -> array_ticker.ArrayTicker:
+    if isinstance(ticker, array_ticker.ArrayTicker):
+        return ticker
+    # a ticker.Ticker, which loads its dataframe when it is first used
+    return array_ticker.ArrayTicker.from_dataframe(ticker.symbol, ticker.data, interval=ticker.interval)
+
+
+def backtest_signals(ticker, entries: np.ndarray, exits: np.ndarray, size: float = 1.0, cash: float = 100000.0,
+                     slippage: simulation.SlippageModelADT = None, commission: simulation.CommissionModelADT = None) -> VectorizedBacktestResult:
+    """
+    Backtest a long only strategy given as signal arrays on a single ticker. See backtest_panel()
+
+    :param ticker: ArrayTicker or ticker.Ticker with Open and Close columns
+    :param entries: bool array with a value for every bar
+    :param exits: bool array with a value for every bar
+    """
+    ticker = _to_array_ticker(ticker)
+    timestamps = np.asarray(ticker.timestamps, dtype=np.int64)
+    closes = np.asarray(ticker.close, dtype=np.float64).reshape(1, -1)
+    opens = np.asarray(ticker.open, dtype=np.float64).reshape(1, -1)
+
+    arrays = _backtest_arrays(timestamps, opens, closes, np.ones(closes.shape, dtype=bool), np.asarray(entries, dtype=bool).reshape(1, -1),
+                              np.asarray(exits, dtype=bool).reshape(1, -1), size, cash,
+                              slippage if slippage is not None else simulation.NoSlippage(),
+                              commission if commission is not None else simulation.NoCommission())
+
+    return VectorizedBacktestResult([ticker.symbol], timestamps, arrays['position'][0], arrays['cash'][0], arrays['equity'][0],
+                                    arrays['trades'], timezone=ticker.timezone)
+
+
+class SignalStrategy(backtest.StrategyADT):
+    """
+    Trades signal arrays through a StockTraderADT, the same way backtest_signals() does with arrays. Used to check that both give the same
+    results.
+    """
+
+    def __init__(self, entries: Dict[str, np.ndarray], exits: Dict[str, np.ndarray], size: float = 1.0):
+        """
+        :param entries: "ticker_str": bool array with a value for every bar
+        :param exits: "ticker_str": bool array with a value for every bar
+        """
+        self.entries = {symbol: np.asarray(values, dtype=bool).tolist() for symbol, values in entries.items()}
+        self.exits = {symbol: np.asarray(values, dtype=bool).tolist() for symbol, values in exits.items()}
+        self.size = size
+        self._wanted: Dict[str, bool] = {}
+
+    def start(self, trader, context: backtest.BacktestContext):
+        self._wanted = {symbol: False for symbol in context.tickers}
+
+    def on_bar(self, trader, context: backtest.BacktestContext):
+        for symbol in context.updated:
+            row = context.rows[symbol]
+            wanted = (self._wanted[symbol] or self.entries[symbol][row]) and not self.exits[symbol][row]
+            if wanted != self._wanted[symbol]:
+                if wanted:
+                    trader.buy(symbol, self.size)
+                else:
+                    trader.sell(symbol, self.size)
+                self._wanted[symbol] = wanted
+
+
+def cross_check(ticker, entries: np.ndarray, exits: np.ndarray, size: float = 1.0, cash: float = 100000.0,
+                slippage: simulation.SlippageModelADT = None, commission: simulation.CommissionModelADT = None) -> Dict[str, float]:
+    """
+    Backtest the same signals with backtest_signals() and with backtest.BacktestEngine and a trade_stocks.SimulatedTrader, and compare them
+
+    :return: equity: largest difference between the equity curves, fills: difference in the number of filled orders, fill_prices: largest
+    difference between the prices orders were filled at. All of them should be 0 (up to floating point error).
+    """
+    ticker = _to_array_ticker(ticker)
+    vectorized = backtest_signals(ticker, entries, exits, size=size, cash=cash, slippage=slippage, commission=commission)
+
+    engine = backtest.BacktestEngine([ticker], SignalStrategy({ticker.symbol: entries}, {ticker.symbol: exits}, size=size), cash=cash,
+                                     slippage=slippage, commission=commission)
+    event_driven = engine.run()
+
+    differences = _compare_fills(_vectorized_fills(vectorized.trades), event_driven.filled_orders)
+    differences['equity'] = float(np.abs(vectorized.equity - event_driven.equity).max(initial=0.0))
+    return differences
+
+
+def _vectorized_fills(trades: Dict[str, np.ndarray], row: int = None) -> np.ndarray:
+    # prices of every entry and of every exit which happened, of one row or of every row
+    selected = trades['symbol'] == row if row is not None else np.ones(len(trades['symbol']), dtype=bool)
+    return np.concatenate([trades['entry_price'][selected], trades['exit_price'][selected & (trades['exit_time'] >= 0)]])
+
+
+def _compare_fills(vectorized_fills: np.ndarray, event_orders: List) -> Dict[str, float]:
+    event_fills = np.array([order.price_per_share for order in event_orders])
+    fill_difference = float(np.abs(np.sort(vectorized_fills) - np.sort(event_fills)).max(initial=0.0)) \
+        if len(vectorized_fills) == len(event_fills) else float('inf')
+    return {'fills': float(abs(len(vectorized_fills) - len(event_fills))), 'fill_prices': fill_difference}
+
+
+def cross_check_panel(ticker_panel: panel.TickerPanel, entries: np.ndarray, exits: np.ndarray, size: float = 1.0, cash: float = 100000.0,
+                      slippage: simulation.SlippageModelADT = None,
+                      commission: simulation.CommissionModelADT = None) -> Dict[str, Dict[str, float]]:
+    """
+    Backtest the same signals on every symbol of a panel with backtest_panel() and with one backtest.BacktestEngine run of a
+    SignalStrategy over all of the symbols, and compare them. Symbols may have missing bars, and may list or delist part way through.
+
+    The engine trades every symbol from one trader, which starts with cash for every symbol. Each symbol's equity in the engine is its
+    share of that cash plus the cash flows of its filled orders, at the times they were filled, and the value of its position.
+
+    :return: "ticker_str": the same differences as cross_check() for every symbol, with the equity from the engine's fills for that
+    symbol. "portfolio": equity: largest difference between the engine's equity and the total equity of every symbol. All of them should
+    be 0 (up to floating point error).
+    """
+    entries = np.asarray(entries, dtype=bool)
+    exits = np.asarray(exits, dtype=bool)
+    vectorized = backtest_panel(ticker_panel, entries, exits, size=size, cash=cash, slippage=slippage, commission=commission)
+
+    tickers = []
+    for row, symbol in enumerate(ticker_panel.symbols):
+        bars = ticker_panel.mask[row]
+        tickers.append(array_ticker.ArrayTicker(symbol, ticker_panel.timestamps[bars], open=ticker_panel['Open'][row, bars],
+                                                close=ticker_panel['Close'][row, bars], interval=ticker_panel.interval,
+                                                timezone=ticker_panel.timezone))
+    strategy = SignalStrategy({ticker.symbol: entries[row, ticker_panel.mask[row]] for row, ticker in enumerate(tickers)},
+                              {ticker.symbol: exits[row, ticker_panel.mask[row]] for row, ticker in enumerate(tickers)}, size=size)
+    engine = backtest.BacktestEngine(tickers, strategy, cash=cash * len(tickers), slippage=slippage, commission=commission)
+    event_driven = engine.run()
+
+    # every panel column has a bar of some symbol, so the engine has a step at every column
+    last_closes = _forward_fill(np.where(ticker_panel.mask, ticker_panel['Close'], np.nan))
+    orders: Dict[str, List] = {symbol: [] for symbol in ticker_panel.symbols}
+    for order in event_driven.filled_orders:
+        orders[order.symbol].append(order)
+
+    differences: Dict[str, Dict[str, float]] = {}
+    for row, symbol in enumerate(ticker_panel.symbols):
+        flows = np.zeros(len(ticker_panel.timestamps))
+        amounts = np.zeros(len(ticker_panel.timestamps))
+        for order in orders[symbol]:
+            column = np.searchsorted(ticker_panel.timestamps, order.time['filled_at'].value)
+            sign = 1 if order.side == 'buy' else -1
+            flows[column] -= sign * order.filled_amount * order.price_per_share + order.commission
+            amounts[column] += sign * order.filled_amount
+        position = np.cumsum(amounts)
+        equity = cash + np.cumsum(flows) + np.where(position != 0, position * last_closes[row], 0.0)
+
+        differences[symbol] = _compare_fills(_vectorized_fills(vectorized.trades, row), orders[symbol])
+        differences[symbol]['equity'] = float(np.abs(vectorized.equity[row] - equity).max(initial=0.0))
+
+    differences['portfolio'] = {'equity': float(np.abs(vectorized.equity.sum(axis=0) - event_driven.equity).max(initial=0.0))}
+    return differences
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check that vectorized backtests match the event driven engine on a random walk")
+    parser.add_argument('--bars', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    walk_close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, args.bars)))
+    walk_open = np.r_[walk_close[0], walk_close[:-1]] * np.exp(rng.normal(0, 0.002, args.bars))
+    # minute bars, since daily bars from the epoch would overflow datetime64[ns] after about 106,751 bars
+    walk_times = pd.date_range('2000-01-01', periods=args.bars, freq='min', tz='UTC').values.astype('datetime64[ns]').view('int64')
+    walk = array_ticker.ArrayTicker('WALK', walk_times, open=walk_open, close=walk_close)
+
+    fast, slow = walk.indicators(('ema', 10), ('ema', 30)).values()
+    walk_entries = fast > slow
+    walk_exits = fast < slow
+
+    start_time = time.perf_counter()
+    walk_result = backtest_signals(walk, walk_entries, walk_exits, size=10, slippage=simulation.PercentSlippage(0.0005),
+                                   commission=simulation.PerShareCommission(0.005, minimum=1.0))
+    print(f'vectorized: {time.perf_counter() - start_time:.3f}s, {len(walk_result.trades["pnl"])} trades, '
+          f'return {walk_result.total_return:.2%}, max drawdown {walk_result.max_drawdown:.2%}')
+
+    start_time = time.perf_counter()
+    differences = cross_check(walk, walk_entries, walk_exits, size=10, slippage=simulation.PercentSlippage(0.0005),
+                              commission=simulation.PerShareCommission(0.005, minimum=1.0))
+    print(f'event driven: {time.perf_counter() - start_time:.3f}s')
+    print(f'largest differences: {differences}')
@@ -0,0 +1,41 @@
+import datetime as dt
+import os
+import sys
+
+import pytest
+
+# the modules in src import each other by name, the same as when they are run from src
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+
+import data_provider  # noqa: E402
+import data_sources  # noqa: E402
+import frame_cache  # noqa: E402
+
+
+class CountingDataSource(data_sources.SyntheticDataSource):
+    """
+    Synthetic data which records every request made for it
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # format: (symbols, start, end, interval)
+        self.requests = []
+
+    def download(self, ticker_symbols, start, end, interval):
+        self.requests.append((list(ticker_symbols), start, end, interval))
+        return super().download(ticker_symbols, start, end, interval)
+
+
+@pytest.fixture
+def data_source() -> CountingDataSource:
+    return CountingDataSource(seed=1)
+
+
+@pytest.fixture
+def provider(tmp_path, data_source) -> data_provider.StockDataProvider:
+    return data_provider.StockDataProvider(str(tmp_path / 'tickers'), cache=frame_cache.FrameCache(), data_source=data_source)
+
+
+# a Tuesday, after that day's daily bar
+T0 = dt.datetime(2021, 1, 5, 6)
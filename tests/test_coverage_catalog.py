@@ -0,0 +1,62 @@
+import datetime as dt
+
+import pytest
+
+from conftest import T0
+from coverage_catalog import CoverageCatalog
+
+
+@pytest.fixture
+def catalog(tmp_path) -> CoverageCatalog:
+    catalog = CoverageCatalog(str(tmp_path / 'coverage.sqlite3'))
+    yield catalog
+    catalog.close()
+
+
+def _day(day: int) -> dt.datetime:
+    return dt.datetime(2021, 1, day)
+
+
+def test_touching_ranges_are_merged(catalog):
+    catalog.add_coverage('msft', '1d', _day(1), _day(5), time=_day(5))
+    catalog.add_coverage('MSFT', '1d', _day(10), _day(15), time=_day(15))
+    catalog.add_coverage('MSFT', '1d', _day(5), _day(10), time=_day(20))
+
+    coverage = catalog.get_coverage('MSFT', '1d')
+    assert [(info.start, info.end, info.time) for info in coverage] == [(_day(1), _day(15), _day(20))]
+    assert catalog.get_coverage('MSFT', '1h') == []
+
+
+def test_missing_ranges(catalog):
+    catalog.add_coverage('MSFT', '1d', _day(5), _day(10))
+    catalog.add_coverage('MSFT', '1d', _day(12), _day(20))
+
+    assert catalog.missing_ranges('MSFT', '1d', _day(6), _day(9)) == []
+    assert catalog.missing_ranges('MSFT', '1d', _day(1), _day(25)) == [(_day(1), _day(5)), (_day(10), _day(12)), (_day(20), _day(25))]
+    # gaps no longer than the tolerance don't need to be retrieved
+    assert catalog.missing_ranges('MSFT', '1d', _day(5), _day(21), dt.timedelta(days=2)) == []
+    assert catalog.missing_ranges('AMD', '1d', _day(5), _day(10)) == [(_day(5), _day(10))]
+
+
+def test_stale_symbols(catalog):
+    catalog.add_coverage('AMD', '1d', _day(1), T0 - dt.timedelta(days=3))
+    catalog.add_coverage('MSFT', '1d', _day(1), T0 - dt.timedelta(hours=2))
+    catalog.add_coverage('TSLA', '1d', _day(1), T0 - dt.timedelta(days=2))
+    catalog.add_coverage('TSLA', '1d', T0 - dt.timedelta(days=1), T0)
+    catalog.add_coverage('NVDA', '1h', _day(1), T0 - dt.timedelta(days=3))
+
+    assert catalog.stale_symbols('1d', dt.timedelta(days=1), now=T0) == ['AMD']
+    assert catalog.stale_symbols('1d', dt.timedelta(hours=1), now=T0) == ['AMD', 'MSFT']
+    assert catalog.stale_symbols('1h', dt.timedelta(hours=1), now=T0) == ['NVDA']
+
+    last_retrieved = catalog.last_retrieved('1d')
+    assert {symbol: info.end for symbol, info in last_retrieved.items()} == \
+        {'AMD': T0 - dt.timedelta(days=3), 'MSFT': T0 - dt.timedelta(hours=2), 'TSLA': T0}
+
+
+def test_set_coverage_replaces_ranges(catalog):
+    catalog.add_coverage('MSFT', '1d', _day(1), _day(5))
+    catalog.add_coverage('MSFT', '1d', _day(10), _day(15))
+    catalog.set_coverage('MSFT', '1d', _day(3), _day(8))
+
+    assert [(info.start, info.end) for info in catalog.get_coverage('MSFT', '1d')] == [(_day(3), _day(8))]
@@ -0,0 +1,44 @@
+import datetime as dt
+
+import pandas as pd
+
+from conftest import T0
+
+
+def _ranges(data_source):
+    return [(start, end) for _, start, end, _ in data_source.requests]
+
+
+def test_stored_range_is_not_downloaded_again(provider, data_source):
+    first = provider.get_ticker('MSFT', start='2020-12-01', end=T0)
+    second = provider.get_ticker('MSFT', start='2020-12-10', end=T0)
+
+    assert len(data_source.requests) == 1
+    pd.testing.assert_frame_equal(second, first.loc['2020-12-10':])
+
+
+def test_only_missing_ranges_are_downloaded(provider, data_source):
+    provider.get_ticker('MSFT', start='2020-12-01', end=T0)
+    data_source.requests.clear()
+
+    later = T0 + dt.timedelta(days=7)
+    ticker_dataframe = provider.get_ticker('MSFT', start='2020-11-01', end=later)
+
+    assert _ranges(data_source) == [(dt.datetime(2020, 11, 1), dt.datetime(2020, 12, 1)), (T0, later)]
+    expected = data_source.generate('MSFT', dt.datetime(2020, 11, 1), later, '1d')
+    pd.testing.assert_frame_equal(ticker_dataframe, expected, check_freq=False)
+
+
+def test_gap_between_stored_ranges_is_filled(provider, data_source):
+    provider.get_ticker('MSFT', start='2020-06-01', end='2020-07-01')
+    provider.get_ticker('MSFT', start='2020-09-01', end='2020-10-01')
+    data_source.requests.clear()
+
+    ticker_dataframe = provider.get_ticker('MSFT', start='2020-06-01', end='2020-10-01')
+
+    assert _ranges(data_source) == [(dt.datetime(2020, 7, 1), dt.datetime(2020, 9, 1))]
+    assert ticker_dataframe.index.is_monotonic_increasing and ticker_dataframe.index.is_unique
+    expected = data_source.generate('MSFT', dt.datetime(2020, 6, 1), dt.datetime(2020, 10, 1), '1d')
+    pd.testing.assert_frame_equal(ticker_dataframe, expected, check_freq=False)
+    assert [(info.start, info.end) for info in provider.catalog.get_coverage('MSFT', '1d')] == \
+        [(dt.datetime(2020, 6, 1), dt.datetime(2020, 10, 1))]
@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import indicators
+
+
+@pytest.mark.parametrize('window', [20, 200])
+def test_rolling_std_keeps_precision_on_long_series(window):
+    values = 100 + np.cumsum(np.random.default_rng(0).normal(0, 1, 500000))
+    expected = pd.Series(values).rolling(window).std(ddof=0).to_numpy()
+
+    np.testing.assert_allclose(indicators.rolling_std(values, window, block_size=2 ** 14), expected, rtol=1e-6)
+
+
+def test_rolling_std_windows_with_nan_are_nan():
+    values = np.random.default_rng(1).normal(0, 1, (2, 300))
+    values[0, 50] = np.nan
+    expected = pd.DataFrame(values.T).rolling(10).std(ddof=0).to_numpy().T
+
+    np.testing.assert_allclose(indicators.rolling_std(values, 10, block_size=64), expected, rtol=1e-9)
+
+
+@pytest.mark.parametrize('window', [0, -1])
+def test_rolling_windows_must_contain_a_point(window):
+    with pytest.raises(ValueError):
+        indicators.rolling_sum(np.ones(10), window)
+    with pytest.raises(ValueError):
+        indicators.rolling_std(np.ones(10), window)
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('alpaca_trade_api')
+
+import array_ticker  # noqa: E402
+import parameter_sweep  # noqa: E402
+from parameter_sweep import SweepResults  # noqa: E402
+
+
+def scaled_return(ticker, parameters, first_row=0):
+    return {'total_return': parameters['fast'] * 1.0}
+
+
+def doubled_return(ticker, parameters, first_row=0):
+    return {'total_return': parameters['fast'] * 2.0}
+
+
+def test_settings_key_changes_with_the_evaluated_code():
+    assert SweepResults.settings_key(scaled_return, 200) == SweepResults.settings_key(scaled_return, 200)
+    # the functions only differ by a constant
+    assert SweepResults.settings_key(scaled_return, 200) != SweepResults.settings_key(doubled_return, 200)
+    assert SweepResults.settings_key(scaled_return, 200) != SweepResults.settings_key(scaled_return, 100)
+    assert SweepResults.settings_key(scaled_return, 200) != SweepResults.settings_key(scaled_return, 200, version='2')
+
+
+@pytest.fixture
+def tickers():
+    rng = np.random.default_rng(0)
+    timestamps = pd.date_range('2015-01-01', periods=1500, freq='D', tz='UTC').values.astype('datetime64[ns]').view('int64')
+    return [array_ticker.ArrayTicker(symbol, timestamps, open=100 * np.exp(np.cumsum(rng.normal(0, 0.01, 1500))),
+                                     close=100 * np.exp(np.cumsum(rng.normal(0, 0.01, 1500)))) for symbol in ('AAA', 'BBB')]
+
+
+def test_sweep_resumes_only_matching_cells(tmp_path, tickers):
+    results = SweepResults(str(tmp_path / 'sweeps.sqlite3'))
+    grid = parameter_sweep.parameter_grid(fast=[5, 10], slow=[30, 60])
+    windows = parameter_sweep.walk_forward_windows('2015-01-01', '2019-01-01', '365D', '180D')
+
+    def run(**kwargs):
+        progress = []
+        parameter_sweep.run_sweep('test', tickers, grid, results=results, max_workers=2,
+                                  progress=lambda finished, total, elapsed: progress.append(finished), **kwargs)
+        return progress
+
+    assert run(windows=windows)[-1] == 2 * len(grid) * len(windows)
+    first_table = results.to_dataframe('test')
+
+    # nothing is left to evaluate, and the stored results aren't changed
+    assert run(windows=windows) == []
+    pd.testing.assert_frame_equal(results.to_dataframe('test'), first_table)
+
+    # different windows, warmup or code are evaluated again rather than reusing the stored cells
+    shifted_windows = parameter_sweep.walk_forward_windows('2015-02-01', '2019-01-01', '365D', '180D')
+    assert run(windows=shifted_windows)[-1] == 2 * len(grid) * len(shifted_windows)
+    assert run(windows=windows, warmup_bars=50)[-1] == 2 * len(grid) * len(windows)
+    assert run(windows=windows, version='2')[-1] == 2 * len(grid) * len(windows)
+
+    settings = SweepResults.settings_key(parameter_sweep.ema_crossover, 200)
+    summary = parameter_sweep.walk_forward_summary(results, 'test', settings=settings)
+    # one row for every symbol and window which was evaluated with these settings
+    assert len(summary) == 2 * (len(windows) + len(shifted_windows))
+    assert (summary['settings'] == settings).all()
+    results.close()
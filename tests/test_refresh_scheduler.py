@@ -0,0 +1,34 @@
+import datetime as dt
+
+from conftest import T0
+from refresh_scheduler import RefreshScheduler
+
+
+def test_refresh_within_lead_time_extends_coverage(provider, data_source):
+    provider.get_tickers(['AMD', 'MSFT'], start='2020-12-01', end=T0, interval='1d')
+    scheduler = RefreshScheduler(provider, intervals=['1d'], lead_time=0.25)
+
+    # daily data is refreshed once it is 18 hours old, before it expires at 24 hours
+    assert scheduler.due_symbols('1d', T0 + dt.timedelta(hours=12)) == []
+    now = T0 + dt.timedelta(hours=20)
+    assert scheduler.due_symbols('1d', now) == ['AMD', 'MSFT']
+
+    requests_before = len(data_source.requests)
+    results = scheduler.refresh(now)
+
+    assert len(data_source.requests) > requests_before
+    assert not results['1d'].failures
+    last_retrieved = provider.catalog.last_retrieved('1d')
+    assert all(last_retrieved[symbol].end == now for symbol in ('AMD', 'MSFT'))
+    assert scheduler.due_symbols('1d', now) == []
+
+
+def test_refresh_only_downloads_due_symbols(provider, data_source):
+    provider.get_tickers(['AMD'], start='2020-12-01', end=T0, interval='1d')
+    provider.get_tickers(['MSFT'], start='2020-12-01', end=T0 + dt.timedelta(hours=12), interval='1d')
+    scheduler = RefreshScheduler(provider, intervals=['1d'], lead_time=0.25)
+
+    data_source.requests.clear()
+    scheduler.refresh(T0 + dt.timedelta(hours=20))
+
+    assert [symbols for symbols, *_ in data_source.requests] == [['AMD']]
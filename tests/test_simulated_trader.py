@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('alpaca_trade_api')
+
+import array_ticker  # noqa: E402
+import backtest  # noqa: E402
+import trade_stocks  # noqa: E402
+
+
+def test_notional_sell_of_whole_position_is_filled():
+    rng = np.random.default_rng(0)
+    trader = trade_stocks.SimulatedTrader(cash=1e9)
+
+    for _ in range(500):
+        buy_price, sell_price = rng.uniform(1, 1000, size=2)
+        trader.buy('ABC', rng.uniform(1, 10000), notional=True)
+        trader.scheduler.run()
+        trader.update_price('ABC', buy_price)
+        trader.update_price('ABC', sell_price, False)
+
+        position = trader.get_symbol_position('ABC')
+        trader.sell('ABC', position._value, notional=True)
+        trader.scheduler.run()
+        trader.update_price('ABC', sell_price)
+
+        assert trader.orders[-1]._status == 'filled'
+        assert 'ABC' not in trader.positions
+
+
+def test_sell_of_more_than_owned_is_rejected():
+    trader = trade_stocks.SimulatedTrader(cash=1000.0)
+    trader.buy('ABC', 2)
+    trader.scheduler.run()
+    trader.update_price('ABC', 10.0)
+    trader.sell('ABC', 3)
+    trader.scheduler.run()
+    trader.update_price('ABC', 10.0)
+
+    assert trader.orders[-1]._status == 'rejected'
+    assert trader.get_symbol_position('ABC')._amount == 2
+
+
+def test_prices_for_lower_case_symbols_fill_orders():
+    trader = trade_stocks.SimulatedTrader(cash=100.0)
+    trader.buy('msft', 1)
+    trader.scheduler.run()
+    trader.update_price('msft', 11.0)
+
+    assert trader.orders[-1]._status == 'filled'
+    assert trader.equity == pytest.approx(100.0)
+
+
+class BuyOnce(backtest.StrategyADT):
+
+    def on_bar(self, trader, context):
+        if not trader.orders:
+            trader.buy(context.updated[0], 1)
+
+
+def test_backtest_fills_at_the_next_open():
+    timestamps = np.arange(5, dtype=np.int64) * 86400 * 10 ** 9
+    prices = np.arange(10.0, 15.0)
+    ticker = array_ticker.ArrayTicker('MSFT', timestamps, open=prices, close=prices)
+
+    result = backtest.BacktestEngine([ticker], BuyOnce(), cash=100.0).run()
+
+    assert [order._status for order in result.orders] == ['filled']
+    assert result.orders[0].price_per_share == 11.0
+    assert result.equity[-1] == pytest.approx(100.0 - 11.0 + 14.0)
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import indicators
+import streaming_indicators
+
+
+def _series(with_gaps: bool) -> np.ndarray:
+    values = 100 * np.exp(np.cumsum(np.random.default_rng(2).normal(0, 0.01, 600)))
+    if with_gaps:
+        values[[0, 57, 58, 200, 401]] = np.nan
+    return values
+
+
+BATCH_EQUIVALENTS = [
+    (lambda: streaming_indicators.RunningMean(20), lambda values: indicators.sma(values, 20)),
+    (lambda: streaming_indicators.StreamingEMA(20), lambda values: indicators.ema(values, 20)),
+    (lambda: streaming_indicators.WilderSmoothing(14), lambda values: indicators.wilder_smoothing(values, 14)),
+    (lambda: streaming_indicators.StreamingRSI(14), lambda values: indicators.IndicatorEngine(values).rsi(14)),
+    (lambda: streaming_indicators.RollingVariance(20), lambda values: indicators.rolling_std(values, 20) ** 2),
+    (lambda: streaming_indicators.RollingMax(20), lambda values: pd.Series(values).rolling(20).max().to_numpy()),
+    (lambda: streaming_indicators.RollingMin(20), lambda values: pd.Series(values).rolling(20).min().to_numpy()),
+]
+
+
+@pytest.mark.parametrize('with_gaps', [False, True])
+@pytest.mark.parametrize('streaming, batch', BATCH_EQUIVALENTS)
+def test_streaming_matches_batch(streaming, batch, with_gaps):
+    values = _series(with_gaps)
+    indicator = streaming()
+
+    updates = np.array([indicator.update(value) for value in values])
+
+    np.testing.assert_allclose(updates, batch(values), rtol=1e-9, atol=1e-9)
+    assert np.isnan(indicator.value) == np.isnan(updates[-1])
+
+
+@pytest.mark.parametrize('streaming, batch', BATCH_EQUIVALENTS)
+def test_seeded_indicator_continues_like_batch(streaming, batch):
+    values = _series(True)
+    indicator = streaming()
+    indicator.seed(values[:450])
+
+    updates = [indicator.update(value) for value in values[450:]]
+
+    np.testing.assert_allclose(updates, batch(values)[450:], rtol=1e-9, atol=1e-9)
+
+
+def test_from_ticker_follows_column():
+    ticker = pd.DataFrame({'Close': _series(False), 'Open': _series(True)})
+    indicator = streaming_indicators.StreamingEMA.from_ticker(ticker, 10, column='Open')
+
+    assert indicator.value == pytest.approx(indicators.ema(ticker['Open'].to_numpy(), 10)[-1], rel=1e-12)
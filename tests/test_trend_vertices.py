@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+import trend_vertices
+
+
+@pytest.mark.parametrize('threshold', [0.000001, 0.001, 0.01, 0.05, 0.2])
+def test_array_search_finds_the_same_vertices_as_the_loop(threshold):
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        length = int(rng.integers(0, 3000))
+        values = np.round(100 * np.exp(np.cumsum(rng.normal(0, 0.01, length))), int(rng.integers(0, 3)))
+
+        expected = trend_vertices._zigzag_loop(values.tolist(), threshold)
+        assert trend_vertices._zigzag_search(values, threshold) == expected
+        assert trend_vertices._zigzag(values, threshold) == expected
+
+
+def test_long_trends():
+    values = np.r_[np.linspace(1, 100, 5000), np.linspace(100, 1, 7000), np.linspace(1, 50, 3000)]
+    for threshold in (0.001, 0.05, 0.5):
+        assert trend_vertices._zigzag_search(values, threshold) == [0, 4999, 11999, 14999]
+
+
+def test_find_vertices_ignores_nan():
+    values = np.array([10.0, 12.0, np.nan, 15.0, 11.0, 9.0, np.nan, 14.0, 13.0])
+    np.testing.assert_array_equal(trend_vertices.find_vertices(values, 10), [0, 3, 5, 7])
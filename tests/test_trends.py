@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+import trends
+
+
+@pytest.fixture
+def values():
+    values = 100 + np.cumsum(np.random.default_rng(0).normal(0, 1, (2, 1000)), axis=1)
+    values[1, 300:305] = np.nan
+    return values
+
+
+def test_rolling_linear_regression_matches_polyfit(values):
+    results = trends.rolling_linear_regression(values, 30, block_size=100)
+
+    for row, end in [(0, 29), (0, 99), (0, 100), (1, 500), (1, 999)]:
+        slope, intercept = np.polyfit(np.arange(30), values[row, end - 29:end + 1], 1)
+        assert results['slope'][row, end] == pytest.approx(slope)
+        assert results['intercept'][row, end] == pytest.approx(intercept)
+
+    assert np.isnan(results['slope'][:, :29]).all()
+    # windows containing a NaN
+    assert np.isnan(results['slope'][1, 300:334]).all()
+    assert not np.isnan(results['slope'][1, 334])
+
+
+def test_rolling_trends_matches_each_window(values):
+    windows = [5, 30, 200]
+    results = trends.rolling_trends(values, windows, block_size=64)
+
+    for window in windows:
+        single = trends.rolling_linear_regression(values, window, block_size=1000)
+        for name in ('slope', 'intercept', 'r_squared'):
+            np.testing.assert_allclose(results[window][name], single[name], rtol=1e-7, atol=1e-9)
+
+
+def test_rolling_trends_rejects_short_windows(values):
+    with pytest.raises(ValueError):
+        trends.rolling_trends(values, [1, 20])
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('alpaca_trade_api')
+
+import array_ticker  # noqa: E402
+import panel  # noqa: E402
+import simulation  # noqa: E402
+import vectorized_backtest  # noqa: E402
+
+
+def _walk(rng, symbol, times):
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(times))))
+    bar_open = np.r_[close[0], close[:-1]] * np.exp(rng.normal(0, 0.002, len(times)))
+    return array_ticker.ArrayTicker(symbol, times, open=bar_open, close=close)
+
+
+@pytest.fixture
+def ticker_panel():
+    rng = np.random.default_rng(1)
+    times = pd.date_range('2021-01-04', periods=600, freq='B', tz='UTC').values.astype('datetime64[ns]').view('int64')
+    gaps = np.sort(rng.choice(600, 500, replace=False))
+    return panel.TickerPanel.from_tickers([
+        _walk(rng, 'FULL', times),
+        _walk(rng, 'GAPS', times[gaps]),
+        _walk(rng, 'LISTED', times[200:]),
+        _walk(rng, 'DELISTED', times[:350]),
+    ], fields=['Open', 'Close'])
+
+
+def _ema_signals(ticker_panel):
+    fast, slow = ticker_panel.indicators(('ema', 5), ('ema', 20)).values()
+    return fast > slow, fast < slow
+
+
+def test_single_ticker_matches_engine():
+    rng = np.random.default_rng(0)
+    times = pd.date_range('2000-01-01', periods=2000, freq='min', tz='UTC').values.astype('datetime64[ns]').view('int64')
+    walk = _walk(rng, 'WALK', times)
+    fast, slow = walk.indicators(('ema', 10), ('ema', 30)).values()
+
+    differences = vectorized_backtest.cross_check(walk, fast > slow, fast < slow, size=10, slippage=simulation.PercentSlippage(0.0005),
+                                                  commission=simulation.PerShareCommission(0.005, minimum=1.0))
+    assert differences['fills'] == 0
+    assert differences['fill_prices'] < 1e-9
+    assert differences['equity'] < 1e-6
+
+
+def test_panel_matches_engine_for_every_symbol(ticker_panel):
+    entries, exits = _ema_signals(ticker_panel)
+    differences = vectorized_backtest.cross_check_panel(ticker_panel, entries, exits, size=10, slippage=simulation.PercentSlippage(0.0005),
+                                                        commission=simulation.PerShareCommission(0.005, minimum=1.0))
+
+    assert set(differences) == set(ticker_panel.symbols) | {'portfolio'}
+    for symbol in ticker_panel.symbols:
+        assert differences[symbol]['fills'] == 0, symbol
+        assert differences[symbol]['fill_prices'] < 1e-9, symbol
+        assert differences[symbol]['equity'] < 1e-6, symbol
+    assert differences['portfolio']['equity'] < 1e-6
+
+
+def test_panel_symbols_only_trade_while_listed(ticker_panel):
+    entries, exits = _ema_signals(ticker_panel)
+    result = vectorized_backtest.backtest_panel(ticker_panel, entries, exits, size=10)
+    trades = result.trades
+
+    for row, symbol in enumerate(ticker_panel.symbols):
+        listed = ticker_panel.timestamps[ticker_panel.mask[row]]
+        symbol_trades = trades['symbol'] == row
+        assert symbol_trades.any(), symbol
+        assert np.isin(trades['entry_time'][symbol_trades], listed).all(), symbol
+        exits_times = trades['exit_time'][symbol_trades]
+        assert np.isin(exits_times[exits_times >= 0], listed).all(), symbol